@@ -7,7 +7,12 @@ mkdir -p /app/_logs
 export PYTHONPATH=$(pwd):$PYTHONPATH
 
 source "$VIRTUAL_ENV"/bin/activate
-alembic upgrade head
-python platform_registry/initial_data.py
+
+# metrics files of the workers of a previous run
+if [ -n "$METRICS_MULTIPROCESS_DIR" ]; then
+  rm -rf "$METRICS_MULTIPROCESS_DIR" && mkdir -p "$METRICS_MULTIPROCESS_DIR"
+fi
+# migrations and initial data, only when outdated and by a single replica at a time
+python -m platform_registry prepare
 
 uvicorn platform_registry.main:app --host 0.0.0.0 --port 8000
@@ -0,0 +1,105 @@
+"""
+Command line tools of the registry.
+
+    python -m platform_registry prepare
+    python -m platform_registry generate --platforms 200 --projects 50000 --seed 0
+
+`prepare` migrates the database and loads the initial data when they are outdated, see `platform_registry.startup`.
+`generate` loads a synthetic registry, for scale tests and capacity planning, into the configured database
+or `--database-url`. The schema must exist, e.g: `alembic upgrade head`, unless `--create-schema` is given.
+"""
+import argparse
+import asyncio
+import dataclasses
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from platform_registry import startup
+from platform_registry.core.config import settings
+from platform_registry.models import Base
+from platform_registry.synthetic import RegistryScale, generate
+
+
+async def run_prepare(args) -> None:
+    # closing the connection releases the migration lock, should its release fail
+    engine = create_async_engine(args.database_url or str(settings.database_url), poolclass=NullPool)
+    start = time.perf_counter()
+    try:
+        outcome = await startup.prepare(engine)
+    finally:
+        await engine.dispose()
+    print(f"database {outcome} in {time.perf_counter() - start:.2f}s")
+
+
+async def run_generate(args) -> None:
+    scale = RegistryScale(**{f.name: getattr(args, f.name) for f in dataclasses.fields(RegistryScale)
+                             if getattr(args, f.name, None) is not None})
+    engine = create_async_engine(args.database_url or str(settings.database_url))
+    start = time.perf_counter()
+    async with engine.begin() as connection:
+        if args.create_schema:
+            await connection.run_sync(Base.metadata.create_all)
+        counts = await generate(connection, scale)
+    duration = time.perf_counter() - start
+    await engine.dispose()
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+    total = sum(counts.values())
+    print(f"{total} rows in {duration:.1f}s ({total / duration:.0f} rows/s)")
+
+
+def add_prepare_parser(subparsers) -> None:
+    parser = subparsers.add_parser("prepare", help="migrate the database and load the initial data, when outdated")
+    parser.add_argument("--database-url", help="defaults to the database of the settings")
+    parser.set_defaults(func=run_prepare)
+
+
+def add_generate_parser(subparsers) -> None:
+    defaults = RegistryScale()
+    parser = subparsers.add_parser("generate", help="load a synthetic registry into an empty database",
+                                   description="Counts per project are the means of exponential distributions. "
+                                               "The same seed and reference date always generate the same registry.")
+    parser.add_argument("--database-url", help="defaults to the database of the settings")
+    parser.add_argument("--create-schema", action="store_true", help="create missing tables, for scratch databases")
+    parser.add_argument("--platforms", type=int, default=defaults.platforms)
+    parser.add_argument("--projects", type=int, default=defaults.projects)
+    parser.add_argument("--projects-distribution", choices=["uniform", "zipf"], default=defaults.projects_distribution,
+                        help="distribution of the projects between their owner platforms")
+    parser.add_argument("--zipf-exponent", type=float, default=defaults.zipf_exponent)
+    parser.add_argument("--shares", type=float, default=defaults.shares,
+                        help="mean number of platforms each project is shared with")
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--users-per-project", type=float, default=defaults.users_per_project)
+    parser.add_argument("--entity-types", type=int, default=defaults.entity_types)
+    parser.add_argument("--entities", type=int, default=defaults.entities)
+    parser.add_argument("--entities-per-project", type=float, default=defaults.entities_per_project)
+    parser.add_argument("--frameworks", type=int, default=defaults.frameworks)
+    parser.add_argument("--frameworks-per-project", type=float, default=defaults.frameworks_per_project)
+    parser.add_argument("--expired-keys-per-platform", type=int, default=defaults.expired_keys_per_platform)
+    parser.add_argument("--deleted-ratio", type=float, default=defaults.deleted_ratio,
+                        help="share of soft-deleted projects, users, entities and expired access keys")
+    parser.add_argument("--expired-ratio", type=float, default=defaults.expired_ratio,
+                        help="share of expired users and of projects past their end date")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--reference", type=datetime.fromisoformat,
+                        help="records are created during the 3 years before this date, defaults to today")
+    parser.set_defaults(func=run_generate)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m platform_registry", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(required=True)
+    add_prepare_parser(subparsers)
+    add_generate_parser(subparsers)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
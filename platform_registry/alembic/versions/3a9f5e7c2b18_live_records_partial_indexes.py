@@ -0,0 +1,62 @@
+"""live records partial indexes
+
+Revision ID: 3a9f5e7c2b18
+Revises: b7e4c1d9f2a6
+Create Date: 2026-10-18 17:42:19.630512
+
+Soft-deleted records are left out of queries by default: indexes of the hot queries only cover the other ones.
+Replaced indexes are dropped once their partial version is built, CONCURRENTLY as in `b7e4c1d9f2a6`.
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a9f5e7c2b18'
+down_revision: Union[str, None] = 'b7e4c1d9f2a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LIVE = 'deleted_at IS NULL'
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_access_key_live_platform_id_validity', 'access_key',
+                        ['platform_id', 'end_datetime', 'start_datetime'],
+                        unique=False, postgresql_where=sa.text(LIVE), postgresql_concurrently=True)
+        op.create_index('ix_access_key_live_created_at_id', 'access_key', ['created_at', 'id'],
+                        unique=False, postgresql_where=sa.text(LIVE), postgresql_concurrently=True)
+        op.create_index('ix_user_live_regular_created_at_id', 'user', ['created_at', 'id'],
+                        unique=False, postgresql_where=sa.text(f'role_id IS NULL AND {LIVE}'),
+                        postgresql_concurrently=True)
+        op.create_index('ix_entity_live_created_at_id', 'entity', ['created_at', 'id'],
+                        unique=False, postgresql_where=sa.text(LIVE), postgresql_concurrently=True)
+        op.create_index('ix_platforms_shared_projects_rel_live_platform_id_project_id', 'platforms_shared_projects_rel',
+                        ['platform_id', 'project_id'], unique=False, postgresql_include=['readonly'],
+                        postgresql_where=sa.text(LIVE), postgresql_concurrently=True)
+        op.drop_index('ix_access_key_platform_id_validity', table_name='access_key', postgresql_concurrently=True)
+        op.drop_index('ix_user_regular_created_at_id', table_name='user', postgresql_concurrently=True)
+        op.drop_index('ix_platforms_shared_projects_rel_platform_id_project_id', table_name='platforms_shared_projects_rel',
+                      postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_access_key_platform_id_validity', 'access_key',
+                        ['platform_id', 'end_datetime', 'start_datetime'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_user_regular_created_at_id', 'user', ['created_at', 'id'],
+                        unique=False, postgresql_where=sa.text('role_id IS NULL'), postgresql_concurrently=True)
+        op.create_index('ix_platforms_shared_projects_rel_platform_id_project_id', 'platforms_shared_projects_rel',
+                        ['platform_id', 'project_id'], unique=False, postgresql_include=['readonly'],
+                        postgresql_concurrently=True)
+        op.drop_index('ix_platforms_shared_projects_rel_live_platform_id_project_id',
+                      table_name='platforms_shared_projects_rel', postgresql_concurrently=True)
+        op.drop_index('ix_entity_live_created_at_id', table_name='entity', postgresql_concurrently=True)
+        op.drop_index('ix_user_live_regular_created_at_id', table_name='user', postgresql_concurrently=True)
+        op.drop_index('ix_access_key_live_created_at_id', table_name='access_key', postgresql_concurrently=True)
+        op.drop_index('ix_access_key_live_platform_id_validity', table_name='access_key', postgresql_concurrently=True)
@@ -0,0 +1,34 @@
+"""unique shared project platform
+
+Revision ID: 8d3f6b2a9c14
+Revises: 5c2e9d41a7b3
+Create Date: 2026-10-18 14:03:51.209734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d3f6b2a9c14'
+down_revision: Union[str, None] = '5c2e9d41a7b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # projects shared several times with the same platform keep their latest share only
+    op.execute("""
+        DELETE FROM platforms_shared_projects_rel older
+        USING platforms_shared_projects_rel newer
+        WHERE older.project_id = newer.project_id
+          AND older.platform_id = newer.platform_id
+          AND (COALESCE(older.created_at, '-infinity'), older.id) < (COALESCE(newer.created_at, '-infinity'), newer.id)
+    """)
+    op.create_unique_constraint('unique_shared_project_platform', 'platforms_shared_projects_rel',
+                                ['project_id', 'platform_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('unique_shared_project_platform', 'platforms_shared_projects_rel', type_='unique')
@@ -0,0 +1,29 @@
+"""platform acl version
+
+Revision ID: 9b1e4d7a3c25
+Revises: c52d7e8a4f61
+Create Date: 2026-10-18 23:41:09.502318
+
+Bumped in the transactions changing the permissions of a platform on projects, so that every worker process
+rebuilds its cached permissions once they are committed.
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b1e4d7a3c25'
+down_revision: Union[str, None] = 'c52d7e8a4f61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('platform', sa.Column('acl_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('platform', 'acl_version')
@@ -0,0 +1,60 @@
+"""hot queries indexes
+
+Revision ID: b7e4c1d9f2a6
+Revises: 8d3f6b2a9c14
+Create Date: 2026-10-18 16:21:07.418305
+
+Indexes are created and dropped CONCURRENTLY, outside of the migration transaction, so that tables stay writable.
+A concurrent build interrupted midway leaves an INVALID index behind: drop it before running the migration again.
+Plans before and after are printed by `scripts/explain_indexes.py`.
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e4c1d9f2a6'
+down_revision: Union[str, None] = '8d3f6b2a9c14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# unique indexes on `id`, duplicates of the primary keys
+ID_INDEXED_TABLES = ['user', 'role', 'platform', 'project', 'regulatory_framework', 'entity_type', 'entity', 'access_key',
+                     'project_regulatory_framework_rel', 'project_user_rel', 'project_entity_rel',
+                     'platforms_shared_projects_rel']
+
+# single column indexes covered by a composite index or constraint starting with the same column
+SHARES_INDEXES = {'ix_platforms_shared_projects_rel_platform_id': 'platform_id',
+                  'ix_platforms_shared_projects_rel_project_id': 'project_id'}
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_access_key_platform_id_validity', 'access_key',
+                        ['platform_id', 'end_datetime', 'start_datetime'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_user_regular_created_at_id', 'user', ['created_at', 'id'],
+                        unique=False, postgresql_where=sa.text('role_id IS NULL'), postgresql_concurrently=True)
+        op.create_index('ix_platforms_shared_projects_rel_platform_id_project_id', 'platforms_shared_projects_rel',
+                        ['platform_id', 'project_id'],
+                        unique=False, postgresql_include=['readonly'], postgresql_concurrently=True)
+        for index_name in SHARES_INDEXES:
+            op.drop_index(index_name, table_name='platforms_shared_projects_rel', postgresql_concurrently=True)
+        for table in ID_INDEXED_TABLES:
+            op.drop_index(f'ix_{table}_id', table_name=table, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in ID_INDEXED_TABLES:
+            op.create_index(f'ix_{table}_id', table, ['id'], unique=True, postgresql_concurrently=True)
+        for index_name, column in SHARES_INDEXES.items():
+            op.create_index(index_name, 'platforms_shared_projects_rel', [column],
+                            unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_platforms_shared_projects_rel_platform_id_project_id',
+                      table_name='platforms_shared_projects_rel', postgresql_concurrently=True)
+        op.drop_index('ix_user_regular_created_at_id', table_name='user', postgresql_concurrently=True)
+        op.drop_index('ix_access_key_platform_id_validity', table_name='access_key', postgresql_concurrently=True)
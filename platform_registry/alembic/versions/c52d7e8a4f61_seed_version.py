@@ -0,0 +1,31 @@
+"""seed version
+
+Revision ID: c52d7e8a4f61
+Revises: 3a9f5e7c2b18
+Create Date: 2026-10-18 21:04:37.118520
+
+Containers compare it, with the Alembic revision, to the version of `initial_data` before loading it again.
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c52d7e8a4f61'
+down_revision: Union[str, None] = '3a9f5e7c2b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('seed_version',
+                    sa.Column('version', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+                    sa.PrimaryKeyConstraint('version'))
+
+
+def downgrade() -> None:
+    op.drop_table('seed_version')
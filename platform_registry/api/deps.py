@@ -1,25 +1,61 @@
+import json
 from datetime import datetime
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlencode
 
 import jwt
-from fastapi import Depends, HTTPException
-from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, Query, Response, Request
+from fastapi.security import OAuth2PasswordBearer, APIKeyHeader
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from platform_registry.services import users
-from platform_registry import models
-from platform_registry.core import database
+from platform_registry.services import users, access_keys
+from platform_registry.core import database, compression, serialization, tracing
+from platform_registry.core.principals import Principal, principal_cache
 from platform_registry.core.security import TokenPayload
 from platform_registry.core.config import settings
+from platform_registry.core.pagination import PageParams, Page, decode_cursor
+from platform_registry.core.etag import make_etag, etag_matches
+from platform_registry.core.response_cache import response_cache
 
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
+api_key_scheme = APIKeyHeader(name="X-API-Key", auto_error=False,
+                              description="Platforms may send their access key instead of logging in")
 
 
-async def current_user(db: Session = Depends(database.get_db), token: str = Depends(oauth2_scheme)):
+async def api_key_user(db: AsyncSession, api_key: str) -> Principal:
+    key_digest = access_keys.get_key_digest(api_key)
+    principal = principal_cache.get_by_api_key(key_digest)
+    if principal is None:
+        access_key = await access_keys.authenticate_access_key(db, key=api_key)
+        user = access_key and await users.get_platform_account_user(db, platform_id=access_key.platform_id)
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
+        principal = Principal.model_validate(user)
+        principal_cache.set_api_key(key_digest, principal, valid_until=access_key.end_datetime)
+    return principal
+
+
+async def current_user(request: Request,
+                       db: AsyncSession = Depends(database.get_db),
+                       token: str | None = Depends(oauth2_scheme),
+                       api_key: str | None = Depends(api_key_scheme)) -> Principal:
+    principal = await authenticated_principal(db, token=token, api_key=api_key)
+    # label of the requests counter of the platform, see `core.prometheus`
+    request.state.platform = principal.platform and principal.platform.name
+    return principal
+
+
+async def authenticated_principal(db: AsyncSession, token: str | None, api_key: str | None) -> Principal:
+    if api_key:
+        return await api_key_user(db, api_key=api_key)
     credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                           detail="Could not validate credentials",
                                           headers={"WWW-Authenticate": "Bearer"})
+    if not token:
+        raise credentials_exception
     try:
         payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
         username: str = payload.get("sub")
@@ -28,34 +64,150 @@ async def current_user(db: Session = Depends(database.get_db), token: str = Depe
         token_data = TokenPayload(username=username)
     except jwt.InvalidTokenError:
         raise credentials_exception
-    user = users.get_user_by_username(db, username=token_data.username)
-    if user is None:
-        raise credentials_exception
-    return user
+    principal = principal_cache.get(token_data.username, payload)
+    if principal is None:
+        user = await users.get_user_by_username(db, username=token_data.username)
+        if user is None:
+            raise credentials_exception
+        principal = Principal.model_validate(user)
+        principal_cache.set(principal)
+    return principal
 
 
-def current_active_user(user: models.User = Depends(current_user)):
+async def current_active_user(user: Principal = Depends(current_user)):
     if user.expiration_date <= datetime.now():
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Inactive user")
     return user
 
 
-def registry_admin_user(user: models.User = Depends(current_active_user)):
+async def registry_admin_user(user: Principal = Depends(current_active_user)):
     if not (user.role and user.role.is_registry_admin):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Not enough permissions: requires a Registry Admin account")
     return user
 
 
-def platform_user(user: models.User = Depends(current_active_user)):
+async def platform_user(user: Principal = Depends(current_active_user)):
     if not (user.role and user.role.is_platform):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Not enough permissions: requires a Platform account")
     return user
 
 
-def either_platform_or_admin(user: models.User = Depends(current_active_user)):
+async def either_platform_or_admin(user: Principal = Depends(current_active_user)):
     if not user.role or not (user.role.is_platform or user.role.is_registry_admin):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Not enough permissions: requires a Platform or Registry Administrator account")
     return user
+
+
+def pagination(limit: int | None = Query(default=None, ge=1, le=settings.PAGINATION_MAX_LIMIT,
+                                        description="Records per page. Without `limit` nor `cursor`, all records are "
+                                                    "returned in a single response"),
+               cursor: str | None = Query(default=None, description="`X-Next-Cursor` header of the previous page"),
+               estimate_total: bool = Query(default=False, description="Return an estimate of the total number "
+                                                                       "of records in the `X-Estimated-Total` header")
+               ) -> PageParams | None:
+    """ None, i.e: all records, unless the client opts in to pagination, so that clients unaware of the
+        `X-Next-Cursor` header still get every record
+    """
+    if limit is None and cursor is None:
+        return None
+    limit = limit or settings.PAGINATION_DEFAULT_LIMIT
+    try:
+        after_id, after_created_at = cursor and decode_cursor(cursor) or (None, None)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return PageParams(limit=limit, after_id=after_id, after_created_at=after_created_at, estimate_total=estimate_total)
+
+
+PAGE_HEADERS = ("X-Next-Cursor", "X-Estimated-Total")
+
+
+def set_page_headers(response: Response, page: Page) -> None:
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    if page.estimated_total is not None:
+        response.headers["X-Estimated-Total"] = str(page.estimated_total)
+
+
+def check_not_modified(request: Request, response: Response, user: Principal, state: list[tuple], cache_control: str) -> str:
+    """ answers `304 Not Modified` if the client already has the representation of `state`, before anything is loaded.
+        The ETag also depends on the query parameters and on the user, whose visibility may differ from other users'.
+    """
+    etag = make_etag(request.url.path, sorted(request.query_params.multi_items()), user.id, state)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return etag
+
+
+async def cached_response(request: Request, response: Response, user: Principal, schema, tags: tuple[str, ...],
+                          load: Callable[[], Awaitable[Any]], etag: str | None = None) -> Response:
+    """ body of a reference data route serialized as `schema`, kept in `response_cache` until one of `tags` is invalidated:
+        `load` is only awaited on a miss. Keys are scoped by role, as some responses differ between admins and platforms.
+        The ETag of the route, if any, is part of the key: a cached body always matches the ETag sent along.
+        Bodies are stored compressed to the encoding negotiated with the client, so that they are not compressed again.
+    """
+    encoding = compression.negotiate(request.headers.get("accept-encoding"))
+    role = user.role.is_registry_admin and "admin" or "platform"
+    key = f"{role}:{request.url.path}?{urlencode(sorted(request.query_params.multi_items()))}:{etag or ''}:{encoding or ''}"
+    versioned_key = await response_cache.versioned_key(key, tags)
+    cached = versioned_key and await response_cache.get(versioned_key)
+    if cached:
+        stored_headers, body = cached.split(b"\n", 1)
+        stored_headers = json.loads(stored_headers)
+    else:
+        result = await load()
+        if isinstance(result, Page):
+            set_page_headers(response, result)
+        with tracing.span("serialize"):
+            body = serialization.dump_json(schema, result)
+        stored_headers = {name: response.headers[name] for name in PAGE_HEADERS if name in response.headers}
+        if encoding and compression.compressible("application/json", len(body)):
+            body = compression.compress(body, encoding)
+            stored_headers["Content-Encoding"] = encoding
+        if versioned_key:
+            await response_cache.set(versioned_key, json.dumps(stored_headers).encode() + b"\n" + body)
+    content_encoding = stored_headers.pop("Content-Encoding", None)
+    response.headers.update(stored_headers)
+    served = Response(content=body, media_type="application/json",
+                      headers={name: value for name, value in response.headers.items() if name != "content-length"})
+    if content_encoding:
+        compression.set_encoding_headers(served.headers, content_encoding)
+    return served
+
+
+def bulk_request_body(item_schema: type[BaseModel]) -> dict:
+    """ `openapi_extra` of the routes reading their body with `bulk_items`, which FastAPI can not document by itself """
+    array = {"type": "array", "items": {"$ref": f"#/components/schemas/{item_schema.__name__}"}}
+    return {"requestBody": {"required": True,
+                            "content": {"application/json": {"schema": array},
+                                        "application/x-ndjson": {"schema": array}}}}
+
+
+async def bulk_items(request: Request) -> list[Any]:
+    """ items of a bulk request body: either a JSON array, or NDJSON with one item per line.
+        Unparsable NDJSON lines are kept as `None` items, to be reported as invalid at their index.
+    """
+    body = await request.body()
+    if request.headers.get("content-type", "").split(";")[0] in ("application/x-ndjson", "application/ndjson"):
+        items = []
+        for line in body.splitlines():
+            if line.strip():
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    items.append(None)
+    else:
+        try:
+            items = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body is not valid JSON")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be a JSON array")
+    if len(items) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"At most {settings.BULK_MAX_ITEMS} items are accepted per request")
+    return items
@@ -4,7 +4,9 @@ from platform_registry.api.routes import (auth,
                                           roles,
                                           entities,
                                           platforms,
-                                          projects,)
+                                          projects,
+                                          monitoring,
+                                          metrics,)
 
 api_router = APIRouter()
 
@@ -15,3 +17,5 @@ api_router.include_router(users.regular_users_router, prefix="/users", tags=["Re
 api_router.include_router(entities.router, prefix="/entities", tags=["Entities"])
 api_router.include_router(platforms.router, prefix="/platforms", tags=["Platforms"])
 api_router.include_router(projects.router, prefix="/projects", tags=["Projects"])
+api_router.include_router(monitoring.router, prefix="/monitoring", tags=["Monitoring"])
+api_router.include_router(metrics.router, tags=["Monitoring"])
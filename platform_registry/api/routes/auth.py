@@ -1,13 +1,16 @@
+import time
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from platform_registry.schemas import LoginResponse
 from platform_registry.core import database
-from platform_registry.core.security import create_access_token, authenticate_user
+from platform_registry.core.prometheus import request_metrics
+from platform_registry.core.principals import Principal, principal_cache, principal_claims
+from platform_registry.core.security import create_access_token, authenticate_user, PasswordHashingBusy
 from platform_registry.services import users
 
 router = APIRouter()
@@ -15,13 +18,23 @@ router = APIRouter()
 
 @router.post(path="/auth/login", response_model=LoginResponse)
 async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-                db: Session = Depends(database.get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+                db: AsyncSession = Depends(database.get_db)):
+    started_at = time.perf_counter()
+    try:
+        user = await authenticate_user(db, form_data.username, form_data.password)
+    except PasswordHashingBusy:
+        request_metrics.observe_login("busy", time.perf_counter() - started_at)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="Too many concurrent logins, please retry",
+                            headers={"Retry-After": "1"})
+    request_metrics.observe_login(user and "success" or "failure", time.perf_counter() - started_at)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Incorrect username or password")
-    user = users.update_user_last_login(db, user)
-    token = create_access_token(data={"sub": user.username})
+    user = await users.update_user_last_login(db, user)
+    principal = Principal.model_validate(user)
+    principal_cache.set(principal)
+    token = create_access_token(data=principal_claims(principal))
     return LoginResponse(access_token=token.access_token,
                          username=user.username,
                          firstname=user.firstname,
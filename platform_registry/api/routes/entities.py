@@ -1,27 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from platform_registry.api import deps
-from platform_registry.models import User
+from platform_registry.core.config import settings
+from platform_registry.core.pagination import PageParams
+from platform_registry.core.principals import Principal
+from platform_registry.core.query_stats import query_budget
+from platform_registry.core.response_cache import ENTITIES, ENTITY_TYPES
 from platform_registry.services import entities
 from platform_registry import schemas
 from platform_registry.core import database
+from platform_registry.core.serialization import FastJSONRoute
 
-router = APIRouter()
-entity_types_router = APIRouter(prefix="/types")
+router = APIRouter(route_class=FastJSONRoute)
+entity_types_router = APIRouter(prefix="/types", route_class=FastJSONRoute)
 
 
-@router.get(path="/", response_model=list[schemas.Entity])
-async def get_entities(db: Session = Depends(database.get_db),
-                       user: User = Depends(deps.either_platform_or_admin)):
-    return entities.get_entities(db)
+@router.get(path="/", response_model=list[schemas.Entity], dependencies=[Depends(query_budget(5))])
+async def get_entities(request: Request,
+                       response: Response,
+                       page: PageParams | None = Depends(deps.pagination),
+                       db: AsyncSession = Depends(database.get_db),
+                       user: Principal = Depends(deps.either_platform_or_admin)):
+    etag = deps.check_not_modified(request, response, user, await entities.get_entities_state(db),
+                                   cache_control=settings.ENTITIES_CACHE_CONTROL)
+    return await deps.cached_response(request, response, user, schema=list[schemas.Entity], tags=(ENTITIES, ENTITY_TYPES),
+                                      load=lambda: entities.get_entities(db, page=page), etag=etag)
+
+
+@router.post(path="/bulk", response_model=list[schemas.BulkItemResult],
+             summary="Create many entities at once",
+             description="Takes a JSON array, or NDJSON with `Content-Type: application/x-ndjson`. "
+                         "Items are created in a single transaction and reported one by one as `created`, `duplicate`, "
+                         "`archived` (matching a soft-deleted record) or `invalid`",
+             openapi_extra=deps.bulk_request_body(schemas.EntityCreate))
+async def create_entities(items: list = Depends(deps.bulk_items),
+                          db: AsyncSession = Depends(database.get_db),
+                          user: Principal = Depends(deps.registry_admin_user)):
+    return await entities.create_entities(db=db, items=items)
 
 
 @router.get(path="/{entity_id}", response_model=schemas.Entity)
 async def get_entity(entity_id: str,
-                     db: Session = Depends(database.get_db),
-                     user: User = Depends(deps.either_platform_or_admin)):
-    db_entity = entities.get_entity(db, entity_id=entity_id)
+                     db: AsyncSession = Depends(database.get_db),
+                     user: Principal = Depends(deps.either_platform_or_admin)):
+    db_entity = await entities.get_entity(db, entity_id=entity_id)
     if db_entity is None:
         raise HTTPException(status_code=404, detail="Entity not found")
     return db_entity
@@ -29,22 +52,28 @@ async def get_entity(entity_id: str,
 
 @router.post(path="/", response_model=schemas.Entity, status_code=status.HTTP_201_CREATED)
 async def create_entity(entity: schemas.EntityCreate,
-                        db: Session = Depends(database.get_db),
-                        user: User = Depends(deps.registry_admin_user)):
-    return entities.create_entity(db=db, entity=entity)
+                        db: AsyncSession = Depends(database.get_db),
+                        user: Principal = Depends(deps.registry_admin_user)):
+    return await entities.create_entity(db=db, entity=entity)
 
 
 @entity_types_router.get(path="/", response_model=list[schemas.EntityType])
-async def get_entity_types(db: Session = Depends(database.get_db),
-                           user: User = Depends(deps.registry_admin_user)):
-    return entities.get_entity_types(db)
+async def get_entity_types(request: Request,
+                           response: Response,
+                           page: PageParams | None = Depends(deps.pagination),
+                           db: AsyncSession = Depends(database.get_db),
+                           user: Principal = Depends(deps.registry_admin_user)):
+    etag = deps.check_not_modified(request, response, user, await entities.get_entity_types_state(db),
+                                   cache_control=settings.ENTITIES_CACHE_CONTROL)
+    return await deps.cached_response(request, response, user, schema=list[schemas.EntityType], tags=(ENTITY_TYPES,),
+                                      load=lambda: entities.get_entity_types(db, page=page), etag=etag)
 
 
 @entity_types_router.get(path="/{entity_type_id}", response_model=schemas.EntityType)
 async def get_entity_type(entity_type_id: str,
-                          db: Session = Depends(database.get_db),
-                          user: User = Depends(deps.registry_admin_user)):
-    db_entity_type = entities.get_entity_type(db, entity_type_id=entity_type_id)
+                          db: AsyncSession = Depends(database.get_db),
+                          user: Principal = Depends(deps.registry_admin_user)):
+    db_entity_type = await entities.get_entity_type(db, entity_type_id=entity_type_id)
     if db_entity_type is None:
         raise HTTPException(status_code=404, detail="EntityType not found")
     return db_entity_type
@@ -52,9 +81,9 @@ async def get_entity_type(entity_type_id: str,
 
 @entity_types_router.post(path="/", response_model=schemas.EntityType, status_code=status.HTTP_201_CREATED)
 async def create_entity_type(entity_type: schemas.EntityTypeCreate,
-                             db: Session = Depends(database.get_db),
-                             user: User = Depends(deps.registry_admin_user)):
-    return entities.create_entity_type(db=db, entity_type=entity_type)
+                             db: AsyncSession = Depends(database.get_db),
+                             user: Principal = Depends(deps.registry_admin_user)):
+    return await entities.create_entity_type(db=db, entity_type=entity_type)
 
 
 router.include_router(entity_types_router)
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, HTTPException, Response, status
+
+from platform_registry.core import prometheus
+from platform_registry.core.config import settings
+
+router = APIRouter()
+
+
+@router.get(path="/metrics", response_class=Response,
+            summary="Metrics in the Prometheus text format",
+            description="Not authenticated, for scrapers: restrict its access at the network level. "
+                        "Disabled unless `METRICS_ENABLED` is set. "
+                        "With `METRICS_MULTIPROCESS_DIR` set, metrics are those of all the worker processes")
+async def get_metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return Response(content=await prometheus.exposition(), media_type=prometheus.CONTENT_TYPE)
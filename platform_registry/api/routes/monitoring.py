@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, Query
+
+from platform_registry import schemas
+from platform_registry.api.deps import registry_admin_user
+from platform_registry.core.acl import projects_acl
+from platform_registry.core.pool import pool_monitor
+from platform_registry.core.principals import principal_cache
+from platform_registry.core.response_cache import response_cache
+from platform_registry.core.security import password_hashing_pool
+from platform_registry.core.slow_queries import slow_query_log
+
+router = APIRouter(dependencies=[Depends(registry_admin_user)])
+
+
+@router.get(path="/principal-cache", response_model=schemas.PrincipalCacheStats,
+            summary="Counters of the authenticated users cache of this worker process",
+            description="`claims_hits` counts principals rebuilt from token claims without any database access")
+async def get_principal_cache_stats():
+    return principal_cache.stats()
+
+
+@router.get(path="/acl-cache", response_model=schemas.CacheStats,
+            summary="Counters of the projects permissions cache of this worker process")
+async def get_acl_cache_stats():
+    return projects_acl.stats()
+
+
+@router.get(path="/response-cache", response_model=schemas.ResponseCacheStats,
+            summary="Counters of the reference data responses cache",
+            description="Counters are those of this worker process, whatever the backend")
+async def get_response_cache_stats():
+    return response_cache.stats()
+
+
+@router.get(path="/password-hashing", response_model=schemas.PasswordHashingStats,
+            summary="bcrypt thread pool usage of this worker process",
+            description="Histograms of bcrypt duration and of time spent waiting for a free thread, in seconds")
+async def get_password_hashing_stats():
+    return password_hashing_pool.stats()
+
+
+@router.get(path="/db-pool", response_model=schemas.DatabasePoolStats,
+            summary="Database connection pool usage of this worker process",
+            description="`checkout_wait_seconds` is the time spent obtaining a connection, "
+                        "`checkout_duration_seconds` the time connections are held")
+async def get_db_pool_stats():
+    return pool_monitor.stats()
+
+
+@router.get(path="/slow-queries", response_model=list[schemas.SlowQueryStats],
+            summary="Slowest SQL statements of this worker process, by total time spent",
+            description="Statements slower than `SLOW_QUERY_THRESHOLD_MS` are grouped by fingerprint, i.e: "
+                        "without their literals. `plan` is captured when `SLOW_QUERY_EXPLAIN` is set")
+async def get_slow_queries(limit: int = Query(default=20, ge=1, le=1000)):
+    return slow_query_log.top(limit)
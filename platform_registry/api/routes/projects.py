@@ -1,34 +1,124 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-
-from platform_registry.models import User
+import csv
+import io
+
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from platform_registry.core.config import settings
+from platform_registry.core.pagination import PageParams
+from platform_registry.core.principals import Principal
+from platform_registry.core.query_stats import query_budget
+from platform_registry.core.response_cache import REGULATORY_FRAMEWORKS
 from platform_registry.services import projects, regulatory_frameworks as reg_frameworks
 from platform_registry import schemas
 from platform_registry.api import deps
 from platform_registry.core import database
+from platform_registry.core.serialization import FastJSONRoute
 
-router = APIRouter()
-frameworks_router = APIRouter(prefix="/frameworks")
+router = APIRouter(route_class=FastJSONRoute)
+frameworks_router = APIRouter(prefix="/frameworks", route_class=FastJSONRoute)
 
 
-@router.get(path="/", response_model=list[schemas.ProjectWithDetails],
+@router.get(path="/", response_model=list[schemas.ProjectWithDetails], dependencies=[Depends(query_budget(8))],
             summary="List owned projects and those shared by other platforms "
                     "with details over involved users and entities")
-async def get_projects(db: Session = Depends(database.get_db),
-                       user: User = Depends(deps.either_platform_or_admin)):
-    return projects.get_projects(db, user=user)
-
-
-@router.get(path="/{project_id}", response_model=schemas.ProjectWithDetails)
+async def get_projects(request: Request,
+                       response: Response,
+                       page: PageParams | None = Depends(deps.pagination),
+                       db: AsyncSession = Depends(database.get_db),
+                       user: Principal = Depends(deps.either_platform_or_admin)):
+    deps.check_not_modified(request, response, user, await projects.get_projects_state(db, user=user),
+                            cache_control=settings.PROJECTS_CACHE_CONTROL)
+    result = await projects.get_projects(db, user=user, page=page)
+    deps.set_page_headers(response, result)
+    return result
+
+
+@router.post(path="/permissions", response_model=list[schemas.ProjectPermissions],
+             summary="Check the permissions of your platform on a batch of projects",
+             description="Unknown projects and projects not shared with your platform get no permission at all")
+async def get_projects_permissions(query: schemas.ProjectPermissionsQuery,
+                                   db: AsyncSession = Depends(database.get_db),
+                                   user: Principal = Depends(deps.platform_user)):
+    return await projects.get_projects_permissions(db=db, platform=user.platform, project_ids=query.project_ids)
+
+
+@router.post(path="/share", response_model=list[schemas.ProjectShareStatus],
+             summary="Share many projects with many platforms at once",
+             description="Every project is shared with every recipient platform in a single transaction. "
+                         "Sharing a project again with a platform updates its access mode `readonly`.\n\n"
+                         "Returns the status of each (project, platform) pair.")
+async def share_projects(share_with: schemas.ProjectsShare,
+                         db: AsyncSession = Depends(database.get_db),
+                         user: Principal = Depends(deps.platform_user)):
+    return await projects.share_projects(db=db, platform=user.platform, project_ids=share_with.project_ids,
+                                         recipients=share_with.recipient_platform_ids)
+
+
+@router.post(path="/unshare", response_model=list[schemas.ProjectShareStatus],
+             summary="Stop sharing many projects with many platforms at once",
+             description="Returns the status of each (project, platform) pair.")
+async def unshare_projects(unshare: schemas.ProjectsUnshare,
+                           db: AsyncSession = Depends(database.get_db),
+                           user: Principal = Depends(deps.platform_user)):
+    return await projects.unshare_projects(db=db, platform=user.platform, project_ids=unshare.project_ids,
+                                           platform_ids=unshare.platform_ids)
+
+
+PROJECT_CSV_HEADER = ["id", "code", "name", "description", "start_date", "end_date", "owner_platform",
+                      "allowed_platforms", "regulatory_frameworks", "involved_entities", "involved_users"]
+
+
+def project_csv_row(project: schemas.ProjectWithDetails) -> list:
+    return [project.id, project.code, project.name, project.description, project.start_date, project.end_date,
+            project.owner_platform.name,
+            ";".join(p.name for p in project.allowed_platforms),
+            ";".join(f.name for f in project.regulatory_frameworks),
+            ";".join(e.name for e in project.involved_entities),
+            ";".join(u.username for u in project.involved_users)]
+
+
+@router.get(path="/export", response_class=StreamingResponse,
+            summary="Export all visible projects as NDJSON or CSV",
+            description="Unlike the list endpoint, the export is not paginated: projects are streamed as they are read "
+                        "from the database, with the same visibility rules. NDJSON lines are `ProjectWithDetails` objects, "
+                        "CSV multi-valued columns are separated by `;`")
+async def export_projects(export_format: schemas.ExportFormat = Query(default=schemas.ExportFormat.NDJSON, alias="format"),
+                          session_factory: async_sessionmaker = Depends(database.get_session_factory),
+                          user: Principal = Depends(deps.either_platform_or_admin)):
+    async def export():
+        async with session_factory() as db:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if export_format == schemas.ExportFormat.CSV:
+                writer.writerow(PROJECT_CSV_HEADER)
+            async for batch in projects.stream_projects(db, user=user):
+                for project in (schemas.ProjectWithDetails.model_validate(p, from_attributes=True) for p in batch):
+                    if export_format == schemas.ExportFormat.CSV:
+                        writer.writerow(project_csv_row(project))
+                    else:
+                        buffer.write(project.model_dump_json() + "\n")
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+
+    media_type = export_format == schemas.ExportFormat.CSV and "text/csv" or "application/x-ndjson"
+    return StreamingResponse(export(), media_type=media_type,
+                             headers={"Content-Disposition": f"attachment; filename=projects.{export_format.value}"})
+
+
+@router.get(path="/{project_id}", response_model=schemas.ProjectWithDetails, dependencies=[Depends(query_budget(8))])
 async def get_project(project_id: str,
-                      db: Session = Depends(database.get_db),
-                      user: User = Depends(deps.either_platform_or_admin)):
-    project = projects.get_project_by_id(db, project_id=project_id)
+                      db: AsyncSession = Depends(database.get_db),
+                      user: Principal = Depends(deps.either_platform_or_admin)):
+    project = await projects.get_project_by_id(db, project_id=project_id)
     if project is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
 
     if user.role.is_platform and \
-       not projects.platform_can_access_project(platform=user.platform, target_project=project):
+       not await projects.platform_can_access_project(db=db, platform=user.platform, target_project=project):
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Project does not belong to Platform")
     return project
 
@@ -37,25 +127,25 @@ async def get_project(project_id: str,
              summary="Create a new project and optionally assign users and entities",
              description="As a **Platform User**, the project being created will be auto-attached to your platform.")
 async def create_project(project: schemas.ProjectCreate,
-                         db: Session = Depends(database.get_db),
-                         user: User = Depends(deps.platform_user)):
-    return projects.create_project(db=db, project=project, platform_id=user.platform_id)
+                         db: AsyncSession = Depends(database.get_db),
+                         user: Principal = Depends(deps.platform_user)):
+    return await projects.create_project(db=db, project=project, platform_id=user.platform_id)
 
 
 @router.patch(path="/{project_id}", response_model=schemas.ProjectWithDetails,
               summary="Update project details, related regulatory frameworks, users and entities",)
 async def patch_project(project_id: str,
                         project_in: schemas.ProjectPatch,
-                        db: Session = Depends(database.get_db),
-                        user: User = Depends(deps.platform_user)):
-    project = projects.get_project_by_id(db, project_id=project_id)
+                        db: AsyncSession = Depends(database.get_db),
+                        user: Principal = Depends(deps.platform_user)):
+    project = await projects.get_project_by_id(db, project_id=project_id)
     if not project:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
 
-    if not projects.platform_can_edit_project(db=db, platform=user.platform, target_project=project):
+    if not await projects.platform_can_edit_project(db=db, platform=user.platform, target_project=project):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="This project is owned by another platform or you are not allowed to edit it")
-    return projects.update_project(db=db, project=project, project_in=project_in)
+    return await projects.update_project(db=db, project=project, project_in=project_in)
 
 
 @router.post(path="/{project_id}/share", response_model=schemas.ProjectShareResult,
@@ -64,28 +154,46 @@ async def patch_project(project_id: str,
                          "* With `readonly` set to `false`, the recipient platform will be able to edit the project details.")
 async def share_project(project_id: str,
                         share_with: schemas.ProjectShare,
-                        db: Session = Depends(database.get_db),
-                        user: User = Depends(deps.platform_user)):
-    project = projects.get_project_by_id(db, project_id=project_id)
+                        db: AsyncSession = Depends(database.get_db),
+                        user: Principal = Depends(deps.platform_user)):
+    project = await projects.get_project_by_id(db, project_id=project_id)
     if not project:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
-    if not projects.platform_can_share_project(platform=user.platform, project=project):
+    if not await projects.platform_can_share_project(db=db, platform=user.platform, project=project):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="You can not share this project as it is owned by another platform")
-    return projects.share_project(db=db, project=project, share_with=share_with)
+    return await projects.share_project(db=db, platform=user.platform, project=project, share_with=share_with)
+
+
+@frameworks_router.get(path="/", response_model=list[schemas.RegulatoryFramework], dependencies=[Depends(query_budget(4))])
+async def get_regulatory_frameworks(request: Request,
+                                    response: Response,
+                                    page: PageParams | None = Depends(deps.pagination),
+                                    db: AsyncSession = Depends(database.get_db),
+                                    user: Principal = Depends(deps.either_platform_or_admin)):
+    etag = deps.check_not_modified(request, response, user, await reg_frameworks.get_regulatory_frameworks_state(db),
+                                   cache_control=settings.FRAMEWORKS_CACHE_CONTROL)
+    return await deps.cached_response(request, response, user, schema=list[schemas.RegulatoryFramework],
+                                      tags=(REGULATORY_FRAMEWORKS,), etag=etag,
+                                      load=lambda: reg_frameworks.get_regulatory_frameworks(db, page=page))
 
 
-@frameworks_router.get(path="/", response_model=list[schemas.RegulatoryFramework])
-async def get_regulatory_frameworks(db: Session = Depends(database.get_db),
-                                    user: User = Depends(deps.either_platform_or_admin)):
-    return reg_frameworks.get_regulatory_frameworks(db)
+@frameworks_router.post(path="/bulk", response_model=list[schemas.BulkItemResult],
+                        summary="Create many regulatory frameworks at once",
+                        description="Takes a JSON array, or NDJSON with `Content-Type: application/x-ndjson`. "
+                                    "Items are created in a single transaction and reported one by one as `created`, `duplicate` or `invalid`",
+                        openapi_extra=deps.bulk_request_body(schemas.RegulatoryFrameworkCreate))
+async def create_regulatory_frameworks(items: list = Depends(deps.bulk_items),
+                                       db: AsyncSession = Depends(database.get_db),
+                                       user: Principal = Depends(deps.registry_admin_user)):
+    return await reg_frameworks.create_regulatory_frameworks(db=db, items=items)
 
 
 @frameworks_router.get(path="/{framework_id}", response_model=schemas.RegulatoryFramework)
 async def get_regulatory_framework(regulatory_framework_id: str,
-                                   db: Session = Depends(database.get_db),
-                                   user: User = Depends(deps.either_platform_or_admin)):
-    db_regulatory_framework = reg_frameworks.get_regulatory_framework(db, framework_id=regulatory_framework_id)
+                                   db: AsyncSession = Depends(database.get_db),
+                                   user: Principal = Depends(deps.either_platform_or_admin)):
+    db_regulatory_framework = await reg_frameworks.get_regulatory_framework(db, framework_id=regulatory_framework_id)
     if db_regulatory_framework is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="RegulatoryFramework not found")
     return db_regulatory_framework
@@ -93,21 +201,21 @@ async def get_regulatory_framework(regulatory_framework_id: str,
 
 @frameworks_router.post(path="/", response_model=schemas.RegulatoryFramework, status_code=status.HTTP_201_CREATED)
 async def create_regulatory_framework(regulatory_framework: schemas.RegulatoryFrameworkCreate,
-                                      db: Session = Depends(database.get_db),
-                                      user: User = Depends(deps.registry_admin_user)):
-    return reg_frameworks.create_regulatory_framework(db=db, regulatory_framework=regulatory_framework)
+                                      db: AsyncSession = Depends(database.get_db),
+                                      user: Principal = Depends(deps.registry_admin_user)):
+    return await reg_frameworks.create_regulatory_framework(db=db, regulatory_framework=regulatory_framework)
 
 
 @frameworks_router.patch(path="/{framework_id}", response_model=schemas.RegulatoryFramework)
 async def patch_regulatory_framework(framework_id: str,
                                      framework_in: schemas.RegulatoryFrameworkPatch,
-                                     db: Session = Depends(database.get_db),
-                                     user: User = Depends(deps.registry_admin_user)):
-    framework = reg_frameworks.get_regulatory_framework(db, framework_id=framework_id)
+                                     db: AsyncSession = Depends(database.get_db),
+                                     user: Principal = Depends(deps.registry_admin_user)):
+    framework = await reg_frameworks.get_regulatory_framework(db, framework_id=framework_id)
     if not framework:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Regulatory Framework not found")
-    return reg_frameworks.update_regulatory_framework(db=db,
-                                                      framework=framework,
-                                                      framework_in=framework_in)
+    return await reg_frameworks.update_regulatory_framework(db=db,
+                                                            framework=framework,
+                                                            framework_in=framework_in)
 
 router.include_router(frameworks_router)
@@ -1,26 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from platform_registry.services import roles
 from platform_registry import schemas
-from platform_registry.api.deps import registry_admin_user
+from platform_registry.api.deps import registry_admin_user, cached_response, check_not_modified
 from platform_registry.core import database
+from platform_registry.core.config import settings
+from platform_registry.core.principals import Principal
+from platform_registry.core.response_cache import ROLES
+from platform_registry.core.serialization import FastJSONRoute
 
 
-router = APIRouter(dependencies=[Depends(registry_admin_user)])
+router = APIRouter(dependencies=[Depends(registry_admin_user)], route_class=FastJSONRoute)
 
 
 @router.get(path="/", response_model=list[schemas.Role],
             description="Returns mainly two major roles: `Registry Admin` and `Platform`")
-async def get_roles(db: Session = Depends(database.get_db)):
-    return roles.get_roles(db)
+async def get_roles(request: Request,
+                    response: Response,
+                    db: AsyncSession = Depends(database.get_db),
+                    user: Principal = Depends(registry_admin_user)):
+    etag = check_not_modified(request, response, user, await roles.get_roles_state(db),
+                              cache_control=settings.ROLES_CACHE_CONTROL)
+    return await cached_response(request, response, user, schema=list[schemas.Role], tags=(ROLES,), etag=etag,
+                                 load=lambda: roles.get_roles(db))
 
 
 @router.post(path="/", response_model=schemas.Role, status_code=status.HTTP_201_CREATED,
              description="Two roles are expected to be created: `Registry Admin` and `Platform`. "
                          "No further roles are allowed to be created")
-async def create_role(role: schemas.RoleCreate, db: Session = Depends(database.get_db)):
+async def create_role(role: schemas.RoleCreate, db: AsyncSession = Depends(database.get_db)):
     msg = "Role must be either Platform or Registry Admin"
     if not (role.is_platform or role.is_registry_admin):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=msg)
@@ -29,7 +39,7 @@ async def create_role(role: schemas.RoleCreate, db: Session = Depends(database.g
 
     role_type = role.is_platform and "Platform" or "Registry Admin"
     try:
-        role = roles.create_role(db=db, role=role)
+        role = await roles.create_role(db=db, role=role)
     except IntegrityError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail=f"A role of type '{role_type}' has been previously added")
@@ -1,50 +1,73 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from platform_registry.api import deps
-from platform_registry.models import User
+from platform_registry.core.pagination import PageParams
+from platform_registry.core.principals import Principal
+from platform_registry.core.query_stats import query_budget
 from platform_registry.services import users
 from platform_registry import schemas
 from platform_registry.core import database
+from platform_registry.core.serialization import FastJSONRoute
 
-regular_users_router = APIRouter(prefix="/regular")
-system_users_router = APIRouter(prefix="/system")
+regular_users_router = APIRouter(prefix="/regular", route_class=FastJSONRoute)
+system_users_router = APIRouter(prefix="/system", route_class=FastJSONRoute)
 
 
-@regular_users_router.get(path="/", response_model=list[schemas.RegularUser],
+@regular_users_router.get(path="/", response_model=list[schemas.RegularUser], dependencies=[Depends(query_budget(3))],
                           summary="List all users who may be assigned as members and work on projects")
-async def get_users(db: Session = Depends(database.get_db),
-                    user: User = Depends(deps.either_platform_or_admin)):
-    return users.get_regular_users(db=db)
+async def get_users(response: Response,
+                    page: PageParams | None = Depends(deps.pagination),
+                    db: AsyncSession = Depends(database.get_db),
+                    user: Principal = Depends(deps.either_platform_or_admin)):
+    result = await users.get_regular_users(db=db, page=page)
+    deps.set_page_headers(response, result)
+    return result
 
 
 @regular_users_router.post(path="/", response_model=schemas.RegularUser, status_code=status.HTTP_201_CREATED)
 async def create_user(user_in: schemas.RegularUserCreate,
-                      db: Session = Depends(database.get_db),
-                      user: User = Depends(deps.either_platform_or_admin)):
-    db_user = users.get_user_by_username(db=db, username=user_in.username, user=user)
+                      db: AsyncSession = Depends(database.get_db),
+                      user: Principal = Depends(deps.either_platform_or_admin)):
+    db_user = await users.get_user_by_username(db=db, username=user_in.username, user=user)
     if db_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail=f"A user is already registered with the given username <{user_in.username}>")
-    return users.create_user(db=db, user=user_in)
+    return await users.create_user(db=db, user=user_in)
+
+
+@regular_users_router.post(path="/bulk", response_model=list[schemas.BulkItemResult],
+                           summary="Create many users at once",
+                           description="Takes a JSON array, or NDJSON with `Content-Type: application/x-ndjson`. "
+                                       "Items are created in a single transaction and reported one by one as `created`, `duplicate`, "
+                                       "`archived` (matching a soft-deleted record) or `invalid`",
+                           openapi_extra=deps.bulk_request_body(schemas.RegularUserCreate))
+async def create_users(items: list = Depends(deps.bulk_items),
+                       db: AsyncSession = Depends(database.get_db),
+                       user: Principal = Depends(deps.either_platform_or_admin)):
+    return await users.create_users(db=db, items=items)
 
 
 @regular_users_router.patch(path="/{username}", response_model=schemas.RegularUser, status_code=status.HTTP_200_OK)
 async def patch_user(username: str,
                      user_in: schemas.RegularUserPatch,
-                     db: Session = Depends(database.get_db),
-                     user: User = Depends(deps.either_platform_or_admin)):
-    db_user = users.get_user_by_username(db=db, username=username)
+                     db: AsyncSession = Depends(database.get_db),
+                     user: Principal = Depends(deps.either_platform_or_admin)):
+    db_user = await users.get_user_by_username(db=db, username=username)
     if not db_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     if not users.is_user_updatable(user=db_user):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The target is not a regular user and can not be updated")
-    return users.update_user(db=db, user=db_user, user_in=user_in)
+    return await users.update_user(db=db, user=db_user, user_in=user_in)
 
 
 @system_users_router.get(path="/", response_model=list[schemas.SystemUser],
                          description="List users able to use this API, who can be authenticated and assigned "
                                      "a `Registry Admin` or `Platform` role")
-async def get_system_users(db: Session = Depends(database.get_db),
-                           user: User = Depends(deps.registry_admin_user)):
-    return users.get_all_users(db=db)
+async def get_system_users(response: Response,
+                           page: PageParams | None = Depends(deps.pagination),
+                           db: AsyncSession = Depends(database.get_db),
+                           user: Principal = Depends(deps.registry_admin_user)):
+    result = await users.get_all_users(db=db, page=page)
+    deps.set_page_headers(response, result)
+    return result
@@ -0,0 +1,154 @@
+from enum import IntFlag
+from typing import Iterable
+
+from sqlalchemy import Connection, Update, event, inspect, select, union_all, literal, case, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+
+from platform_registry import models
+from platform_registry.core.cache import TTLCache
+from platform_registry.core.config import settings
+
+# platforms whose permissions changed in the current transaction, kept in `Session.info`
+ACL_INVALIDATIONS = "acl_invalidations"
+ALL_PLATFORMS = "*"
+
+
+class Permission(IntFlag):
+    NONE = 0
+    READ = 1
+    EDIT = 2
+    SHARE = 4
+    OWNER = READ | EDIT | SHARE
+
+
+class PlatformPermissions:
+    """ permissions of one platform on every project it can read, by project id """
+
+    def __init__(self, permissions: dict[str, Permission], version: int):
+        self._permissions = permissions
+        self.version = version
+
+    def get(self, project_id: str) -> Permission:
+        return self._permissions.get(project_id, Permission.NONE)
+
+    def allows(self, project_id: str, permission: Permission) -> bool:
+        return permission in self.get(project_id)
+
+    def __len__(self) -> int:
+        return len(self._permissions)
+
+
+class ProjectsACL:
+    """ read/edit/share checks of platforms on projects.
+        The permissions map of a platform is built with a single query, then each check is a dict lookup.
+        Maps are versioned by the `acl_version` of the platform, bumped in the transaction sharing a project or changing
+        its owner, and read by primary key on each check: changes committed by any worker process are seen at once.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self._cache = TTLCache(ttl=ttl, max_size=max_size)
+
+    @staticmethod
+    def _permissions_query(platform_id: str):
+        owned = select(models.Project.id, literal(int(Permission.OWNER)))\
+                    .filter(models.Project.owner_platform_id == platform_id)
+        shared = select(models.PlatformsSharedProjectsRel.project_id,
+                        case((models.PlatformsSharedProjectsRel.readonly, int(Permission.READ)),
+                             else_=int(Permission.READ | Permission.EDIT)))\
+                    .filter(models.PlatformsSharedProjectsRel.platform_id == platform_id)
+        return union_all(owned, shared)
+
+    async def permissions(self, db: AsyncSession, platform_id: str) -> PlatformPermissions:
+        # read before the permissions: a map is never labeled with a version newer than its content
+        version = await db.scalar(select(models.Platform.acl_version).filter(models.Platform.id == platform_id))
+        cached = self._cache.get(platform_id)
+        if cached is not None and cached.version == version:
+            return cached
+        permissions: dict[str, Permission] = {}
+        for project_id, permission in (await db.execute(self._permissions_query(platform_id))).all():
+            permissions[project_id] = permissions.get(project_id, Permission.NONE) | Permission(permission)
+        platform_permissions = PlatformPermissions(permissions, version=version)
+        # the version bumped by uncommitted changes is reused by others if they are rolled back
+        if ACL_INVALIDATIONS not in db.sync_session.info:
+            self._cache.set(platform_id, platform_permissions)
+        return platform_permissions
+
+    async def check(self, db: AsyncSession, platform_id: str, project_id: str, permission: Permission) -> bool:
+        return (await self.permissions(db, platform_id)).allows(project_id, permission)
+
+    async def check_many(self, db: AsyncSession, platform_id: str, project_ids: Iterable[str]) -> dict[str, Permission]:
+        permissions = await self.permissions(db, platform_id)
+        return {project_id: permissions.get(project_id) for project_id in project_ids}
+
+    async def invalidate(self, db: AsyncSession, *platform_ids: str) -> None:
+        """ for permissions changed without the ORM, e.g: by a bulk statement, before the transaction is committed """
+        await db.execute(_bump_versions(platform_ids))
+        db.sync_session.info.setdefault(ACL_INVALIDATIONS, set()).update(platform_ids)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+projects_acl = ProjectsACL(ttl=settings.ACL_CACHE_TTL_SECONDS,
+                           max_size=settings.ACL_CACHE_MAX_SIZE)
+
+
+def _bump_versions(platform_ids) -> Update:
+    platform = models.Platform.__table__
+    # `modified_at` is kept: the platform itself did not change
+    bump = update(platform).values(acl_version=platform.c.acl_version + 1, modified_at=platform.c.modified_at)
+    if ALL_PLATFORMS in platform_ids:
+        return bump
+    return bump.filter(platform.c.id.in_([platform_id for platform_id in platform_ids if platform_id is not None]))
+
+
+def _invalidate_on_commit(connection: Connection, target, *platform_ids: str) -> None:
+    """ bumps the versions in the transaction of the change, whose maps are not cached until it ends """
+    connection.execute(_bump_versions(platform_ids))
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(ACL_INVALIDATIONS, set()).update(platform_ids)
+
+
+def _changed_platform_ids(target, key: str) -> list[str]:
+    """ current and former values of a platform foreign key updated on `target` """
+    history = inspect(target).attrs[key].history
+    if not history.has_changes():
+        return []
+    # the attribute may have been set without being loaded first, former platforms are then unknown
+    return [getattr(target, key), *(history.deleted or [ALL_PLATFORMS])]
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _end_invalidations(session: Session) -> None:
+    session.info.pop(ACL_INVALIDATIONS, None)
+
+
+@event.listens_for(models.PlatformsSharedProjectsRel, "after_insert")
+@event.listens_for(models.PlatformsSharedProjectsRel, "after_delete")
+def _invalidate_share(mapper, connection, target: models.PlatformsSharedProjectsRel) -> None:
+    _invalidate_on_commit(connection, target, target.platform_id)
+
+
+@event.listens_for(models.PlatformsSharedProjectsRel, "after_update")
+def _invalidate_updated_share(mapper, connection, target: models.PlatformsSharedProjectsRel) -> None:
+    # e.g: the access mode changed
+    _invalidate_on_commit(connection, target, target.platform_id, *_changed_platform_ids(target, "platform_id"))
+
+
+@event.listens_for(models.Project, "after_insert")
+def _invalidate_new_project_owner(mapper, connection, target: models.Project) -> None:
+    _invalidate_on_commit(connection, target, target.owner_platform_id)
+
+
+@event.listens_for(models.Project, "after_update")
+def _invalidate_project_owners(mapper, connection, target: models.Project) -> None:
+    _invalidate_on_commit(connection, target, *_changed_platform_ids(target, "owner_platform_id"))
+
+
+@event.listens_for(models.Project, "after_delete")
+def _invalidate_deleted_project(mapper, connection, target: models.Project) -> None:
+    # platforms the project was shared with are not known here
+    _invalidate_on_commit(connection, target, ALL_PLATFORMS)
@@ -0,0 +1,87 @@
+from typing import Any, Callable, Iterable
+from uuid import uuid4
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from platform_registry.core.config import settings
+from platform_registry.core.soft_delete import include_deleted
+from platform_registry.schemas import BulkItemResult, BulkItemStatus
+
+
+def dialect_insert(db: AsyncSession, model):
+    """ INSERT of the session's dialect, which supports ON CONFLICT clauses unlike the generic `sqlalchemy.insert`.
+        Kept out of `core.database`, which builds the application engine on import
+    """
+    if db.bind.dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
+
+
+class BulkBatch:
+    """ items of a bulk create request, validated one by one so that bad items do not abort the whole batch.
+        Items still valid after the service checks are inserted with multi-row `INSERT ... ON CONFLICT DO NOTHING RETURNING`:
+        those returned are created, the others hit a unique constraint and are reported as duplicates, or as archived
+        when they only match soft-deleted records.
+    """
+
+    def __init__(self, schema: type[BaseModel], items: list[Any]):
+        self.results: list[BulkItemResult | None] = [None] * len(items)
+        self.valid: dict[int, BaseModel] = {}
+        for index, item in enumerate(items):
+            try:
+                self.valid[index] = schema.model_validate(item)
+            except ValidationError as e:
+                self._set(index, BulkItemStatus.INVALID,
+                          errors=[f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()])
+
+    def _set(self, index: int, status: BulkItemStatus, **kwargs) -> None:
+        self.results[index] = BulkItemResult(index=index, status=status, **kwargs)
+        self.valid.pop(index, None)
+
+    def reject(self, predicate: Callable[[Any], bool], error: str) -> None:
+        for index, item in list(self.valid.items()):
+            if predicate(item):
+                self._set(index, BulkItemStatus.INVALID, errors=[error])
+
+    def reject_duplicates(self, key: Callable[[Any], Any], existing: Iterable) -> None:
+        """ for columns without a unique constraint: items matching an existing record or a previous item are duplicates """
+        seen = set(existing)
+        for index, item in list(self.valid.items()):
+            if key(item) in seen:
+                self._set(index, BulkItemStatus.DUPLICATE)
+            seen.add(key(item))
+
+    async def insert(self, db: AsyncSession, model, to_row: Callable[[Any], dict] = None) -> None:
+        rows = {index: {"id": str(uuid4()), **(to_row and to_row(item) or item.model_dump())}
+                for index, item in self.valid.items()}
+        indexes, created_ids = list(rows), set()
+        chunk_size = settings.BULK_INSERT_CHUNK_SIZE
+        for start in range(0, len(indexes), chunk_size):
+            chunk = [rows[index] for index in indexes[start:start + chunk_size]]
+            insert_chunk = dialect_insert(db, model).on_conflict_do_nothing().returning(model.id)
+            created_ids.update((await db.scalars(insert_chunk, chunk)).all())
+        archived = await archived_conflicts(db, model, {index: row for index, row in rows.items() if row["id"] not in created_ids})
+        for index, row in rows.items():
+            if row["id"] in created_ids:
+                self._set(index, BulkItemStatus.CREATED, id=row["id"])
+            elif index in archived:
+                self._set(index, BulkItemStatus.ARCHIVED)
+            else:
+                self._set(index, BulkItemStatus.DUPLICATE)
+
+
+async def archived_conflicts(db: AsyncSession, model, rows: dict[int, dict]) -> set[int]:
+    """ indexes of the `rows` whose unique values only match soft-deleted records, e.g: the name of an archived entity """
+    keys = [column.key for column in model.__table__.columns if column.unique and any(column.key in row for row in rows.values())]
+    if not keys:
+        return set()
+    matches = or_(*(getattr(model, key).in_({row[key] for row in rows.values() if row.get(key) is not None}) for key in keys))
+    live, archived = set(), set()
+    for deleted_at, *values in await db.execute(include_deleted(select(model.deleted_at, *(getattr(model, key) for key in keys))
+                                                                .filter(matches))):
+        (archived if deleted_at is not None else live).update(zip(keys, values))
+    return {index for index, row in rows.items()
+            if any((key, row.get(key)) in archived for key in keys) and not any((key, row.get(key)) in live for key in keys)}
@@ -0,0 +1,164 @@
+import gzip
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from platform_registry.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # optional dependency: gzip only
+    brotli = None
+
+GZIP = "gzip"
+BROTLI = "br"
+
+
+def supported_encodings() -> list[str]:
+    """ by order of preference """
+    return brotli is not None and [BROTLI, GZIP] or [GZIP]
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """ preferred encoding among those accepted by the client, None for an uncompressed response """
+    if not settings.COMPRESSION_ENABLED or not accept_encoding:
+        return None
+    qualities = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+    candidates = [(qualities.get(encoding, qualities.get("*", 0.0)), -rank, encoding)
+                  for rank, encoding in enumerate(supported_encodings())]
+    quality, _, encoding = max(candidates)
+    return quality > 0 and encoding or None
+
+
+def compressible(content_type: Optional[str], size: Optional[int] = None) -> bool:
+    """ whether a response is worth compressing: allowed content type, and at least `COMPRESSION_MIN_SIZE` bytes if known """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return media_type in settings.COMPRESSION_CONTENT_TYPES and (size is None or size >= settings.COMPRESSION_MIN_SIZE)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == BROTLI:
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def vary_on_encoding(headers: MutableHeaders) -> None:
+    if "accept-encoding" not in [v.strip().lower() for v in headers.get("vary", "").split(",")]:
+        headers.add_vary_header("Accept-Encoding")
+
+
+def weaken_etag(headers: MutableHeaders) -> None:
+    """ a strong ETag would claim that compressed and uncompressed bodies are identical byte for byte """
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+
+def set_encoding_headers(headers: MutableHeaders, encoding: str) -> None:
+    headers["Content-Encoding"] = encoding
+    vary_on_encoding(headers)
+    weaken_etag(headers)
+
+
+class StreamCompressor:
+    """ incremental compression of streaming responses, flushed after each chunk so that clients get records as they come """
+
+    def __init__(self, encoding: str):
+        if encoding == BROTLI:
+            self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+            self._compress = lambda chunk: self._compressor.process(chunk) + self._compressor.flush()
+            self._finish = self._compressor.finish
+        else:
+            self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._compress = lambda chunk: self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = self._compressor.flush
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compress(chunk)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+class CompressionMiddleware:
+    """ compresses responses of allowed content types, to the encoding preferred by the client.
+        Responses already encoded, e.g: compressed variants from `response_cache`, are sent as they are.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = scope["type"] == "http" and negotiate(Headers(scope=scope).get("accept-encoding")) or None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await CompressionResponder(self.app, encoding)(scope, receive, send)
+
+
+class CompressionResponder:
+
+    def __init__(self, app: ASGIApp, encoding: str):
+        self.app = app
+        self.encoding = encoding
+        self.send = None
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[StreamCompressor] = None
+        # until the first body message, it is unknown whether the response is compressed
+        self.passthrough: Optional[bool] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(raw=message["headers"])
+            # whether compressed or not, e.g: 304 responses or bodies below the minimum size,
+            # ETags sent to clients accepting compression are weak: they must not change with the response size
+            weaken_etag(headers)
+            self.start_message = message
+            self.passthrough = ("content-encoding" in headers or message["status"] in (204, 304)
+                                or not compressible(headers.get("content-type")))
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body, more_body = message.get("body", b""), message.get("more_body", False)
+        if self.compressor is None and not more_body:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            vary_on_encoding(headers)
+            if compressible(headers.get("content-type"), len(body)):
+                body = compress(body, self.encoding)
+                set_encoding_headers(headers, self.encoding)
+                headers["Content-Length"] = str(len(body))
+            self.passthrough = True
+            await self.send(self.start_message)
+            await self.send({"type": "http.response.body", "body": body})
+            return
+
+        if self.compressor is None:
+            # streaming response: its size is unknown, it is always compressed
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            set_encoding_headers(headers, self.encoding)
+            del headers["Content-Length"]
+            self.compressor = StreamCompressor(self.encoding)
+            await self.send(self.start_message)
+        chunk = self.compressor.compress(body)
+        if not more_body:
+            chunk += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
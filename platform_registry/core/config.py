@@ -1,5 +1,5 @@
 import logging
-from typing import Annotated, Any
+from typing import Annotated, Any, Literal
 
 from pydantic import PostgresDsn, computed_field, AnyUrl, BeforeValidator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -29,6 +29,82 @@ class Settings(BaseSettings):
     JWT_SECRET_KEY: str     # secrets.token_urlsafe(32)
     JWT_ALGORITHM: str
     JWT_TOKEN_EXPIRE_MINUTES: int
+    # embed role and platform in tokens: authorization on a token then needs no DB access even on a cold cache, but a
+    # change of role or platform, or a deactivation, only applies to tokens issued after it in other worker processes,
+    # i.e: former tokens keep their claims for up to `JWT_TOKEN_EXPIRE_MINUTES`
+    JWT_PRINCIPAL_CLAIMS: bool = False
+
+    # bcrypt runs on a dedicated thread pool: logins beyond workers + queue size are answered with a 503
+    PASSWORD_HASHING_WORKERS: int = 2
+    PASSWORD_HASHING_QUEUE_SIZE: int = 32
+
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+
+    # permissions of platforms on projects, see `core.acl`
+    ACL_CACHE_TTL_SECONDS: int = 30
+    ACL_CACHE_MAX_SIZE: int = 1000
+
+    # list endpoints called with `limit` or `cursor` return pages of `limit` records, with the cursor of the next page in the
+    # `X-Next-Cursor` header, all records otherwise
+    PAGINATION_DEFAULT_LIMIT: int = 100
+    PAGINATION_MAX_LIMIT: int = 1000
+
+    # bulk create endpoints: rows per INSERT statement, and items accepted per request
+    BULK_INSERT_CHUNK_SIZE: int = 1000
+    BULK_MAX_ITEMS: int = 50000
+
+    # projects read per server-side cursor fetch by the streaming export
+    EXPORT_BATCH_SIZE: int = 500
+
+    # `Cache-Control` of list endpoints, which answer `304 Not Modified` to a matching `If-None-Match`
+    PROJECTS_CACHE_CONTROL: str = "private, no-cache"
+    PLATFORMS_CACHE_CONTROL: str = "private, no-cache"
+    ENTITIES_CACHE_CONTROL: str = "private, max-age=60, must-revalidate"
+    FRAMEWORKS_CACHE_CONTROL: str = "private, max-age=300, must-revalidate"
+    ROLES_CACHE_CONTROL: str = "private, no-cache"
+
+    # responses compression, to brotli if installed and accepted by the client, else gzip
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_CONTENT_TYPES: Annotated[list[str] | str, BeforeValidator(parse_cors)] = [
+        "application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html"]
+
+    # routes of `FastJSONRoute` routers serialize their results with precompiled pydantic adapters, others with orjson
+    FAST_JSON_RESPONSES: bool = False
+
+    # serialized responses of reference data routes (entities, entity types, frameworks, roles), see `core.response_cache`.
+    # "memory" for a LRU per worker process, "redis" for a server speaking the Redis protocol shared by all workers, "none".
+    # Keys include the ETag of the route, derived from its tables: changes committed by another worker process miss the cache
+    RESPONSE_CACHE_BACKEND: Literal["memory", "redis", "none"] = "memory"
+    RESPONSE_CACHE_TTL_SECONDS: int = 300
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESPONSE_CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    RESPONSE_CACHE_REDIS_TIMEOUT_SECONDS: float = 0.5
+
+    # number of SQL statements of each request and time spent running them, in `X-Query-Count` and `Server-Timing` headers
+    QUERY_STATS_HEADERS: bool = True
+    # for development and tests: requests exceeding the query budget of their route, or lazy loading relationships, fail
+    QUERY_STRICT_MODE: bool = False
+
+    # Prometheus metrics at `/metrics`, not authenticated: enable it only where its access is restricted at the network level.
+    # With several worker processes, e.g: uvicorn `--workers`, set a directory shared by the workers of a host and emptied
+    # on startup: each worker writes its metrics there to be aggregated
+    METRICS_ENABLED: bool = False
+    METRICS_MULTIPROCESS_DIR: str | None = None
+    METRICS_FLUSH_INTERVAL_SECONDS: float = 5
+
+    # spans of requests, `api/deps` dependencies, `services/*` calls, serialization and SQL statements, see `core.tracing`.
+    # Exported as OTLP/JSON to `TRACING_OTLP_ENDPOINT`, e.g: http://localhost:4318/v1/traces, else as JSON lines to `TRACING_FILE`
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATIO: float = 1.0
+    TRACING_FILE: str = "traces.jsonl"
+    TRACING_OTLP_ENDPOINT: str | None = None
+    TRACING_BATCH_SIZE: int = 512
+    TRACING_MAX_STATEMENT_LENGTH: int = 2000
 
     BACKEND_CORS_ORIGINS: Annotated[list[AnyUrl] | str, BeforeValidator(parse_cors)] = []
 
@@ -37,8 +113,30 @@ class Settings(BaseSettings):
     DB_PORT: str
     DB_USER: str
     DB_PASSWORD: str
+    DB_POOL_SIZE: int = 10
+    DB_POOL_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 10
+    # connections older than this are replaced on checkout, -1 to keep them forever
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # server side timeouts set on each connection, 0 to disable
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+    DB_IDLE_IN_TRANSACTION_SESSION_TIMEOUT_MS: int = 0
+
+    # statements slower than this are logged as JSON lines and listed by `/monitoring/slow-queries`, 0 to disable.
+    # Logged by the application logger, or to a rotating file of each worker process, e.g: `/var/log/registry/slow_{pid}.log`.
+    # With `SLOW_QUERY_EXPLAIN`, the plan of slow SELECT statements is captured with EXPLAIN ANALYZE
+    SLOW_QUERY_THRESHOLD_MS: float = 500
+    SLOW_QUERY_LOG_FILE: str | None = None
+    SLOW_QUERY_LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUP_COUNT: int = 5
+    SLOW_QUERY_MAX_FINGERPRINTS: int = 1000
+    SLOW_QUERY_EXPLAIN: bool = False
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS: int = 600
 
     ACCESS_KEY_LIFESPAN_DAYS: int
+    # secret of the HMAC-SHA256 digests of platforms access keys, defaults to JWT_SECRET_KEY
+    ACCESS_KEY_HMAC_SECRET: str | None = None
 
     @computed_field
     @property
@@ -50,4 +148,17 @@ class Settings(BaseSettings):
                                   username=self.DB_USER,
                                   password=self.DB_PASSWORD)
 
+    @property
+    def database_connect_args(self) -> dict:
+        options = " ".join(f"-c {name}={value}" for name, value in (("statement_timeout", self.DB_STATEMENT_TIMEOUT_MS),
+                                                                      ("idle_in_transaction_session_timeout",
+                                                                       self.DB_IDLE_IN_TRANSACTION_SESSION_TIMEOUT_MS))
+                           if value)
+        return options and {"options": options} or {}
+
+    @property
+    def access_key_hmac_secret(self) -> str:
+        return self.ACCESS_KEY_HMAC_SECRET or self.JWT_SECRET_KEY
+
+
 settings = Settings()
@@ -1,17 +1,31 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 from platform_registry.core.config import settings
+from platform_registry.core.pool import MonitoredQueuePool, pool_monitor
+from platform_registry.core.slow_queries import slow_query_log
 
-engine = create_engine(str(settings.database_url))
-SessionLocal = sessionmaker(bind=engine,
-                            autocommit=False,
-                            autoflush=False)
+engine = create_async_engine(str(settings.database_url),
+                             poolclass=MonitoredQueuePool,
+                             pool_size=settings.DB_POOL_SIZE,
+                             max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+                             pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+                             pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+                             pool_pre_ping=settings.DB_POOL_PRE_PING,
+                             connect_args=settings.database_connect_args)
+pool_monitor.attach(engine)
+slow_query_log.attach(engine)
 
+SessionLocal = async_sessionmaker(bind=engine,
+                                  class_=AsyncSession,
+                                  autoflush=False,
+                                  expire_on_commit=False)
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def get_session_factory() -> async_sessionmaker:
+    """ for streaming responses: sessions of `get_db` are closed before the response body is sent """
+    return SessionLocal
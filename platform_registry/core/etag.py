@@ -0,0 +1,33 @@
+import hashlib
+from typing import Optional
+
+from sqlalchemy import Select, select, func, literal, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def table_state(model, *filters) -> Select:
+    """ number of rows and latest modification of the records of `model` matching `filters`:
+        a created or deleted record changes the count, an updated one the latest `modified_at`
+    """
+    return select(func.count(model.id), func.max(model.modified_at)).filter(*filters)
+
+
+async def tables_state(db: AsyncSession, *states: Select) -> list[tuple]:
+    """ runs many `table_state` queries in a single round trip, none of the records being loaded """
+    query = union_all(*(state.add_columns(literal(position).label("position")) for position, state in enumerate(states)))
+    rows = (await db.execute(query)).all()
+    return [tuple(row[:-1]) for row in sorted(rows, key=lambda row: row[-1])]
+
+
+def make_etag(*parts) -> str:
+    """ strong validator: the same parts always produce the same ETag, whatever the worker process """
+    return '"%s"' % hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """ weak comparison of RFC 9110, as required for `If-None-Match` """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
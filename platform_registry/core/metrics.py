@@ -0,0 +1,34 @@
+from bisect import bisect_left
+from typing import Iterable
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """ cumulative histogram of observed durations (in seconds), Prometheus style.
+        Not thread-safe: observations are expected to be made from the event loop.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> list[tuple[float, int]]:
+        """ (upper bound, count of observations <= bound) pairs, ending with the +Inf bucket """
+        total, counts = 0, []
+        for bound, count in zip((*self.buckets, float("inf")), self._counts):
+            total += count
+            counts.append((bound, total))
+        return counts
+
+    def snapshot(self) -> dict:
+        return {"count": self.count,
+                "sum": round(self.sum, 6),
+                "buckets": {str(bound): count for bound, count in self.cumulative_counts()}}
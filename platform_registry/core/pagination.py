@@ -0,0 +1,81 @@
+import base64
+import binascii
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import DateTime, Select, select, func, literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from platform_registry.core.soft_delete import INCLUDE_DELETED, live_records
+
+
+@dataclass(frozen=True)
+class PageParams:
+    limit: int
+    # id and creation date of the last record of the previous page
+    after_id: Optional[str] = None
+    after_created_at: Optional[datetime] = None
+    estimate_total: bool = False
+
+
+class Page(list):
+    """ records of a page: still a list, so that services callers can keep ignoring pagination """
+
+    def __init__(self, records, next_cursor: Optional[str] = None, estimated_total: Optional[int] = None):
+        super().__init__(records)
+        self.next_cursor = next_cursor
+        self.estimated_total = estimated_total
+
+
+def encode_cursor(record_id: str, created_at: Optional[datetime]) -> str:
+    position = {"id": record_id, "created_at": created_at and created_at.isoformat()}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, Optional[datetime]]:
+    """ id and creation date of the record of the cursor, which must be a well-formed UUID and datetime """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = position.get("created_at")
+        return str(uuid.UUID(position["id"])), created_at and datetime.fromisoformat(created_at) or None
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError, AttributeError):
+        raise ValueError("Invalid cursor")
+
+
+async def estimate_count(db: AsyncSession, query: Select) -> int:
+    """ row estimate of the query planner on PostgreSQL: no rows are read, unlike a `count(*)` """
+    count_query = query.order_by(None)
+    if db.bind.dialect.name != "postgresql":
+        return await db.scalar(select(func.count()).select_from(count_query.subquery()))
+    if not query.get_execution_options().get(INCLUDE_DELETED, False):
+        # the query is compiled here, not executed: the soft-delete filter of the session is not applied to it
+        count_query = live_records(count_query)
+    compiled = count_query.compile(dialect=db.bind.dialect, compile_kwargs={"render_postcompile": True})
+    connection = await db.connection()
+    plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params)).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def paginate(db: AsyncSession, query: Select, page: Optional[PageParams] = None) -> Page:
+    """ runs `query` page by page, ordered by (created_at, id) of its first entity.
+        A page is read after the record of the cursor, so that deep pages cost as much as the first one unlike an OFFSET.
+    """
+    if page is None:
+        return Page((await db.scalars(query)).all())
+    table = query.column_descriptions[0]["entity"].__table__
+    estimated_total = await estimate_count(db, query) if page.estimate_total else None
+    if page.after_id is not None:
+        # the creation date is read from the table, to be compared in the database's own datetime precision, e.g: SQLite
+        # dates stored without microseconds. The one of the cursor stands in for records deleted since.
+        after_created_at = select(table.c.created_at).filter(table.c.id == page.after_id).scalar_subquery()
+        if page.after_created_at is not None:
+            after_created_at = func.coalesce(after_created_at, literal(page.after_created_at, DateTime))
+        after_id = literal(page.after_id, table.c.id.type)
+        query = query.filter(tuple_(table.c.created_at, table.c.id) > tuple_(after_created_at, after_id))
+    records = (await db.scalars(query.order_by(table.c.created_at, table.c.id).limit(page.limit + 1))).all()
+    last = len(records) > page.limit and records[page.limit - 1]
+    next_cursor = last and encode_cursor(last.id, last.created_at) or None
+    return Page(records[:page.limit], next_cursor=next_cursor, estimated_total=estimated_total)
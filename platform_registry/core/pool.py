@@ -0,0 +1,80 @@
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from platform_registry.core.metrics import Histogram
+
+
+class PoolMonitor:
+    """ connection pool counters and latency histograms, fed by SQLAlchemy pool events.
+        Pool events of an async engine are run from the event loop, so no locking is performed.
+    """
+
+    def __init__(self):
+        self.engine: AsyncEngine | None = None
+        self.connections = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        # time spent waiting for a connection, including opening it and the pre-ping
+        self.checkout_wait = Histogram()
+        # time a connection stays checked out
+        self.checkout_duration = Histogram()
+
+    def attach(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+        event.listen(engine.sync_engine, "connect", self._on_connect)
+        event.listen(engine.sync_engine, "checkout", self._on_checkout)
+        event.listen(engine.sync_engine, "checkin", self._on_checkin)
+        event.listen(engine.sync_engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        self.connections += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        self.checkouts += 1
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    def _on_checkin(self, dbapi_connection, connection_record) -> None:
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            self.checkout_duration.observe(time.perf_counter() - checked_out_at)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception) -> None:
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        pool = self.engine and self.engine.pool
+        if not isinstance(pool, AsyncAdaptedQueuePool):
+            pool = None
+        return {"pool_size": pool and pool.size() or 0,
+                "max_overflow": pool and pool._max_overflow or 0,
+                "checked_out": pool and pool.checkedout() or 0,
+                "checked_in": pool and pool.checkedin() or 0,
+                # negative while the pool has not opened `pool_size` connections yet
+                "overflow": pool and max(pool.overflow(), 0) or 0,
+                "connections": self.connections,
+                "checkouts": self.checkouts,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "checkout_wait_seconds": self.checkout_wait.snapshot(),
+                "checkout_duration_seconds": self.checkout_duration.snapshot()}
+
+
+pool_monitor = PoolMonitor()
+
+
+class MonitoredQueuePool(AsyncAdaptedQueuePool):
+    """ times connection requests: pool events only fire once a connection is handed out """
+
+    def connect(self):
+        started_at = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            pool_monitor.timeouts += 1
+            raise
+        finally:
+            pool_monitor.checkout_wait.observe(time.perf_counter() - started_at)
@@ -0,0 +1,202 @@
+import time
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict, ValidationError
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from platform_registry import models
+from platform_registry.core.cache import TTLCache
+from platform_registry.core.config import settings
+
+PRINCIPAL_CLAIM = "principal"
+# user updates on these fields leave principals valid, e.g: `last_login` is set on each login
+PRINCIPAL_NEUTRAL_USER_FIELDS = ("last_login", "modified_at")
+# `Session.info` key of the principals to invalidate once the session commits
+PRINCIPAL_INVALIDATIONS = "principal_invalidations"
+
+
+class PrincipalRole(BaseModel):
+    model_config = ConfigDict(frozen=True, from_attributes=True)
+
+    id: str
+    name: str
+    is_registry_admin: bool
+    is_platform: bool
+
+
+class PrincipalPlatform(BaseModel):
+    model_config = ConfigDict(frozen=True, from_attributes=True)
+
+    id: str
+    name: str
+
+
+class Principal(BaseModel):
+    """ read-only snapshot of an authenticated user, holding what authorization checks need.
+        Unlike a `models.User`, it is not bound to a session and can be shared across requests.
+    """
+    model_config = ConfigDict(frozen=True, from_attributes=True)
+
+    id: str
+    username: str
+    expiration_date: Optional[datetime] = None
+    role_id: Optional[str] = None
+    platform_id: Optional[str] = None
+    role: Optional[PrincipalRole] = None
+    platform: Optional[PrincipalPlatform] = None
+
+
+class PrincipalCache:
+    """ principals by token subject (username).
+        Entries are dropped on TTL expiry or as soon as the related user, role, platform or access key changes.
+        The cache is local to the worker process: other workers catch up with changes after at most one TTL.
+        Claims of tokens are revoked in the worker process committing the change only: with `JWT_PRINCIPAL_CLAIMS`,
+        other workers accept the former role and platform of a user until its token expires.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self._cache = TTLCache(ttl=ttl, max_size=max_size)
+        # (principal, key end of validity) by access key digest, for platforms authenticating with an API key
+        self._api_keys = TTLCache(ttl=ttl, max_size=max_size)
+        # revocation times of principal claims, keyed by ("user", username), ("role", id) or ("platform", id)
+        self._revoked_at: dict[tuple[str, str], float] = {}
+        self._all_revoked_at = 0.0
+        self.claims_hits = 0
+
+    def get(self, username: str, payload: dict) -> Optional[Principal]:
+        principal = self._cache.get(username)
+        if principal is None and settings.JWT_PRINCIPAL_CLAIMS:
+            principal = self._from_claims(username, payload)
+        return principal
+
+    def set(self, principal: Principal) -> None:
+        self._cache.set(principal.username, principal)
+
+    def get_by_api_key(self, key_digest: str) -> Optional[Principal]:
+        entry = self._api_keys.get(key_digest)
+        if entry is None or entry[1] <= datetime.now():
+            return None
+        return entry[0]
+
+    def set_api_key(self, key_digest: str, principal: Principal, valid_until: datetime) -> None:
+        self._api_keys.set(key_digest, (principal, valid_until))
+
+    def _from_claims(self, username: str, payload: dict) -> Optional[Principal]:
+        try:
+            principal = Principal.model_validate(payload[PRINCIPAL_CLAIM])
+        except (KeyError, ValidationError):
+            return None
+        revoked_at = max(self._all_revoked_at,
+                         self._revoked_at.get(("user", username), 0.0),
+                         self._revoked_at.get(("role", principal.role_id), 0.0),
+                         self._revoked_at.get(("platform", principal.platform_id), 0.0))
+        if principal.username != username or payload.get("iat", 0) < revoked_at:
+            return None
+        self.claims_hits += 1
+        self.set(principal)
+        return principal
+
+    def _revoke(self, *keys: tuple[str, str]) -> None:
+        now = time.time()
+        # claims from tokens issued before the token lifespan can not be presented anymore
+        oldest = now - settings.JWT_TOKEN_EXPIRE_MINUTES * 60
+        self._revoked_at = {k: t for k, t in self._revoked_at.items() if t > oldest}
+        self._revoked_at.update({k: now for k in keys})
+
+    def invalidate_user(self, *usernames: str) -> None:
+        for username in usernames:
+            self._cache.invalidate(username)
+        self._api_keys.invalidate_where(lambda e: e[0].username in usernames)
+        self._revoke(*[("user", u) for u in usernames])
+
+    def invalidate_role(self, role_id: str) -> None:
+        self._cache.invalidate_where(lambda p: p.role_id == role_id)
+        self._api_keys.invalidate_where(lambda e: e[0].role_id == role_id)
+        self._revoke(("role", role_id))
+
+    def invalidate_platform(self, platform_id: str) -> None:
+        self._cache.invalidate_where(lambda p: p.platform_id == platform_id)
+        self._api_keys.invalidate_where(lambda e: e[0].platform_id == platform_id)
+        self._revoke(("platform", platform_id))
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._api_keys.clear()
+        self._all_revoked_at = time.time()
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "claims_hits": self.claims_hits, "api_keys": self._api_keys.stats()}
+
+
+principal_cache = PrincipalCache(ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+                                 max_size=settings.PRINCIPAL_CACHE_MAX_SIZE)
+
+
+def principal_claims(principal: Principal) -> dict:
+    claims = {"sub": principal.username}
+    if settings.JWT_PRINCIPAL_CLAIMS:
+        claims[PRINCIPAL_CLAIM] = principal.model_dump(mode="json")
+    return claims
+
+
+def _invalidate(keys) -> None:
+    usernames = [value for kind, value in keys if kind == "user"]
+    if usernames:
+        principal_cache.invalidate_user(*usernames)
+    for kind, value in keys:
+        if kind == "role":
+            principal_cache.invalidate_role(value)
+        elif kind == "platform":
+            principal_cache.invalidate_platform(value)
+
+
+def _invalidate_on_commit(target, *keys: tuple[str, str]) -> None:
+    """ principals are dropped and their claims revoked once the change is committed: invalidated at flush time,
+        a principal read in between, from the former row, would be cached again, and a token issued in between
+        would carry the former claims
+    """
+    session = object_session(target)
+    if session is None:
+        _invalidate(keys)
+    else:
+        session.info.setdefault(PRINCIPAL_INVALIDATIONS, set()).update(keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    _invalidate(session.info.pop(PRINCIPAL_INVALIDATIONS, set()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session: Session) -> None:
+    session.info.pop(PRINCIPAL_INVALIDATIONS, None)
+
+
+@event.listens_for(models.User, "after_delete")
+def _invalidate_user(mapper, connection, target: models.User) -> None:
+    previous_usernames = inspect(target).attrs.username.history.deleted or []
+    _invalidate_on_commit(target, *[("user", username) for username in (target.username, *previous_usernames)])
+
+
+@event.listens_for(models.User, "after_update")
+def _invalidate_updated_user(mapper, connection, target: models.User) -> None:
+    if any(attr.history.has_changes() for attr in inspect(target).attrs if attr.key not in PRINCIPAL_NEUTRAL_USER_FIELDS):
+        _invalidate_user(mapper, connection, target)
+
+
+@event.listens_for(models.Role, "after_update")
+@event.listens_for(models.Role, "after_delete")
+def _invalidate_role(mapper, connection, target: models.Role) -> None:
+    _invalidate_on_commit(target, ("role", target.id))
+
+
+@event.listens_for(models.Platform, "after_update")
+@event.listens_for(models.Platform, "after_delete")
+@event.listens_for(models.AccessKey, "after_insert")
+@event.listens_for(models.AccessKey, "after_update")
+@event.listens_for(models.AccessKey, "after_delete")
+def _invalidate_platform(mapper, connection, target: models.Platform | models.AccessKey) -> None:
+    platform_id = isinstance(target, models.AccessKey) and target.platform_id or target.id
+    _invalidate_on_commit(target, ("platform", platform_id))
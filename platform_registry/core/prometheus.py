@@ -0,0 +1,291 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from platform_registry.core.acl import projects_acl
+from platform_registry.core.config import settings
+from platform_registry.core.metrics import Histogram
+from platform_registry.core.pool import pool_monitor
+from platform_registry.core.principals import principal_cache
+from platform_registry.core.query_stats import query_duration
+from platform_registry.core.response_cache import response_cache
+from platform_registry.core.security import password_hashing_pool
+
+logger = logging.getLogger(__name__)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# requests not matching any route, e.g: 404 on unknown paths, share a single label
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class MetricFamily:
+    """ samples of a metric by labels: numbers for counters and gauges, `Histogram.snapshot()` for histograms """
+
+    def __init__(self, name: str, kind: str, help_text: str, samples: Optional[dict[tuple, object]] = None):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.samples: dict[tuple, object] = samples or {}
+
+    def add(self, value, **labels) -> "MetricFamily":
+        self.samples[tuple(sorted(labels.items()))] = value
+        return self
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "kind": self.kind, "help": self.help,
+                "samples": [[dict(labels), value] for labels, value in self.samples.items()]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MetricFamily":
+        return cls(data["name"], data["kind"], data["help"],
+                   {tuple(sorted(labels.items())): value for labels, value in data["samples"]})
+
+
+class RequestMetrics:
+    """ observations of the HTTP middleware and of the login route, made from the event loop: no locking """
+
+    def __init__(self):
+        self.durations: dict[tuple[str, str, str], Histogram] = defaultdict(Histogram)
+        self.platform_requests: dict[str, int] = defaultdict(int)
+        self.logins: dict[str, Histogram] = defaultdict(Histogram)
+
+    def observe_request(self, method: str, route: str, status: int, duration: float, platform: Optional[str]) -> None:
+        self.durations[(method, route, str(status))].observe(duration)
+        if platform:
+            self.platform_requests[platform] += 1
+
+    def observe_login(self, outcome: str, duration: float) -> None:
+        self.logins[outcome].observe(duration)
+
+
+request_metrics = RequestMetrics()
+
+
+def _cache_families(caches: dict[str, dict]) -> list[MetricFamily]:
+    hits = MetricFamily("registry_cache_hits_total", COUNTER, "Cache lookups answered from the cache")
+    misses = MetricFamily("registry_cache_misses_total", COUNTER, "Cache lookups not answered from the cache")
+    entries = MetricFamily("registry_cache_entries", GAUGE, "Entries held by the cache")
+    for cache, stats in caches.items():
+        hits.add(stats["hits"], cache=cache)
+        misses.add(stats["misses"], cache=cache)
+        if "size" in stats or "entries" in stats:
+            entries.add(stats.get("size", stats.get("entries")), cache=cache)
+    return [hits, misses, entries]
+
+
+def collect() -> list[MetricFamily]:
+    """ metrics of this worker process """
+    families = [
+        MetricFamily("registry_http_request_duration_seconds", HISTOGRAM,
+                     "Duration of HTTP requests by route template and status",
+                     {(("method", m), ("route", r), ("status", s)): h.snapshot()
+                      for (m, r, s), h in request_metrics.durations.items()}),
+        MetricFamily("registry_platform_requests_total", COUNTER, "HTTP requests authenticated as a platform account",
+                     {(("platform", p),): n for p, n in request_metrics.platform_requests.items()}),
+        MetricFamily("registry_login_duration_seconds", HISTOGRAM, "Duration of logins by outcome",
+                     {(("outcome", o),): h.snapshot() for o, h in request_metrics.logins.items()}),
+        MetricFamily("registry_db_query_duration_seconds", HISTOGRAM, "Duration of SQL statements").add(
+            query_duration.snapshot()),
+    ]
+    pool = pool_monitor.stats()
+    families += [
+        MetricFamily("registry_db_pool_size", GAUGE, "Connections kept open by the pool").add(pool["pool_size"]),
+        MetricFamily("registry_db_pool_connections", GAUGE, "Connections of the pool by state")
+        .add(pool["checked_out"], state="checked_out").add(pool["checked_in"], state="checked_in")
+        .add(pool["overflow"], state="overflow"),
+        MetricFamily("registry_db_pool_connects_total", COUNTER, "Connections opened").add(pool["connections"]),
+        MetricFamily("registry_db_pool_invalidations_total", COUNTER, "Connections invalidated").add(pool["invalidations"]),
+        MetricFamily("registry_db_pool_timeouts_total", COUNTER, "Connection requests timed out").add(pool["timeouts"]),
+        MetricFamily("registry_db_pool_checkout_wait_seconds", HISTOGRAM, "Time spent obtaining a connection").add(
+            pool["checkout_wait_seconds"]),
+        MetricFamily("registry_db_pool_checkout_duration_seconds", HISTOGRAM, "Time connections are held").add(
+            pool["checkout_duration_seconds"]),
+    ]
+    hashing = password_hashing_pool.stats()
+    families += [
+        MetricFamily("registry_password_hashing_seconds", HISTOGRAM, "Duration of bcrypt hashes and checks").add(
+            hashing["hash_seconds"]),
+        MetricFamily("registry_password_hashing_queue_wait_seconds", HISTOGRAM, "Time waited for a bcrypt thread").add(
+            hashing["queue_wait_seconds"]),
+        MetricFamily("registry_password_hashing_pending", GAUGE, "bcrypt jobs running or waiting").add(hashing["pending"]),
+        MetricFamily("registry_password_hashing_rejected_total", COUNTER, "bcrypt jobs rejected, the pool being full").add(
+            hashing["rejected"]),
+    ]
+    principals = principal_cache.stats()
+    families += _cache_families({"principals": principals, "api_keys": principals["api_keys"],
+                                 "acl": projects_acl.stats(), "responses": response_cache.stats()})
+    return families
+
+
+def merge(snapshots: Iterable[tuple[list[MetricFamily], bool]]) -> list[MetricFamily]:
+    """ sum of the metrics of several processes, given with whether the process is alive.
+        Counters and histograms of exited processes are kept, their gauges are not.
+    """
+    merged: dict[str, MetricFamily] = {}
+    for families, alive in snapshots:
+        for family in families:
+            if family.kind == GAUGE and not alive:
+                continue
+            target = merged.setdefault(family.name, MetricFamily(family.name, family.kind, family.help))
+            for labels, value in family.samples.items():
+                previous = target.samples.get(labels)
+                if previous is None:
+                    target.samples[labels] = value
+                elif family.kind == HISTOGRAM:
+                    target.samples[labels] = {"count": previous["count"] + value["count"],
+                                              "sum": previous["sum"] + value["sum"],
+                                              "buckets": {b: previous["buckets"].get(b, 0) + c
+                                                          for b, c in value["buckets"].items()}}
+                else:
+                    target.samples[labels] = previous + value
+    return list(merged.values())
+
+
+def with_hit_ratios(families: list[MetricFamily]) -> list[MetricFamily]:
+    """ hit ratios are computed once processes are merged: ratios can not be summed """
+    by_name = {f.name: f for f in families}
+    hits, misses = by_name.get("registry_cache_hits_total"), by_name.get("registry_cache_misses_total")
+    ratios = MetricFamily("registry_cache_hit_ratio", GAUGE, "Share of cache lookups answered from the cache")
+    for labels, count in (hits and hits.samples or {}).items():
+        lookups = count + misses.samples.get(labels, 0)
+        ratios.samples[labels] = lookups and count / lookups or 0.0
+    return [*families, ratios]
+
+
+def _format_labels(labels: Iterable[tuple[str, str]]) -> str:
+    escaped = [f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in labels]
+    return escaped and "{" + ",".join(escaped) + "}" or ""
+
+
+def _format_bound(bound: str) -> str:
+    value = float(bound)
+    return math.isinf(value) and "+Inf" or repr(value)
+
+
+def render(families: list[MetricFamily]) -> str:
+    """ Prometheus text exposition format """
+    lines = []
+    for family in families:
+        lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {family.kind}")
+        for labels, value in sorted(family.samples.items()):
+            if family.kind != HISTOGRAM:
+                lines.append(f"{family.name}{_format_labels(labels)} {value}")
+                continue
+            for bound, count in value["buckets"].items():
+                lines.append(f"{family.name}_bucket{_format_labels((*labels, ('le', _format_bound(bound))))} {count}")
+            lines.append(f"{family.name}_sum{_format_labels(labels)} {value['sum']}")
+            lines.append(f"{family.name}_count{_format_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MultiprocessStore:
+    """ metrics of the worker processes sharing `directory`, one JSON file per process, e.g: uvicorn `--workers`.
+        Each process writes its own file periodically and on each scrape, and reads the others' on scrape:
+        hot counters are never shared between processes, so recording a metric takes no lock.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def write(self, families: list[MetricFamily], alive: bool = True) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"alive": alive, "families": [family.to_dict() for family in families]}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def read(self) -> list[tuple[list[MetricFamily], bool]]:
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Unreadable metrics file {name}: {e}")
+                continue
+            alive = data["alive"] and _pid_alive(int(name[:-len(".json")]))
+            snapshots.append(([MetricFamily.from_dict(family) for family in data["families"]], alive))
+        return snapshots
+
+
+def multiprocess_store() -> Optional[MultiprocessStore]:
+    return settings.METRICS_MULTIPROCESS_DIR and MultiprocessStore(settings.METRICS_MULTIPROCESS_DIR) or None
+
+
+async def exposition() -> str:
+    """ metrics of this process, or of all worker processes in multiprocess mode.
+        Metrics are collected on the event loop, which updates them, and their files written and read off it
+    """
+    store = multiprocess_store()
+    if store is None:
+        return render(with_hit_ratios(collect()))
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, store.write, collect())
+    return render(with_hit_ratios(merge(await loop.run_in_executor(None, store.read))))
+
+
+async def flush_periodically(store: MultiprocessStore) -> None:
+    """ keeps the file of this process fresh for scrapes served by other workers """
+    try:
+        while True:
+            await asyncio.sleep(settings.METRICS_FLUSH_INTERVAL_SECONDS)
+            await asyncio.get_running_loop().run_in_executor(None, store.write, collect())
+    finally:
+        # gauges of an exited process are meaningless, its counters still count
+        store.write(collect(), alive=False)
+
+
+class MetricsMiddleware:
+    """ duration of HTTP requests by route template, and requests of each platform.
+        The route template, unlike the path, keeps the number of label values bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started_at = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            request_metrics.observe_request(scope["method"], route is not None and route.path or UNMATCHED_ROUTE,
+                                            status, time.perf_counter() - started_at,
+                                            scope.get("state", {}).get("platform"))
@@ -0,0 +1,134 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import ORMExecuteState, Session
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from platform_registry.core.config import settings
+from platform_registry.core.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_HEADER = "X-Query-Count"
+SERVER_TIMING_HEADER = "Server-Timing"
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class LazyLoadForbidden(Exception):
+    pass
+
+
+class RequestQueries:
+    """ SQL statements issued while serving a request, and the time spent running them """
+
+    def __init__(self, scope: Optional[Scope] = None):
+        self.scope = scope
+        self.started_at = time.perf_counter()
+        self.count = 0
+        self.duration = 0.0
+        # statements allowed to the route, see `query_budget`
+        self.budget: Optional[int] = None
+
+    @property
+    def route(self) -> Optional[str]:
+        """ template of the route serving the request, once routed """
+        route = self.scope and self.scope.get("route")
+        return route and route.path or None
+
+    def server_timing(self) -> str:
+        return (f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries", '
+                f'total;dur={(time.perf_counter() - self.started_at) * 1000:.1f}')
+
+
+# every statement, within requests or not, see `core.prometheus`
+query_duration = Histogram()
+
+_request_queries: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+def current_queries() -> Optional[RequestQueries]:
+    """ statements of the request being served, None outside of a request """
+    return _request_queries.get()
+
+
+def query_budget(budget: int):
+    """ route dependency declaring the maximum number of SQL statements of a request, authentication included.
+        Beyond it, the statement is refused in strict mode and a warning is logged otherwise.
+    """
+    async def declare_budget():
+        queries = current_queries()
+        if queries is not None:
+            queries.budget = budget
+    return declare_budget
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    queries = current_queries()
+    if queries is not None:
+        if queries.budget is not None and queries.count >= queries.budget:
+            if settings.QUERY_STRICT_MODE:
+                raise QueryBudgetExceeded(f"Query budget of {queries.budget} statements exceeded by: {statement}")
+            if queries.count == queries.budget:
+                logger.warning(f"Query budget of {queries.budget} statements exceeded by: {statement}")
+        queries.count += 1
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started_at = conn.info.get("query_started_at")
+    if not started_at:
+        return
+    duration = time.perf_counter() - started_at.pop()
+    query_duration.observe(duration)
+    queries = current_queries()
+    if queries is not None:
+        queries.duration += duration
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _forbid_lazy_loads(execute_state: ORMExecuteState) -> None:
+    """ strict mode: relationships are to be loaded by the options of the statement, e.g: `selectinload`,
+        as `raiseload("*")` would require, rather than by one statement per record on first access
+    """
+    if (settings.QUERY_STRICT_MODE and execute_state.is_select and execute_state.lazy_loaded_from is not None
+            and current_queries() is not None):
+        raise LazyLoadForbidden(f"Implicit lazy load of {execute_state.lazy_loaded_from.class_.__name__} relationship: "
+                                f"{execute_state.statement}")
+
+
+class QueryStatsMiddleware:
+    """ counts the SQL statements of each request and their duration, sent as `X-Query-Count` and `Server-Timing`.
+        Headers are sent before the body: statements of streaming responses are only counted until their first chunk.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        queries = RequestQueries(scope)
+        token = _request_queries.set(queries)
+
+        async def send_with_stats(message: Message) -> None:
+            if message["type"] == "http.response.start" and settings.QUERY_STATS_HEADERS:
+                headers = MutableHeaders(raw=message["headers"])
+                headers[QUERY_COUNT_HEADER] = str(queries.count)
+                headers.append(SERVER_TIMING_HEADER, queries.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _request_queries.reset(token)
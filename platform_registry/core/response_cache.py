@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+from urllib.parse import urlparse
+
+from platform_registry.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# tags of the cached responses, invalidated by the services writing the matching tables
+ENTITIES = "entities"
+ENTITY_TYPES = "entity_types"
+REGULATORY_FRAMEWORKS = "regulatory_frameworks"
+ROLES = "roles"
+
+
+class CacheBackend(ABC):
+    """ storage of pre-serialized responses, and of a version counter per tag """
+    name: str
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def versions(self, tags: Iterable[str]) -> list[int]:
+        ...
+
+    @abstractmethod
+    async def bump(self, *tags: str) -> None:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """ LRU of the worker process, bounded both in number of entries and in bytes.
+        Invalidations do not reach other worker processes: their entries expire after the cache TTL.
+    """
+    name = "memory"
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._versions: dict[str, int] = {}
+
+    def _pop(self, key: str) -> None:
+        self.bytes -= len(self._entries.pop(key)[1])
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._pop(key)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self.bytes += len(value)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+
+    async def versions(self, tags: Iterable[str]) -> list[int]:
+        return [self._versions.get(tag, 0) for tag in tags]
+
+    async def bump(self, *tags: str) -> None:
+        for tag in tags:
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes}
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisCacheBackend(CacheBackend):
+    """ any server speaking the Redis protocol (Redis, Valkey, KeyDB, ...), shared by all worker processes.
+        A single connection per process is used, commands being short. Tag versions are plain counters (INCR).
+    """
+    name = "redis"
+
+    def __init__(self, url: str, timeout: float):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.strip("/") or 0)
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            arg = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    async def _read(self) -> Any:
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the cache server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            return None if length < 0 else (await self._reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [await self._read() for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._send("AUTH", self.password)
+        if self.db:
+            await self._send("SELECT", self.db)
+
+    async def _send(self, *args) -> Any:
+        self._writer.write(self._encode(*args))
+        await self._writer.drain()
+        return await self._read()
+
+    async def _command(self, *args) -> Any:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await asyncio.wait_for(self._connect(), self.timeout)
+                return await asyncio.wait_for(self._send(*args), self.timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                # the reply of a timed out command may still come: it must not be read as the next command's reply
+                self._close()
+                raise
+
+    def _close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._command("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._command("SET", key, value, "PX", int(ttl * 1000))
+
+    async def versions(self, tags: Iterable[str]) -> list[int]:
+        return [int(version or 0) for version in await self._command("MGET", *(f"tag:{tag}" for tag in tags))]
+
+    async def bump(self, *tags: str) -> None:
+        for tag in tags:
+            await self._command("INCR", f"tag:{tag}")
+
+    def stats(self) -> dict:
+        return {"connected": self._writer is not None}
+
+
+class ResponseCache:
+    """ serialized responses of routes reading reference data, under keys that embed the current version of their tags:
+        bumping a tag version on write makes every response depending on it unreachable at once, whatever the backend.
+        A response built from data read before the bump is stored under the former version, so it is never served.
+        Backend failures are logged and handled as misses: the cache never fails a request.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend], ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def versioned_key(self, key: str, tags: Iterable[str]) -> Optional[str]:
+        """ key of the response under the current versions of its tags, None when the cache is unavailable """
+        if self.backend is None:
+            return None
+        tags = sorted(tags)
+        try:
+            versions = await self.backend.versions(tags)
+        except (OSError, asyncio.TimeoutError, RedisError) as e:
+            self._failed("read", e)
+            return None
+        return f"response:{key}|" + ",".join(f"{tag}={version}" for tag, version in zip(tags, versions))
+
+    async def get(self, versioned_key: str) -> Optional[bytes]:
+        try:
+            value = await self.backend.get(versioned_key)
+        except (OSError, asyncio.TimeoutError, RedisError) as e:
+            self._failed("read", e)
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, versioned_key: str, value: bytes) -> None:
+        try:
+            await self.backend.set(versioned_key, value, self.ttl)
+        except (OSError, asyncio.TimeoutError, RedisError) as e:
+            self._failed("write", e)
+
+    async def invalidate(self, *tags: str) -> None:
+        if self.backend is None:
+            return
+        try:
+            await self.backend.bump(*tags)
+        except (OSError, asyncio.TimeoutError, RedisError) as e:
+            # cached responses are then served until they expire
+            self._failed("invalidate", e)
+
+    def _failed(self, operation: str, error: Exception) -> None:
+        self.errors += 1
+        logger.warning(f"Response cache {operation} failed: {error!r}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"backend": self.backend and self.backend.name or "none",
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": lookups and round(self.hits / lookups, 4) or 0.0,
+                "errors": self.errors,
+                **(self.backend and self.backend.stats() or {})}
+
+
+def make_backend() -> Optional[CacheBackend]:
+    if settings.RESPONSE_CACHE_BACKEND == "memory":
+        return MemoryCacheBackend(max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+                                  max_bytes=settings.RESPONSE_CACHE_MAX_BYTES)
+    if settings.RESPONSE_CACHE_BACKEND == "redis":
+        return RedisCacheBackend(url=settings.RESPONSE_CACHE_REDIS_URL,
+                                 timeout=settings.RESPONSE_CACHE_REDIS_TIMEOUT_SECONDS)
+    return None
+
+
+response_cache = ResponseCache(backend=make_backend(), ttl=settings.RESPONSE_CACHE_TTL_SECONDS)
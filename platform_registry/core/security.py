@@ -1,16 +1,75 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime
+from typing import Callable
 
 import jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
 from platform_registry import models
 from platform_registry.core.config import settings
+from platform_registry.core.metrics import Histogram
+from platform_registry.services import access_keys
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+class PasswordHashingBusy(Exception):
+    pass
+
+
+class PasswordHashingPool:
+    """ runs bcrypt work on a bounded thread pool, so that it never blocks the event loop.
+        Beyond `max_workers` running and `max_queue` waiting jobs, new jobs are rejected with `PasswordHashingBusy`.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.rejected = 0
+        self.hash_time = Histogram()
+        self.queue_wait = Histogram()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hashing")
+
+    async def run(self, func: Callable, *args):
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHashingBusy()
+        self.pending += 1
+        submitted_at = time.perf_counter()
+
+        def timed():
+            started_at = time.perf_counter()
+            result = func(*args)
+            return result, started_at - submitted_at, time.perf_counter() - started_at
+
+        try:
+            result, waited, duration = await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self.pending -= 1
+        self.queue_wait.observe(waited)
+        self.hash_time.observe(duration)
+        return result
+
+    def stats(self) -> dict:
+        return {"max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "pending": self.pending,
+                "rejected": self.rejected,
+                "hash_seconds": self.hash_time.snapshot(),
+                "queue_wait_seconds": self.queue_wait.snapshot()}
+
+
+password_hashing_pool = PasswordHashingPool(max_workers=settings.PASSWORD_HASHING_WORKERS,
+                                            max_queue=settings.PASSWORD_HASHING_QUEUE_SIZE)
+
+
 class Token(BaseModel):
     access_token: str
     # token_type: str = "bearer"
@@ -23,21 +82,28 @@ class TokenPayload(BaseModel):
 def create_access_token(data: dict) -> Token:
     to_encode = data.copy()
     expire = datetime.now() + timedelta(minutes=settings.JWT_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": int(time.time())})
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
     return Token(access_token=encoded_jwt)
 
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not (user and verify_password(password, user.hashed_password)):
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await db.scalar(select(models.User).options(joinedload(models.User.role), joinedload(models.User.platform))
+                                              .filter(models.User.username == username))
+    if not user:
+        return False
+    if user.role and user.role.is_platform:
+        # platform accounts authenticate with their access key, checked against its HMAC digest rather than bcrypt
+        access_key = await access_keys.authenticate_access_key(db, key=password)
+        return access_key is not None and access_key.platform_id == user.platform_id and user
+    if not (user.hashed_password and await verify_password(password, user.hashed_password)):
         return False
     return user
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_hashing_pool.run(pwd_context.verify, plain_password, hashed_password)
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await password_hashing_pool.run(pwd_context.hash, password)
@@ -0,0 +1,147 @@
+import functools
+import inspect
+import typing
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+import orjson
+from fastapi import Response
+from fastapi.datastructures import Default, DefaultPlaceholder
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, TypeAdapter
+
+from platform_registry.core import tracing
+from platform_registry.core.config import settings
+from platform_registry.models import Base
+
+
+@lru_cache(maxsize=None)
+def type_adapter(schema) -> TypeAdapter:
+    """ adapters are compiled once per schema, e.g: `list[schemas.ProjectWithDetails]` """
+    return TypeAdapter(schema)
+
+
+def _nested_model(annotation) -> tuple[Optional[type[BaseModel]], bool]:
+    """ model of a field annotated with a model, a list of models or an optional of either, and whether it is a list """
+    for candidate in (annotation, *typing.get_args(annotation)):
+        many = typing.get_origin(candidate) in (list, typing.List)
+        if many:
+            candidate = typing.get_args(candidate)[0]
+        if isinstance(candidate, type) and issubclass(candidate, BaseModel):
+            return candidate, many
+    return None, False
+
+
+def _model_serializer(model: type[BaseModel], compiled: dict) -> Optional[Callable[[Any], dict]]:
+    """ function reading the fields of `model` from a record into a dict, None if `model` uses unsupported features """
+    if model in compiled:
+        return compiled[model]
+    decorators = model.__pydantic_decorators__
+    if decorators.model_serializers or decorators.computed_fields:
+        return None
+    field_serializers = {}
+    for d in decorators.field_serializers.values():
+        # no model instance is built from the record: only serializers without `self` can be called
+        if d.info.mode != "plain" or not isinstance(inspect.getattr_static(model, d.cls_var_name), (staticmethod, classmethod)):
+            return None
+        function = getattr(model, d.cls_var_name)
+        if len(inspect.signature(function).parameters) != 1:
+            return None
+        field_serializers.update({field: function for field in d.info.fields})
+    fields = []
+    for name, field in model.model_fields.items():
+        if field.exclude:
+            continue
+        nested, many = _nested_model(field.annotation)
+        nested_serializer = None
+        if nested is not None and name not in field_serializers:
+            nested_serializer = _model_serializer(nested, compiled)
+            if nested_serializer is None:
+                return None
+        fields.append((name, field.serialization_alias or field.alias or name, field.get_default(),
+                       field_serializers.get(name), nested_serializer, many))
+
+    def serialize(record) -> dict:
+        data = {}
+        for name, key, default, field_serializer, nested_serializer, many in fields:
+            value = getattr(record, name, default)
+            if field_serializer is not None:
+                value = field_serializer(value)
+            elif nested_serializer is not None and value is not None:
+                value = [nested_serializer(v) for v in value] if many else nested_serializer(value)
+            data[key] = value
+        return data
+
+    compiled[model] = serialize
+    return serialize
+
+
+@lru_cache(maxsize=None)
+def record_serializer(schema) -> Optional[Callable[[Any], Any]]:
+    """ compiled serializer of trusted records to JSON compatible values, for a model or a list of models """
+    model, many = _nested_model(schema)
+    serializer = model and _model_serializer(model, compiled={})
+    if serializer is None:
+        return None
+    return (lambda records: [serializer(r) for r in records]) if many else serializer
+
+
+def dump_json(schema, content: Any) -> bytes:
+    """ ORM records serialized as `schema` to JSON.
+        Records read from the database are trusted: their fields are read straight into orjson, skipping validation.
+        Anything else, or schemas using pydantic features the compiled serializer does not support, is validated as
+        `schema` then serialized by pydantic-core in a single pass.
+    """
+    serializer = record_serializer(schema)
+    records = content if isinstance(content, list) else [content]
+    if serializer is not None and all(isinstance(r, Base) for r in records):
+        return orjson.dumps(serializer(content))
+    adapter = type_adapter(schema)
+    return adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+
+
+def serialized_endpoint(endpoint: Callable, schema, status_code: int | None) -> Callable:
+    """ `endpoint` returning a JSON response of its result serialized by `dump_json`.
+        A `Response` parameter is added if missing: headers and status code set by the endpoint are kept.
+    """
+    signature = inspect.signature(endpoint)
+    response_param = next((name for name, param in signature.parameters.items() if param.annotation is Response), None)
+    added_response_param = response_param is None
+    if added_response_param:
+        response_param = "serialized_response"
+        signature = signature.replace(parameters=[*signature.parameters.values(),
+                                                  inspect.Parameter(response_param, inspect.Parameter.KEYWORD_ONLY,
+                                                                    annotation=Response)])
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        response = kwargs.pop(response_param) if added_response_param else kwargs[response_param]
+        content = await endpoint(**kwargs)
+        if isinstance(content, Response):
+            return content
+        with tracing.span("serialize"):
+            body = dump_json(schema, content)
+        return Response(content=body,
+                        status_code=response.status_code or status_code or 200,
+                        media_type="application/json",
+                        headers=dict(response.headers))
+
+    wrapper.__signature__ = signature
+    wrapper.serialized = True
+    return wrapper
+
+
+class FastJSONRoute(APIRoute):
+    """ opt-in route class, with `APIRouter(route_class=FastJSONRoute)`: when `FAST_JSON_RESPONSES` is set,
+        results are serialized by `dump_json` straight to JSON bytes, instead of being validated as the response model,
+        turned into dicts by pydantic then dumped by the `json` module.
+        The response model is still declared to FastAPI, for the OpenAPI schema.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, *, response_model: Any = Default(None), status_code: int | None = None,
+                 **kwargs):
+        # routes are created again when their router is included in another one: endpoints are only wrapped once
+        if (settings.FAST_JSON_RESPONSES and not isinstance(response_model, DefaultPlaceholder) and response_model is not None
+                and inspect.iscoroutinefunction(endpoint) and not getattr(endpoint, "serialized", False)):
+            endpoint = serialized_endpoint(endpoint, response_model, status_code)
+        super().__init__(path, endpoint, response_model=response_model, status_code=status_code, **kwargs)
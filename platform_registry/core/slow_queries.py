@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Any, Optional
+
+import greenlet
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from platform_registry.core.config import settings
+from platform_registry.core.query_stats import current_queries
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)"
+# lists of expanded IN parameters have as many placeholders as values: they are collapsed to a single one
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+# statements of EXPLAIN runs are not monitored themselves
+_explaining: ContextVar[bool] = ContextVar("explaining", default=False)
+
+
+def normalize(statement: str) -> str:
+    """ statement without its literals nor the length of its IN lists: statements differing only by those share a plan """
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    return _PLACEHOLDER_LIST.sub("(?)", _LITERAL.sub("?", statement))
+
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def parameter_shapes(parameters: Any, executemany: bool) -> Any:
+    """ types of the bound parameters, never their values """
+    rows = executemany and list(parameters or []) or [parameters]
+    first = rows and rows[0]
+    if isinstance(first, dict):
+        shape = {name: type(value).__name__ for name, value in first.items()}
+    elif isinstance(first, (list, tuple)):
+        shape = [type(value).__name__ for value in first]
+    else:
+        shape = None
+    return executemany and {"rows": len(rows), "types": shape} or shape
+
+
+def calling_service() -> Optional[str]:
+    """ innermost `services/*` function issuing the statement. Statements of an async engine are run in a greenlet:
+        the coroutines awaiting them are found in the frames of the parent greenlet, suspended while it runs
+    """
+    current = greenlet.getcurrent()
+    for frame in (sys._getframe(), current.parent and current.parent.gr_frame):
+        while frame is not None:
+            module = frame.f_globals.get("__name__", "")
+            if module.startswith("platform_registry.services."):
+                return f"{module.removeprefix('platform_registry.services.')}.{frame.f_code.co_name}"
+            frame = frame.f_back
+    return None
+
+
+class SlowQueryLog:
+    """ statements slower than `SLOW_QUERY_THRESHOLD_MS`, written as JSON lines to a rotating file and aggregated by
+        fingerprint. With `SLOW_QUERY_EXPLAIN`, the plan of slow SELECT statements is captured on a separate connection,
+        after the statement, in a read-only transaction rolled back, at most once per fingerprint every
+        `SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS` and one at a time. Events of an async engine are run from the event loop.
+    """
+
+    def __init__(self):
+        self.engine: Optional[AsyncEngine] = None
+        self.fingerprints: dict[str, dict] = {}
+        self.explains = 0
+        self._explain_task: Optional[asyncio.Task] = None
+        self._explained_at: dict[str, float] = {}
+        self._file_logger: Optional[logging.Logger] = None
+
+    def attach(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def detach(self) -> None:
+        event.remove(self.engine.sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(self.engine.sync_engine, "after_cursor_execute", self._after_cursor_execute)
+        self.engine = None
+
+    @property
+    def file_logger(self) -> logging.Logger:
+        """ the application logger, unless `SLOW_QUERY_LOG_FILE` is set. The file is opened on the first slow statement:
+            processes without any never open it. Kept out of the logging hierarchy, its entries do not reach the
+            application logs. A rotating file must not be shared between processes: `{pid}` in its path is replaced
+            with the one of the worker process
+        """
+        if not settings.SLOW_QUERY_LOG_FILE:
+            return logger
+        if self._file_logger is None:
+            self._file_logger = logging.Logger(f"{__name__}.file", logging.INFO)
+            self._file_logger.addHandler(RotatingFileHandler(settings.SLOW_QUERY_LOG_FILE.format(pid=os.getpid()),
+                                                             maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+                                                             backupCount=settings.SLOW_QUERY_LOG_BACKUP_COUNT))
+        return self._file_logger
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        conn.info.setdefault("slow_query_started_at", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        started_at = conn.info.get("slow_query_started_at")
+        if not started_at:
+            return
+        duration = time.perf_counter() - started_at.pop()
+        if settings.SLOW_QUERY_THRESHOLD_MS <= 0 or duration * 1000 < settings.SLOW_QUERY_THRESHOLD_MS or _explaining.get():
+            return
+        self.record(statement, parameters, executemany, duration)
+
+    def record(self, statement: str, parameters: Any, executemany: bool, duration: float) -> dict:
+        normalized = normalize(statement)
+        queries = current_queries()
+        entry = {"at": datetime.now().isoformat(timespec="milliseconds"),
+                 "fingerprint": fingerprint(normalized),
+                 "duration_ms": round(duration * 1000, 2),
+                 "statement": normalized,
+                 "parameters": parameter_shapes(parameters, executemany),
+                 "service": calling_service(),
+                 "route": queries and queries.route}
+        self.file_logger.warning(json.dumps(entry))
+        self._aggregate(entry)
+        if self._should_explain(entry["fingerprint"], statement, executemany):
+            self._explained_at[entry["fingerprint"]] = time.monotonic()
+            self._explain_task = asyncio.get_running_loop().create_task(
+                self._explain(entry["fingerprint"], statement, parameters))
+        return entry
+
+    def _aggregate(self, entry: dict) -> None:
+        stats = self.fingerprints.get(entry["fingerprint"])
+        if stats is None:
+            if len(self.fingerprints) >= settings.SLOW_QUERY_MAX_FINGERPRINTS:
+                # the fingerprint costing the least makes room
+                del self.fingerprints[min(self.fingerprints, key=lambda f: self.fingerprints[f]["total_seconds"])]
+            stats = self.fingerprints[entry["fingerprint"]] = {"fingerprint": entry["fingerprint"],
+                                                               "statement": entry["statement"],
+                                                               "calls": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                                                               "plan": None}
+        duration = entry["duration_ms"] / 1000
+        stats["calls"] += 1
+        stats["total_seconds"] += duration
+        stats["max_seconds"] = max(stats["max_seconds"], duration)
+        stats.update(last_seen=entry["at"], parameters=entry["parameters"], service=entry["service"], route=entry["route"])
+
+    def _should_explain(self, fingerprint_: str, statement: str, executemany: bool) -> bool:
+        if not settings.SLOW_QUERY_EXPLAIN or executemany or self._explain_task and not self._explain_task.done():
+            return False
+        if self.engine is None or self.engine.dialect.name not in ("postgresql", "sqlite"):
+            return False
+        explained_at = self._explained_at.get(fingerprint_)
+        recent = explained_at is not None and time.monotonic() - explained_at < settings.SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS
+        # EXPLAIN ANALYZE runs the statement: only read statements are explained
+        return not recent and statement.lstrip()[:6].upper() in ("SELECT", "WITH")
+
+    async def _explain(self, fingerprint_: str, statement: str, parameters: Any) -> None:
+        _explaining.set(True)
+        try:
+            async with self.engine.connect() as connection:
+                if connection.dialect.name == "postgresql":
+                    await connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+                    explain = "EXPLAIN (ANALYZE, BUFFERS, FORMAT TEXT)"
+                else:
+                    explain = "EXPLAIN QUERY PLAN"
+                result = await connection.exec_driver_sql(f"{explain} {statement}", parameters)
+                plan = "\n".join(str(row[-1]) for row in result)
+                await connection.rollback()
+        except Exception as e:
+            logger.warning(f"EXPLAIN of slow statement {fingerprint_} failed: {e}")
+            return
+        self.explains += 1
+        if fingerprint_ in self.fingerprints:
+            self.fingerprints[fingerprint_]["plan"] = plan
+        self.file_logger.warning(json.dumps({"at": datetime.now().isoformat(timespec="milliseconds"),
+                                          "fingerprint": fingerprint_, "plan": plan}))
+
+    def top(self, limit: int) -> list[dict]:
+        """ slowest fingerprints by total time spent """
+        ranked = sorted(self.fingerprints.values(), key=lambda s: s["total_seconds"], reverse=True)[:limit]
+        return [{**s, "mean_seconds": s["total_seconds"] / s["calls"]} for s in ranked]
+
+
+slow_query_log = SlowQueryLog()
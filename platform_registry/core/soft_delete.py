@@ -0,0 +1,33 @@
+from sqlalchemy import Executable, event
+from sqlalchemy.orm import ORMExecuteState, Session, with_loader_criteria
+
+from platform_registry.models import CommonColumnsMixin
+
+INCLUDE_DELETED = "include_deleted"
+
+
+def live_records(statement: Executable) -> Executable:
+    """ `statement` restricted to records without `deleted_at`, for every entity it reads, relationships included """
+    return statement.options(with_loader_criteria(CommonColumnsMixin, lambda cls: cls.deleted_at == None,  # noqa: E711
+                                                  include_aliases=True))
+
+
+def include_deleted(statement: Executable, include: bool = True) -> Executable:
+    """ opt-out of the soft-delete filter, e.g: for audit views of registry admins """
+    return statement.execution_options(**{INCLUDE_DELETED: include})
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _filter_deleted(execute_state: ORMExecuteState) -> None:
+    """ soft-deleted records are left out of every ORM select by default.
+        Lazy loads and refreshes of records already loaded are left alone: the criteria of the statement which loaded
+        them apply to their relationships already.
+    """
+    if execute_state.is_relationship_load:
+        # once a listener is registered, eager loads inherit the `yield_per` of the statement they complete,
+        # which their unique results do not support: batches only apply to the statement itself
+        execute_state.update_execution_options(yield_per=None)
+        return
+    if (execute_state.is_select and not execute_state.is_column_load
+            and not execute_state.execution_options.get(INCLUDE_DELETED, False)):
+        execute_state.statement = live_records(execute_state.statement)
@@ -0,0 +1,390 @@
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import httpx
+from fastapi import Depends, FastAPI, Response, params
+from fastapi.dependencies.models import Dependant
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from platform_registry.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# module of the dependencies traced on each route, see `instrument`
+DEPENDENCIES_MODULE = "platform_registry.api.deps"
+
+SERVICE_NAME = "platform-registry"
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "start_ns", "end_ns", "status")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: int = INTERNAL, **attributes):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.status = STATUS_OK
+
+    def child(self, name: str, kind: int = INTERNAL, **attributes) -> "Span":
+        return Span(name, self.trace_id, self.span_id, kind, **attributes)
+
+    def to_otlp(self) -> dict:
+        return {"traceId": self.trace_id,
+                "spanId": self.span_id,
+                **(self.parent_id and {"parentSpanId": self.parent_id} or {}),
+                "name": self.name,
+                "kind": self.kind,
+                "startTimeUnixNano": str(self.start_ns),
+                "endTimeUnixNano": str(self.end_ns),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+                "status": {"code": self.status}}
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_request(spans: Iterable[Span]) -> dict:
+    """ OTLP/JSON `ExportTraceServiceRequest` """
+    return {"resourceSpans": [{"resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                               "scopeSpans": [{"scope": {"name": "platform_registry"},
+                                               "spans": [span.to_otlp() for span in spans]}]}]}
+
+
+class SpanExporter:
+    """ spans of finished traces are buffered, then exported by batches of `batch_size` or every `interval` seconds,
+        away from the event loop: a thread writes the batches to a file, JSON lines of OTLP requests, or posts them to
+        an OTLP/HTTP collector. Spans are dropped when the buffer is full, e.g: the collector being unreachable.
+    """
+
+    def __init__(self, file: Optional[str] = None, endpoint: Optional[str] = None, batch_size: int = 512,
+                 max_buffer: int = 10000, interval: float = 5.0):
+        self.file = file
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.interval = interval
+        self.dropped = 0
+        self._buffer: list[Span] = []
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def export(self, spans: list[Span]) -> None:
+        with self._lock:
+            room = self.max_buffer - len(self._buffer)
+            self.dropped += max(len(spans) - room, 0)
+            self._buffer.extend(spans[:room])
+            full = len(self._buffer) >= self.batch_size
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._thread.start()
+        if full:
+            self._ready.set()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._ready.wait(self.interval)
+            self._ready.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        payload = json.dumps(otlp_request(batch), separators=(",", ":"))
+        try:
+            if self.endpoint:
+                httpx.post(self.endpoint, content=payload, headers={"Content-Type": "application/json"},
+                           timeout=5).raise_for_status()
+            else:
+                with open(self.file, "a") as f:
+                    f.write(payload + "\n")
+        except (OSError, httpx.HTTPError) as e:
+            self.dropped += len(batch)
+            logger.warning(f"Export of {len(batch)} spans failed: {e}")
+
+    def shutdown(self) -> None:
+        self._stopped = True
+        self._ready.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 5)
+        self.flush()
+
+
+class Tracer:
+    """ spans of sampled requests, the current one being held in a context variable, so that SQL statements run in
+        greenlets and dependencies run in threads find their parent. Outside of a sampled request, spans are no-ops.
+    """
+
+    def __init__(self, exporter: SpanExporter, sample_ratio: float):
+        self.exporter = exporter
+        self.sample_ratio = sample_ratio
+        self._current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+        self._serializing: ContextVar[Optional[Span]] = ContextVar("serializing_span", default=None)
+        # spans of each trace being recorded, exported once its root span ends
+        self._traces: dict[str, list[Span]] = {}
+
+    def current(self) -> Optional[Span]:
+        return self._current.get()
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, **attributes) -> Optional[Span]:
+        """ root span of a request, None if not sampled. A W3C `traceparent` header carries on the caller's trace """
+        trace_id, parent_id = None, None
+        sampled = random.random() < self.sample_ratio
+        parts = (traceparent or "").split("-")
+        if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16 and len(parts[3]) == 2:
+            # the caller's sampling decision is kept, for complete traces across services
+            trace_id, parent_id, sampled = parts[1], parts[2], parts[3][1] in "13579bdf"
+        if not sampled:
+            return None
+        span = Span(name, trace_id or f"{random.getrandbits(128):032x}", parent_id, SERVER, **attributes)
+        self._traces[span.trace_id] = [span]
+        return span
+
+    def start_span(self, name: str, kind: int = INTERNAL, **attributes) -> Optional[Span]:
+        parent = self._current.get()
+        if parent is None:
+            return None
+        span = parent.child(name, kind, **attributes)
+        self._traces.get(span.trace_id, []).append(span)
+        return span
+
+    def end(self, span: Span, error: bool = False) -> None:
+        span.end_ns = time.time_ns()
+        if error:
+            span.status = STATUS_ERROR
+        if span.parent_id is None or span.kind == SERVER:
+            self.exporter.export(self._traces.pop(span.trace_id, [span]))
+
+    @contextmanager
+    def activate(self, span: Optional[Span]) -> Iterator[Optional[Span]]:
+        if span is None:
+            yield None
+            return
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException:
+            self.end(span, error=True)
+            raise
+        else:
+            self.end(span)
+        finally:
+            self._current.reset(token)
+
+    @contextmanager
+    def span(self, name: str, kind: int = INTERNAL, **attributes) -> Iterator[Optional[Span]]:
+        with self.activate(self.start_span(name, kind, **attributes)) as span:
+            yield span
+
+    def start_serialization(self) -> None:
+        """ span of the validation and serialization by FastAPI of the result of an endpoint, once it returned """
+        self._serializing.set(self.start_span("serialize"))
+
+    def end_serialization(self, error: bool = False) -> None:
+        span = self._serializing.get()
+        if span is not None:
+            self._serializing.set(None)
+            self.end(span, error=error)
+
+    def traced(self, func: Callable, name: str) -> Callable:
+        """ `func` run within a span, keeping its coroutine nature: FastAPI inspects it to know how to call it """
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with self.span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+tracer: Optional[Tracer] = None
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """ explicit span around a step of a request, e.g: serializing a response. A no-op unless tracing is instrumented """
+    if tracer is None:
+        yield None
+        return
+    with tracer.span(name, **attributes) as current:
+        yield current
+
+
+def traced(func: Callable) -> Callable:
+    """ decorator of the coroutine functions of `services/*`: each call, whichever module it comes from, runs within a span
+        named after the module and the function, e.g: `projects.get_projects`.
+        Functions are returned as they are unless `TRACING_ENABLED` is set.
+    """
+    if not settings.TRACING_ENABLED:
+        return func
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if tracer is None:
+            return await func(*args, **kwargs)
+        with tracer.span(name):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+class TracingMiddleware:
+    """ root span of each sampled request, named after its route template once routed """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        root = scope["type"] == "http" and tracer.start_trace(f"{scope['method']} {scope['path']}",
+                                                              Headers(scope=scope).get("traceparent"),
+                                                              **{"http.method": scope["method"],
+                                                                 "http.target": scope["path"]}) or None
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_traced(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                tracer.end_serialization()
+                root.attributes["http.status_code"] = message["status"]
+            await send(message)
+
+        with tracer.activate(root):
+            try:
+                await self.app(scope, receive, send_traced)
+            finally:
+                # the result of the endpoint failed validation, maybe
+                tracer.end_serialization(error=True)
+                route = scope.get("route")
+                if route is not None:
+                    root.name = f"{scope['method']} {route.path}"
+                    root.attributes["http.route"] = route.path
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    span = tracer.start_span("sql", CLIENT, **{"db.system": conn.dialect.name,
+                                               "db.statement": statement[:settings.TRACING_MAX_STATEMENT_LENGTH]})
+    conn.info.setdefault("trace_spans", []).append(span)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    spans = conn.info.get("trace_spans")
+    span = spans and spans.pop()
+    if span is not None:
+        tracer.end(span)
+
+
+def _on_error(exception_context) -> None:
+    spans = exception_context.connection is not None and exception_context.connection.info.get("trace_spans")
+    span = spans and spans.pop()
+    if span is not None:
+        tracer.end(span, error=True)
+
+
+def _is_traced_dependency(call) -> bool:
+    return (getattr(call, "__module__", None) == DEPENDENCIES_MODULE
+            and not inspect.isgeneratorfunction(call) and not inspect.isasyncgenfunction(call))
+
+
+def _traced_dependency(call: Callable, traced: dict[Callable, Callable]) -> Callable:
+    """ `call` within a span. Its signature refers to the traced versions of the dependencies it depends on:
+        with `dependency_overrides` set, FastAPI builds sub-dependencies again from signatures at each request.
+    """
+    if call not in traced:
+        wrapper = tracer.traced(call, f"dependency {call.__name__}")
+        signature = inspect.signature(call)
+        wrapper.__signature__ = signature.replace(parameters=[
+            isinstance(p.default, params.Depends) and _is_traced_dependency(p.default.dependency)
+            and p.replace(default=Depends(_traced_dependency(p.default.dependency, traced), use_cache=p.default.use_cache))
+            or p for p in signature.parameters.values()])
+        traced[call] = wrapper
+    return traced[call]
+
+
+def _trace_dependencies(dependant: Dependant, traced: dict[Callable, Callable]) -> None:
+    """ dependencies of `api/deps`, which FastAPI solves by calling `dependant.call`.
+        Generator dependencies, e.g: `get_db`, are left alone. Overrides are keyed by the original functions:
+        traced dependencies can not be overridden, `dependency_overrides` of `get_db` still apply.
+    """
+    for sub_dependant in dependant.dependencies:
+        _trace_dependencies(sub_dependant, traced)
+        if _is_traced_dependency(sub_dependant.call):
+            sub_dependant.call = _traced_dependency(sub_dependant.call, traced)
+
+
+def _traced_endpoint(call: Callable, name: str) -> Callable:
+    """ `call` within a span, followed by the one of its result serialization, unless it returned a response:
+        FastAPI serializes it until the response starts, see `TracingMiddleware`
+    """
+    if not inspect.iscoroutinefunction(call):
+        return tracer.traced(call, name)
+
+    @functools.wraps(call)
+    async def endpoint(*args, **kwargs):
+        with tracer.span(name):
+            result = await call(*args, **kwargs)
+        if not isinstance(result, Response):
+            tracer.start_serialization()
+        return result
+    return endpoint
+
+
+def instrument(app: FastAPI) -> None:
+    """ spans around requests, `api/deps` dependencies, route endpoints, response serialization and SQL statements,
+        the routes of `app` being wrapped one by one: no module attribute is replaced. `services/*` calls are traced by
+        their `traced` decorator. Only called when `TRACING_ENABLED` is set: otherwise nothing is wrapped nor listened to.
+    """
+    global tracer
+    tracer = Tracer(SpanExporter(file=settings.TRACING_FILE, endpoint=settings.TRACING_OTLP_ENDPOINT,
+                                 batch_size=settings.TRACING_BATCH_SIZE),
+                    sample_ratio=settings.TRACING_SAMPLE_RATIO)
+    traced_dependencies = {}
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            _trace_dependencies(route.dependant, traced_dependencies)
+            route.dependant.call = _traced_endpoint(route.dependant.call, f"endpoint {route.name}")
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _on_error)
+    app.add_middleware(TracingMiddleware)
+
+
+async def shutdown() -> None:
+    if tracer is not None:
+        await asyncio.get_running_loop().run_in_executor(None, tracer.exporter.shutdown)
@@ -1,47 +1,60 @@
+import asyncio
 import logging
 
-from sqlalchemy.orm import Session
+from sqlalchemy import NullPool, delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 
-from models import Role
-from services import roles, users
-from schemas import RoleCreate
-from core.database import get_db
+from platform_registry.models import Role, SeedVersion
+from platform_registry.services import roles, users
+from platform_registry.schemas import RoleCreate
+from platform_registry.core.config import settings
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# to be incremented when `load_initial_data` changes: containers load it again on their next start, see `startup`
+SEED_VERSION = 1
 
-def create_admin_role(db: Session):
-    admin_role = db.query(Role).filter(Role.is_registry_admin).first()
+
+async def create_admin_role(db: AsyncSession):
+    admin_role = await db.scalar(select(Role).filter(Role.is_registry_admin))
     if not admin_role:
         role_in = RoleCreate(name='Registry Admin',
                              is_registry_admin=True,
                              is_platform=False)
-        admin_role = roles.create_role(db=db, role=role_in)
+        admin_role = await roles.create_role(db=db, role=role_in)
     return admin_role
 
 
-def create_platform_role(db: Session):
-    platform_role = db.query(Role).filter(Role.is_platform).first()
+async def create_platform_role(db: AsyncSession):
+    platform_role = await db.scalar(select(Role).filter(Role.is_platform))
     if not platform_role:
         role_in = RoleCreate(name='Platform',
                              is_registry_admin=False,
                              is_platform=True)
-        roles.create_role(db=db, role=role_in)
+        await roles.create_role(db=db, role=role_in)
 
 
-def load_initial_data(db: Session) -> None:
-    admin_role = create_admin_role(db=db)
-    users.create_admin_user(db=db, role=admin_role)
+async def load_initial_data(db: AsyncSession) -> None:
+    admin_role = await create_admin_role(db=db)
+    await users.create_admin_user(db=db, role=admin_role)
     logger.info(f"Admin role and user created {'...'*5}OK")
-    create_platform_role(db=db)
+    await create_platform_role(db=db)
     logger.info(f"Platform role created {'...'*5}OK")
+    await db.execute(delete(SeedVersion))
+    db.add(SeedVersion(version=SEED_VERSION))
+    await db.commit()
 
 
-
-def main() -> None:
-    load_initial_data(db=next(get_db()))
+async def main() -> None:
+    """ on an engine of its own: the one of the application comes with its pool, slow query and metrics monitors """
+    engine = create_async_engine(str(settings.database_url), poolclass=NullPool)
+    try:
+        async with AsyncSession(bind=engine, autoflush=False, expire_on_commit=False) as db:
+            await load_initial_data(db=db)
+    finally:
+        await engine.dispose()
 
 
 if __name__ == "__main__":
-    main()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,13 +1,40 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, ORJSONResponse
 from starlette.middleware.cors import CORSMiddleware
 
 from platform_registry.api.routers import api_router
+from platform_registry.core import tracing
+from platform_registry.core.compression import CompressionMiddleware
 from platform_registry.core.config import settings
+from platform_registry.core.prometheus import MetricsMiddleware, flush_periodically, multiprocess_store
+from platform_registry.core.query_stats import QueryStatsMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    store = settings.METRICS_ENABLED and multiprocess_store() or None
+    flush = store and asyncio.create_task(flush_periodically(store))
+    yield
+    if flush:
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+    await tracing.shutdown()
 
-app = FastAPI(openapi_url=settings.OPENAPI_URL,
+
+app = FastAPI(lifespan=lifespan,
+              openapi_url=settings.OPENAPI_URL,
               title=settings.PROJECT_NAME,
               description=settings.DESCRIPTION_MD,
-              version=settings.VERSION,)
+              version=settings.VERSION,
+              default_response_class=settings.FAST_JSON_RESPONSES and ORJSONResponse or JSONResponse)
+
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(QueryStatsMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(CORSMiddleware,
@@ -15,6 +42,10 @@ if settings.BACKEND_CORS_ORIGINS:
                                       for origin in settings.BACKEND_CORS_ORIGINS],
                        allow_credentials=True,
                        allow_methods=["*"],
-                       allow_headers=["*"])
+                       allow_headers=["*"],
+                       expose_headers=["X-Next-Cursor", "X-Estimated-Total", "ETag", "X-Query-Count", "Server-Timing"])
 
 app.include_router(api_router)
+
+if settings.TRACING_ENABLED:
+    tracing.instrument(app)
@@ -1,6 +1,6 @@
 from uuid import uuid4
 
-from sqlalchemy import Column, String, ForeignKey, Date, DateTime, func, Boolean, UniqueConstraint
+from sqlalchemy import Column, String, ForeignKey, Date, DateTime, func, Boolean, UniqueConstraint, Index, text, Integer
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -10,12 +10,17 @@ Base = declarative_base()
 
 
 class CommonColumnsMixin(object):
-    id = Column(UUID(as_uuid=False), default=lambda: str(uuid4()), primary_key=True, index=True, unique=True)
+    # the primary key is indexed already: no extra unique index on `id`
+    id = Column(UUID(as_uuid=False), default=lambda: str(uuid4()), primary_key=True)
     created_at = Column(DateTime, nullable=True, server_default=func.now())
     modified_at = Column(DateTime, nullable=True, server_default=func.now(), onupdate=func.now())
     deleted_at = Column(DateTime, nullable=True)
 
 
+# predicate of partial indexes on records not soft-deleted, the only ones read by default (see `core.soft_delete`)
+LIVE = text("deleted_at IS NULL")
+
+
 class User(CommonColumnsMixin, Base):
     __tablename__ = "user"
 
@@ -31,6 +36,10 @@ class User(CommonColumnsMixin, Base):
     role = relationship("Role", back_populates="users")
     platform = relationship("Platform", back_populates="user_account")
     projects = relationship("Project", secondary="project_user_rel", viewonly=True)
+    # regular users, i.e: without role, read page by page in (created_at, id) order
+    __table_args__ = (Index("ix_user_live_regular_created_at_id", "created_at", "id",
+                            postgresql_where=text("role_id IS NULL AND deleted_at IS NULL"),
+                            sqlite_where=text("role_id IS NULL AND deleted_at IS NULL")),)
 
 
 class Role(CommonColumnsMixin, Base):
@@ -55,6 +64,8 @@ class Platform(CommonColumnsMixin, Base):
     __tablename__ = "platform"
 
     name = Column(String, unique=True, index=True, nullable=False)
+    # bumped with its permissions on projects, see `core.acl`
+    acl_version = Column(Integer, nullable=False, server_default="0", default=0)
     user_account = relationship("User", back_populates="platform")
     owned_projects = relationship("Project", back_populates="owner_platform")
     shared_projects = relationship("Project", secondary="platforms_shared_projects_rel", viewonly=True)
@@ -99,6 +110,7 @@ class Entity(CommonColumnsMixin, Base):
     entity_type_id = Column(UUID(as_uuid=False), ForeignKey("entity_type.id"))
     entity_type = relationship("EntityType", back_populates="entities")
     assigned_projects = relationship("Project", secondary="project_entity_rel", viewonly=True)
+    __table_args__ = (Index("ix_entity_live_created_at_id", "created_at", "id", postgresql_where=LIVE, sqlite_where=LIVE),)
 
 
 class AccessKey(CommonColumnsMixin, Base):
@@ -106,10 +118,17 @@ class AccessKey(CommonColumnsMixin, Base):
 
     label = Column(String, index=True, nullable=False, unique=True)
     key = Column(String, nullable=False, unique=True)
+    # leading characters of the key, used to look it up before checking its HMAC-SHA256 `key_digest`
+    key_id = Column(String, nullable=True, unique=True, index=True)
+    key_digest = Column(String, nullable=True)
     start_datetime = Column(DateTime, nullable=False)
     end_datetime = Column(DateTime, nullable=False)
     platform_id = Column(UUID(as_uuid=False), ForeignKey("platform.id"), nullable=False)
     platform = relationship("Platform", back_populates="access_keys")
+    # current key of a platform: expired keys pile up, `end_datetime` is the selective bound of the validity range
+    __table_args__ = (Index("ix_access_key_live_platform_id_validity", "platform_id", "end_datetime", "start_datetime",
+                            postgresql_where=LIVE, sqlite_where=LIVE),
+                      Index("ix_access_key_live_created_at_id", "created_at", "id", postgresql_where=LIVE, sqlite_where=LIVE))
 
 
 class ProjectRegulatoryFrameworkRel(CommonColumnsMixin, Base):
@@ -136,7 +155,20 @@ class ProjectEntitiesRel(CommonColumnsMixin, Base):
 class PlatformsSharedProjectsRel(CommonColumnsMixin, Base):
     __tablename__ = "platforms_shared_projects_rel"
 
-    platform_id = Column(UUID(as_uuid=False), ForeignKey("platform.id"), nullable=False, index=True)
-    project_id = Column(UUID(as_uuid=False), ForeignKey("project.id"), nullable=False, index=True)
+    platform_id = Column(UUID(as_uuid=False), ForeignKey("platform.id"), nullable=False)
+    project_id = Column(UUID(as_uuid=False), ForeignKey("project.id"), nullable=False)
     readonly = Column(Boolean, nullable=False, default=True)
+    # lookups by project use the unique constraint, lookups by platform, e.g: the projects visibility filter,
+    # read the shared projects and their permission from the index only
+    __table_args__ = (UniqueConstraint("project_id", "platform_id",
+                                       name='unique_shared_project_platform'),
+                      Index("ix_platforms_shared_projects_rel_live_platform_id_project_id", "platform_id", "project_id",
+                            postgresql_include=["readonly"], postgresql_where=LIVE, sqlite_where=LIVE))
 
+
+class SeedVersion(Base):
+    """ version of the initial data loaded, see `initial_data.SEED_VERSION` """
+    __tablename__ = "seed_version"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    created_at = Column(DateTime, nullable=True, server_default=func.now())
@@ -1,11 +1,14 @@
 import uuid
 from datetime import date, datetime, timedelta
+from enum import Enum
 
 from pydantic import BaseModel, EmailStr, field_serializer, AfterValidator
-from typing import Optional, List, Annotated
+from typing import Any, Optional, List, Annotated
 
 
 STR_UUID = Annotated[str, AfterValidator(lambda x: str(uuid.UUID(x, version=4)))]
+# emails of response models: they were validated as `EmailStr` on input, validating them again from rows is costly
+STORED_EMAIL = Optional[str]
 
 
 class RoleBase(BaseModel):
@@ -42,13 +45,14 @@ class UserMinimized(BaseModel):
     firstname: str
     lastname: str
     username: str
-    email: Optional[EmailStr] = None
+    email: STORED_EMAIL = None
 
 
 class RegularUser(UserBase):
     id: str
     firstname: str
     lastname: str
+    email: STORED_EMAIL = None
 
 class RegularUserCreate(UserBase):
     firstname: str
@@ -62,6 +66,7 @@ class RegularUserPatch(BaseModel):
 
 class SystemUser(UserBase):
     id: str
+    email: STORED_EMAIL = None
     role: Optional[Role] = None
     last_login: Optional[datetime] = None
 
@@ -74,7 +79,7 @@ class SystemUserCreate(BaseModel):
         i.e: Registry admins + users of type 'Platform'
     """
     role_id: STR_UUID
-    hashed_password: str
+    hashed_password: Optional[str] = None
 
 
 class AdminUserCreateCreate(RegularUserCreate, SystemUserCreate):
@@ -87,6 +92,7 @@ class PlatformUserCreateCreate(UserBase, SystemUserCreate):
 
 class PlatformUser(UserBase):
     id: str
+    email: STORED_EMAIL = None
     last_login: Optional[datetime]
 
     class ConfigDict:
@@ -145,6 +151,21 @@ class Entity(EntityBase):
         from_attributes = True
 
 
+class BulkItemStatus(str, Enum):
+    CREATED = "created"
+    DUPLICATE = "duplicate"
+    # matches a soft-deleted record only, to be restored rather than created again
+    ARCHIVED = "archived"
+    INVALID = "invalid"
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: BulkItemStatus
+    id: Optional[str] = None
+    errors: Optional[List[str]] = None
+
+
 class ProjectBase(BaseModel):
     code: str
     name: str
@@ -180,6 +201,44 @@ class ProjectShareResult(BaseModel):
     success: bool
 
 
+class ProjectsShare(ProjectShare):
+    project_ids: List[STR_UUID]
+
+
+class ProjectsUnshare(BaseModel):
+    project_ids: List[STR_UUID]
+    platform_ids: List[STR_UUID]
+
+
+class ShareStatus(str, Enum):
+    SHARED = "shared"
+    UNSHARED = "unshared"
+    NOT_SHARED = "not_shared"
+    # the project does not exist or is owned by another platform
+    NOT_ALLOWED = "not_allowed"
+    UNKNOWN_PLATFORM = "unknown_platform"
+    # recipient is the owner platform of the project
+    OWNER = "owner"
+
+
+class ProjectShareStatus(BaseModel):
+    project_id: str
+    platform_id: str
+    status: ShareStatus
+    readonly: Optional[bool] = None
+
+
+class ProjectPermissionsQuery(BaseModel):
+    project_ids: List[str]
+
+
+class ProjectPermissions(BaseModel):
+    project_id: str
+    read: bool
+    edit: bool
+    share: bool
+
+
 class Project(ProjectBase):
     id: str
 
@@ -193,11 +252,13 @@ class AccessKeyBase(BaseModel):
     end_datetime: Optional[datetime]
 
     @field_serializer('start_datetime')
-    def serialize_start_datetime(self, start_datetime: datetime) -> str:
+    @staticmethod
+    def serialize_start_datetime(start_datetime: datetime) -> str:
         return datetime.strftime(start_datetime, "%m/%d/%Y, %H:%M:%S")
 
     @field_serializer('end_datetime')
-    def serialize_end_datetime(self, end_datetime: datetime) -> str:
+    @staticmethod
+    def serialize_end_datetime(end_datetime: datetime) -> str:
         return datetime.strftime(end_datetime, "%m/%d/%Y, %H:%M:%S")
 
 
@@ -245,37 +306,122 @@ class Platform(PlatformBase):
         from_attributes = True
 
     @field_serializer('user_account')
-    def serialize_user_account(self, user_account: List[PlatformUser]) -> str:
+    @staticmethod
+    def serialize_user_account(user_account: List[PlatformUser]) -> str:
         user_account = user_account and user_account[0] or None
         return user_account and f"{user_account.username}[{user_account.id}]" or "--"
 
 
 class ProjectWithDetails(Project):
-    owner_platform: Platform
-    allowed_platforms: List[Platform]
+    # platforms are serialized by name only: validating them as a full `Platform` would load all of their relationships
+    owner_platform: PlatformBase
+    allowed_platforms: List[PlatformBase]
     regulatory_frameworks: List[RegulatoryFramework]
     involved_entities: List[EntityBase]
     involved_users: List[UserMinimized]
 
     @field_serializer('owner_platform')
-    def serialize_owner_platform(self, owner_platform: Platform) -> str:
+    @staticmethod
+    def serialize_owner_platform(owner_platform: PlatformBase) -> str:
         return owner_platform.name
 
     @field_serializer('allowed_platforms')
-    def serialize_allowed_platforms(self, allowed_platforms: List[Platform]) -> List[str]:
+    @staticmethod
+    def serialize_allowed_platforms(allowed_platforms: List[PlatformBase]) -> List[str]:
         return [p.name for p in allowed_platforms]
 
 
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
 class LoginResponse(BaseModel):
     access_token: str
     username: str
     firstname: Optional[str] = None
     lastname: Optional[str] = None
-    email: Optional[EmailStr] = None
+    email: STORED_EMAIL = None
     last_login: Optional[datetime]
     role: Optional[str] = None
     is_admin: bool
 
     @field_serializer('last_login')
-    def serialize_last_login(self, last_login: datetime) -> str:
+    @staticmethod
+    def serialize_last_login(last_login: datetime) -> str:
         return datetime.strftime(last_login, "%m/%d/%Y, %H:%M")
+
+
+class CacheStats(BaseModel):
+    size: int
+    max_size: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    hit_ratio: float
+
+
+class ResponseCacheStats(BaseModel):
+    backend: str
+    ttl_seconds: float
+    hits: int
+    misses: int
+    hit_ratio: float
+    errors: int
+    # memory backend only
+    entries: Optional[int] = None
+    max_entries: Optional[int] = None
+    bytes: Optional[int] = None
+    max_bytes: Optional[int] = None
+    # redis backend only
+    connected: Optional[bool] = None
+
+
+class PrincipalCacheStats(CacheStats):
+    claims_hits: int
+    api_keys: CacheStats
+
+
+class HistogramSnapshot(BaseModel):
+    count: int
+    sum: float
+    buckets: dict[str, int]
+
+
+class PasswordHashingStats(BaseModel):
+    max_workers: int
+    max_queue: int
+    pending: int
+    rejected: int
+    hash_seconds: HistogramSnapshot
+    queue_wait_seconds: HistogramSnapshot
+
+
+class DatabasePoolStats(BaseModel):
+    pool_size: int
+    max_overflow: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    connections: int
+    checkouts: int
+    invalidations: int
+    timeouts: int
+    checkout_wait_seconds: HistogramSnapshot
+    checkout_duration_seconds: HistogramSnapshot
+
+
+class SlowQueryStats(BaseModel):
+    fingerprint: str
+    # literals and IN lists collapsed to `?`
+    statement: str
+    calls: int
+    total_seconds: float
+    mean_seconds: float
+    max_seconds: float
+    last_seen: str
+    # types of the bound parameters of the last call, never their values
+    parameters: Optional[Any] = None
+    service: Optional[str] = None
+    route: Optional[str] = None
+    plan: Optional[str] = None
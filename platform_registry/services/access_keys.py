@@ -1,72 +1,121 @@
+import hashlib
+import hmac
 import secrets
 from datetime import datetime, timedelta
-from typing import Tuple
+from typing import Optional, Tuple
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from platform_registry.core.config import settings
+from platform_registry.core.pagination import PageParams, paginate
+from platform_registry.core.soft_delete import include_deleted
+from platform_registry.core.tracing import traced
 from platform_registry.models import AccessKey
 from platform_registry.schemas import AccessKeyPatch, AccessKeyCreate
 
 
+KEY_ID_LENGTH = 12
+
+
 def generate_key() -> str:
-    return secrets.token_urlsafe(32)
+    # a random key id of KEY_ID_LENGTH characters followed by a 256 bits secret
+    return secrets.token_urlsafe(9) + secrets.token_urlsafe(32)
+
+
+def get_key_id(key: str) -> str:
+    return key[:KEY_ID_LENGTH]
 
 
-def get_access_keys(db: Session):
-    return db.query(AccessKey).all()
+def get_key_digest(key: str) -> str:
+    return hmac.new(settings.access_key_hmac_secret.encode(), key.encode(), hashlib.sha256).hexdigest()
 
 
-def get_access_key_by_id(db: Session, key_id: str):
-    return db.query(AccessKey).filter(AccessKey.id == key_id).first()
+@traced
+async def get_access_keys(db: AsyncSession, page: PageParams = None, with_archived: bool = False):
+    return await paginate(db, include_deleted(select(AccessKey), with_archived), page)
 
 
-def get_platform_access_keys(db: Session, platform_id: str):
-    return db.query(AccessKey).filter(AccessKey.platform_id == platform_id)\
-                              .all()
+@traced
+async def get_access_key_by_id(db: AsyncSession, key_id: str, with_archived: bool = False):
+    return await db.scalar(include_deleted(select(AccessKey).filter(AccessKey.id == key_id), with_archived))
 
 
-def get_platform_current_valid_key(db: Session, platform_id: str):
-    return db.query(AccessKey).filter(AccessKey.platform_id == platform_id,
-                                      AccessKey.start_datetime <= datetime.now(),
-                                      AccessKey.end_datetime > datetime.now())\
-                              .first()
+@traced
+async def get_platform_access_keys(db: AsyncSession, platform_id: str, page: PageParams = None):
+    return await paginate(db, select(AccessKey).filter(AccessKey.platform_id == platform_id), page)
 
 
-def create_access_key(db: Session, access_key: AccessKeyCreate):
+@traced
+async def get_platform_current_valid_key(db: AsyncSession, platform_id: str):
+    return await db.scalar(select(AccessKey).filter(AccessKey.platform_id == platform_id,
+                                                    AccessKey.start_datetime <= datetime.now(),
+                                                    AccessKey.end_datetime > datetime.now()))
+
+
+@traced
+async def create_access_key(db: AsyncSession, access_key: AccessKeyCreate):
     now = datetime.now()
     year_month = now.strftime('%Y%m')
     key_name = f"Key_{year_month}_{access_key.platform_id[:8]}"
+    plain_key = generate_key()
     key = AccessKey(label=key_name,
-                    key=generate_key(),
+                    key=plain_key,
+                    key_id=get_key_id(plain_key),
+                    key_digest=get_key_digest(plain_key),
                     start_datetime=now,
                     end_datetime=now + timedelta(days=settings.ACCESS_KEY_LIFESPAN_DAYS),
                     platform_id=access_key.platform_id)
     db.add(key)
-    db.commit()
-    db.refresh(key)
+    await db.commit()
+    await db.refresh(key)
     return key
 
 
+@traced
+async def authenticate_access_key(db: AsyncSession, key: str) -> Optional[AccessKey]:
+    """ returns the currently valid access key matching the given plain key.
+        Keys created before digests were introduced are looked up by value, then get their digest on first use.
+    """
+    if not key:
+        return None
+    access_key = await db.scalar(select(AccessKey).filter(AccessKey.key_id == get_key_id(key)))
+    if access_key is None:
+        access_key = await db.scalar(select(AccessKey).filter(AccessKey.key == key,
+                                                              AccessKey.key_digest == None))
+        if access_key is None:
+            return None
+        access_key.key_id = get_key_id(key)
+        access_key.key_digest = get_key_digest(key)
+        await db.commit()
+    if not hmac.compare_digest(access_key.key_digest or "", get_key_digest(key)):
+        return None
+    if not access_key.start_datetime <= datetime.now() < access_key.end_datetime:
+        return None
+    return access_key
+
+
 def check_access_key_validity(key_in: AccessKeyPatch) -> Tuple[bool, str]:
     if key_in.start_datetime and key_in.end_datetime and key_in.start_datetime >= key_in.end_datetime:
         return False, "End date must be greater than start date"
     return True, ""
 
 
-def update_access_key(db: Session, key: AccessKey, key_in: AccessKeyPatch):
+@traced
+async def update_access_key(db: AsyncSession, key: AccessKey, key_in: AccessKeyPatch):
     key_data = key_in.model_dump(exclude_unset=True,
                                  exclude_none=True)
     for k, v in key_data.items():
         setattr(key, k, v)
-    db.commit()
-    db.refresh(key)
+    await db.commit()
+    await db.refresh(key)
     return key
 
-def archive_access_key(db: Session, key: AccessKey):
+@traced
+async def archive_access_key(db: AsyncSession, key: AccessKey):
     now = datetime.now()
     key.end_datetime = now
     key.deleted_at = now
-    db.commit()
-    db.refresh(key)
+    await db.commit()
+    await db.refresh(key)
     return key
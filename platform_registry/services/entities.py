@@ -1,44 +1,82 @@
-from typing import List
+from typing import List, Any
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
+from platform_registry.core.bulk import BulkBatch
+from platform_registry.core.etag import table_state, tables_state
+from platform_registry.core.pagination import PageParams, paginate
+from platform_registry.core.response_cache import response_cache, ENTITIES, ENTITY_TYPES
+from platform_registry.core.tracing import traced
 from platform_registry.models import EntityType, Entity
-from platform_registry.schemas import EntityTypeCreate, EntityCreate
+from platform_registry.schemas import EntityTypeCreate, EntityCreate, BulkItemResult
 
 
-def get_entity_type(db: Session, entity_type_id: str):
-    return db.query(EntityType).filter(EntityType.id == entity_type_id).first()
+@traced
+async def get_entity_type(db: AsyncSession, entity_type_id: str):
+    return await db.scalar(select(EntityType).filter(EntityType.id == entity_type_id))
 
 
-def create_entity_type(db: Session, entity_type: EntityTypeCreate):
+@traced
+async def create_entity_type(db: AsyncSession, entity_type: EntityTypeCreate):
     db_entity_type = EntityType(name=entity_type.name)
     db.add(db_entity_type)
-    db.commit()
-    db.refresh(db_entity_type)
+    await db.commit()
+    await response_cache.invalidate(ENTITY_TYPES)
+    await db.refresh(db_entity_type)
     return db_entity_type
 
 
-def get_entity_types(db: Session):
-    return db.query(EntityType).all()
+@traced
+async def get_entity_types(db: AsyncSession, page: PageParams = None):
+    return await paginate(db, select(EntityType), page)
 
 
-def get_entity(db: Session, entity_id: str):
-    return db.query(Entity).filter(Entity.id == entity_id).first()
+@traced
+async def get_entity(db: AsyncSession, entity_id: str):
+    return await db.scalar(select(Entity).options(selectinload(Entity.entity_type))
+                                         .filter(Entity.id == entity_id))
 
 
-def create_entity(db: Session, entity: EntityCreate):
+@traced
+async def create_entity(db: AsyncSession, entity: EntityCreate):
     db_entity = Entity(
         name=entity.name,
         entity_type_id=entity.entity_type_id
     )
     db.add(db_entity)
-    db.commit()
-    db.refresh(db_entity)
-    return db_entity
+    await db.commit()
+    await response_cache.invalidate(ENTITIES)
+    return await get_entity(db, entity_id=db_entity.id)
 
 
-def get_entities(db: Session, ids: List[str] = None):
+@traced
+async def create_entities(db: AsyncSession, items: List[Any]) -> List[BulkItemResult]:
+    batch = BulkBatch(EntityCreate, items)
+    entity_type_ids = {e.entity_type_id for e in batch.valid.values()}
+    known_entity_type_ids = set((await db.scalars(select(EntityType.id).filter(EntityType.id.in_(entity_type_ids)))).all())
+    batch.reject(lambda e: e.entity_type_id not in known_entity_type_ids, error="entity_type_id: unknown entity type")
+    await batch.insert(db, Entity)
+    await db.commit()
+    await response_cache.invalidate(ENTITIES)
+    return batch.results
+
+
+@traced
+async def get_entities(db: AsyncSession, ids: List[str] = None, page: PageParams = None):
     entities_filter = []
     if ids:
         entities_filter.append(Entity.id.in_(ids))
-    return db.query(Entity).filter(*entities_filter).all()
+    return await paginate(db, select(Entity).options(selectinload(Entity.entity_type))
+                                            .filter(*entities_filter), page)
+
+
+@traced
+async def get_entities_state(db: AsyncSession) -> list[tuple]:
+    return await tables_state(db, table_state(Entity), table_state(EntityType))
+
+
+@traced
+async def get_entity_types_state(db: AsyncSession) -> list[tuple]:
+    return await tables_state(db, table_state(EntityType))
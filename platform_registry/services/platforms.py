@@ -1,55 +1,87 @@
 from datetime import datetime, timedelta
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from platform_registry.core.security import get_password_hash
-from platform_registry.models import Platform, User
+from platform_registry.core.etag import table_state, tables_state
+from platform_registry.core.pagination import PageParams, paginate
+from platform_registry.core.principals import Principal
+from platform_registry.core.tracing import traced
+from platform_registry.models import Platform, User, Project, PlatformsSharedProjectsRel, AccessKey
 from platform_registry.schemas import PlatformCreate, PlatformUserCreateCreate, AccessKeyCreate, PlatformPatch
 from platform_registry.services import roles, users
 from platform_registry.services.access_keys import create_access_key
+from platform_registry.services.projects import visible_to_platform
 
+# relationships serialized by `schemas.Platform`
+PLATFORM_LOADING_OPTIONS = (selectinload(Platform.user_account),
+                            selectinload(Platform.owned_projects),
+                            selectinload(Platform.shared_projects),
+                            selectinload(Platform.access_keys))
 
-def get_platforms(db: Session, user: User, to_share_project=False):
+
+@traced
+async def get_platforms(db: AsyncSession, user: Principal, to_share_project=False, page: PageParams = None):
     platforms_filter = []
     if user.role.is_platform:
         if to_share_project:
             platforms_filter.append(Platform.id != user.platform_id)
         else:
             platforms_filter.append(Platform.id == user.platform_id)
-    return db.query(Platform).filter(*platforms_filter).all()
+    return await paginate(db, select(Platform).options(*PLATFORM_LOADING_OPTIONS)
+                                              .filter(*platforms_filter), page)
+
+
+@traced
+async def get_platforms_state(db: AsyncSession, user: Principal) -> list[tuple]:
+    """ state of every table serialized by `get_platforms`, restricted to their own platform for platform users """
+    if not user.role.is_platform:
+        return await tables_state(db, *(table_state(model) for model in (Platform, User, Project,
+                                                                         PlatformsSharedProjectsRel, AccessKey)))
+    platform_id = user.platform_id
+    return await tables_state(db,
+                              table_state(Platform, Platform.id == platform_id),
+                              table_state(User, User.platform_id == platform_id),
+                              table_state(Project, visible_to_platform(platform_id)),
+                              table_state(PlatformsSharedProjectsRel, PlatformsSharedProjectsRel.platform_id == platform_id),
+                              table_state(AccessKey, AccessKey.platform_id == platform_id))
 
 
-def get_platform_by_id(db: Session, platform_id: str):
-    return db.query(Platform).filter(Platform.id == platform_id).first()
+@traced
+async def get_platform_by_id(db: AsyncSession, platform_id: str):
+    return await db.scalar(select(Platform).options(*PLATFORM_LOADING_OPTIONS)
+                                           .filter(Platform.id == platform_id))
 
 
-def create_platform(db: Session, platform: PlatformCreate):
+@traced
+async def create_platform(db: AsyncSession, platform: PlatformCreate):
     db_platform = Platform(name=platform.name)
     db.add(db_platform)
-    db.commit()
-    db.refresh(db_platform)
+    await db.commit()
+    await db.refresh(db_platform)
     return db_platform
 
 
-def setup_platform(db: Session, platform: PlatformCreate):
-    new_platform = create_platform(db=db, platform=platform)
-    ak = create_access_key(db=db, access_key=AccessKeyCreate(platform_id=new_platform.id))
-    platform_role = roles.get_platform_role(db=db)
+@traced
+async def setup_platform(db: AsyncSession, platform: PlatformCreate):
+    new_platform = await create_platform(db=db, platform=platform)
+    await create_access_key(db=db, access_key=AccessKeyCreate(platform_id=new_platform.id))
+    platform_role = await roles.get_platform_role(db=db)
     username = platform.name.replace(' ', '-').lower()
     platform_user = PlatformUserCreateCreate(username=username,
                                              expiration_date=datetime.now() + timedelta(days=365),
-                                             hashed_password=get_password_hash(ak.key),
                                              role_id=platform_role.id,
                                              platform_id=new_platform.id)
-    users.create_user(db=db, user=platform_user)
-    return new_platform
+    await users.create_user(db=db, user=platform_user)
+    return await get_platform_by_id(db=db, platform_id=new_platform.id)
 
 
-def update_platform(db: Session, platform: Platform, platform_in: PlatformPatch):
+@traced
+async def update_platform(db: AsyncSession, platform: Platform, platform_in: PlatformPatch):
     platform_data = platform_in.model_dump(exclude_unset=True,
                                            exclude_none=True)
     for k, v in platform_data.items():
         setattr(platform, k, v)
-    db.commit()
-    db.refresh(platform)
-    return platform
\ No newline at end of file
+    await db.commit()
+    return await get_platform_by_id(db=db, platform_id=platform.id)
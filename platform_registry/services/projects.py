@@ -1,79 +1,208 @@
-from sqlalchemy.orm import Session
-from sqlalchemy.sql.operators import or_, and_
-
-from platform_registry.models import User, Project, PlatformsSharedProjectsRel
-from platform_registry.schemas import ProjectCreate, ProjectPatch, ProjectShare, ProjectShareResult
+from typing import List, AsyncIterator
+from uuid import uuid4
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.sql.operators import or_
+
+from platform_registry.core.acl import projects_acl, Permission
+from platform_registry.core.config import settings
+from platform_registry.core.pagination import PageParams, paginate
+from platform_registry.core.principals import Principal, PrincipalPlatform
+from platform_registry.core.bulk import dialect_insert
+from platform_registry.core.etag import table_state, tables_state
+from platform_registry.core.tracing import traced
+from platform_registry.models import Project, PlatformsSharedProjectsRel, Platform, ProjectRegulatoryFrameworkRel, \
+    ProjectEntitiesRel, ProjectUsersRel, RegulatoryFramework, Entity, User
+from platform_registry.schemas import ProjectCreate, ProjectPatch, ProjectShare, ProjectShareResult, ProjectPermissions, \
+    RecipientPlatformWithPermission, ProjectShareStatus, ShareStatus
 from platform_registry.services import regulatory_frameworks, users, entities
 
+# relationships serialized by `schemas.ProjectWithDetails`: one query per collection whatever the number of projects
+PROJECT_LOADING_OPTIONS = (joinedload(Project.owner_platform),
+                           selectinload(Project.allowed_platforms),
+                           selectinload(Project.regulatory_frameworks),
+                           selectinload(Project.involved_entities),
+                           selectinload(Project.involved_users))
+
+
+def visible_to_platform(platform_id: str):
+    """ SQL predicate on `Project` of the projects a platform can read: those it owns or that were shared with it.
+        The uncorrelated subquery is run once and hashed, where a correlated EXISTS under the OR is run for each project,
+        see `scripts/benchmark_visibility.py`
+    """
+    return or_(Project.owner_platform_id == platform_id,
+               Project.id.in_(select(PlatformsSharedProjectsRel.project_id)
+                              .filter(PlatformsSharedProjectsRel.platform_id == platform_id)))
 
-def get_projects(db: Session, user: User):
+
+def visible_projects(user: Principal):
     projects_filter = []
     if user.role.is_platform:
-        projects_filter.append(or_(Project.owner_platform_id == user.platform_id,
-                                   Project.id in (proj.id for proj in user.platform.shared_projects)
-                                   ))
-    return db.query(Project).filter(*projects_filter).all()
+        projects_filter.append(visible_to_platform(user.platform_id))
+    return select(Project).options(*PROJECT_LOADING_OPTIONS).filter(*projects_filter)
+
+
+@traced
+async def get_projects(db: AsyncSession, user: Principal, page: PageParams = None):
+    return await paginate(db, visible_projects(user), page)
+
+
+@traced
+async def get_projects_state(db: AsyncSession, user: Principal) -> list[tuple]:
+    """ state of every table serialized by `get_projects`, rel tables being restricted to the visible projects """
+    visible_ids = visible_projects(user).with_only_columns(Project.id)
+    return await tables_state(db,
+                              table_state(Project, Project.id.in_(visible_ids)),
+                              *(table_state(rel, rel.project_id.in_(visible_ids))
+                                for rel in (PlatformsSharedProjectsRel, ProjectRegulatoryFrameworkRel,
+                                            ProjectEntitiesRel, ProjectUsersRel)),
+                              *(table_state(model) for model in (Platform, RegulatoryFramework, Entity, User)))
+
+
+async def stream_projects(db: AsyncSession, user: Principal) -> AsyncIterator[List[Project]]:
+    """ visible projects by batches of `EXPORT_BATCH_SIZE`, read through a server-side cursor.
+        Batches are evicted from the session once consumed, so that memory use does not grow with the registry.
+    """
+    result = await db.stream_scalars(visible_projects(user).order_by(Project.created_at, Project.id)
+                                                           .execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+    async for batch in result.partitions():
+        yield batch
+        db.expunge_all()
 
 
-def get_project_by_id(db: Session, project_id: str):
-    return db.query(Project).filter(Project.id == project_id).first()
+@traced
+async def get_project_by_id(db: AsyncSession, project_id: str):
+    return await db.scalar(select(Project).options(*PROJECT_LOADING_OPTIONS)
+                                          .filter(Project.id == project_id))
 
 
-def build_objects(db, project_data) -> None:
+@traced
+async def build_objects(db, project_data) -> None:
     framework_ids = project_data.pop("framework_ids", None)
     if framework_ids:
-        project_data["regulatory_frameworks"] = regulatory_frameworks.get_regulatory_frameworks(db=db, ids=framework_ids)
+        project_data["regulatory_frameworks"] = await regulatory_frameworks.get_regulatory_frameworks(db=db, ids=framework_ids)
     user_ids = project_data.pop("user_ids", None)
     if user_ids:
-        project_data["involved_users"] = users.get_regular_users(db=db, ids=user_ids)
+        project_data["involved_users"] = await users.get_regular_users(db=db, ids=user_ids)
     entity_ids = project_data.pop("entity_ids", None)
     if entity_ids:
-        project_data["involved_entities"] = entities.get_entities(db=db, ids=entity_ids)
+        project_data["involved_entities"] = await entities.get_entities(db=db, ids=entity_ids)
 
 
-def create_project(db: Session, project: ProjectCreate, platform_id: str):
+@traced
+async def create_project(db: AsyncSession, project: ProjectCreate, platform_id: str):
     project_data = project.model_dump(exclude_unset=True)
-    build_objects(db=db, project_data=project_data)
+    await build_objects(db=db, project_data=project_data)
     new_project = Project(**project_data, owner_platform_id=platform_id)
     db.add(new_project)
-    db.commit()
-    return new_project
+    await db.commit()
+    return await get_project_by_id(db, project_id=new_project.id)
 
 
-def update_project(db: Session, project: Project, project_in: ProjectPatch):
+@traced
+async def update_project(db: AsyncSession, project: Project, project_in: ProjectPatch):
     project_data = project_in.model_dump(exclude_unset=True)
-    build_objects(db, project_data)
+    await build_objects(db, project_data)
     for key, value in project_data.items():
         setattr(project, key, value)
-    db.commit()
-    db.refresh(project)
-    return project
-
-
-def share_project(db: Session, project: Project, share_with: ProjectShare):
-    for recipient in share_with.recipient_platform_ids:
-        if recipient.platform_id != project.owner_platform_id:
-            shared_project = PlatformsSharedProjectsRel(project_id=project.id,
-                                                        **recipient.model_dump())
-            db.add(shared_project)
-            db.commit()
-            db.refresh(shared_project)
-    return ProjectShareResult(success=True)
-
-
-def platform_can_access_project(platform, target_project) -> bool:
-    return target_project.owner_platform_id == platform.id or \
-           target_project.id in [p.id for p in platform.shared_projects]
-
-
-def platform_can_edit_project(db: Session, platform, target_project) -> bool:
-    shared_projects_rels = db.query(PlatformsSharedProjectsRel)\
-                             .filter(and_(and_(PlatformsSharedProjectsRel.project_id == target_project.id,
-                                               PlatformsSharedProjectsRel.platform_id == platform.id),
-                                          not PlatformsSharedProjectsRel.readonly))\
-                             .all()
-    writable_projects = [rel.project_id for rel in shared_projects_rels]
-    return platform.id == target_project.owner_platform_id or target_project.id in writable_projects
-
-def platform_can_share_project(platform, project) -> bool:
-    return project.owner_platform_id == platform.id
+    await db.commit()
+    return await get_project_by_id(db, project_id=project.id)
+
+
+@traced
+async def share_projects(db: AsyncSession,
+                         platform: PrincipalPlatform,
+                         project_ids: List[str],
+                         recipients: List[RecipientPlatformWithPermission]) -> List[ProjectShareStatus]:
+    """ shares every project with every recipient in a single upsert: sharing again only updates the access mode """
+    permissions = await projects_acl.check_many(db, platform_id=platform.id, project_ids=project_ids)
+    recipients = {r.platform_id: r for r in recipients}
+    known_platform_ids = set((await db.scalars(select(Platform.id).filter(Platform.id.in_(recipients)))).all())
+    results, shares = [], []
+    for project_id in dict.fromkeys(project_ids):
+        for platform_id, recipient in recipients.items():
+            if Permission.SHARE not in permissions[project_id]:
+                status = ShareStatus.NOT_ALLOWED
+            elif platform_id == platform.id:
+                status = ShareStatus.OWNER
+            elif platform_id not in known_platform_ids:
+                status = ShareStatus.UNKNOWN_PLATFORM
+            else:
+                status = ShareStatus.SHARED
+                shares.append({"id": str(uuid4()), "project_id": project_id, "platform_id": platform_id, "readonly": recipient.readonly})
+            results.append(ProjectShareStatus(project_id=project_id, platform_id=platform_id, status=status,
+                                              readonly=recipient.readonly if status == ShareStatus.SHARED else None))
+    if shares:
+        insert_shares = dialect_insert(db, PlatformsSharedProjectsRel)
+        await db.execute(insert_shares.on_conflict_do_update(index_elements=[PlatformsSharedProjectsRel.project_id,
+                                                                             PlatformsSharedProjectsRel.platform_id],
+                                                             set_={"readonly": insert_shares.excluded.readonly,
+                                                                   "modified_at": func.now()}),
+                         shares)
+        # rows are written without the ORM, hence without the ACL mapper events
+        await projects_acl.invalidate(db, *{share["platform_id"] for share in shares})
+        await db.commit()
+    return results
+
+
+@traced
+async def unshare_projects(db: AsyncSession,
+                           platform: PrincipalPlatform,
+                           project_ids: List[str],
+                           platform_ids: List[str]) -> List[ProjectShareStatus]:
+    permissions = await projects_acl.check_many(db, platform_id=platform.id, project_ids=project_ids)
+    allowed_project_ids = [project_id for project_id, permission in permissions.items() if Permission.SHARE in permission]
+    unshared = set()
+    if allowed_project_ids and platform_ids:
+        unshared = set((await db.execute(delete(PlatformsSharedProjectsRel)
+                                         .filter(PlatformsSharedProjectsRel.project_id.in_(allowed_project_ids),
+                                                 PlatformsSharedProjectsRel.platform_id.in_(platform_ids))
+                                         .returning(PlatformsSharedProjectsRel.project_id,
+                                                    PlatformsSharedProjectsRel.platform_id)
+                                         .execution_options(synchronize_session=False))).all())
+        await projects_acl.invalidate(db, *{platform_id for _, platform_id in unshared})
+        await db.commit()
+    results = []
+    for project_id in dict.fromkeys(project_ids):
+        for platform_id in dict.fromkeys(platform_ids):
+            if project_id not in allowed_project_ids:
+                status = ShareStatus.NOT_ALLOWED
+            elif (project_id, platform_id) in unshared:
+                status = ShareStatus.UNSHARED
+            else:
+                status = ShareStatus.NOT_SHARED
+            results.append(ProjectShareStatus(project_id=project_id, platform_id=platform_id, status=status))
+    return results
+
+
+@traced
+async def share_project(db: AsyncSession, platform: PrincipalPlatform, project: Project, share_with: ProjectShare):
+    results = await share_projects(db, platform=platform, project_ids=[project.id], recipients=share_with.recipient_platform_ids)
+    return ProjectShareResult(success=all(r.status in (ShareStatus.SHARED, ShareStatus.OWNER) for r in results))
+
+
+@traced
+async def platform_can_access_project(db: AsyncSession, platform: PrincipalPlatform, target_project: Project) -> bool:
+    return await projects_acl.check(db, platform_id=platform.id, project_id=target_project.id, permission=Permission.READ)
+
+
+@traced
+async def platform_can_edit_project(db: AsyncSession, platform: PrincipalPlatform, target_project: Project) -> bool:
+    return await projects_acl.check(db, platform_id=platform.id, project_id=target_project.id, permission=Permission.EDIT)
+
+
+@traced
+async def platform_can_share_project(db: AsyncSession, platform: PrincipalPlatform, project: Project) -> bool:
+    return await projects_acl.check(db, platform_id=platform.id, project_id=project.id, permission=Permission.SHARE)
+
+
+@traced
+async def get_projects_permissions(db: AsyncSession, platform: PrincipalPlatform, project_ids: List[str]) -> List[ProjectPermissions]:
+    permissions = await projects_acl.check_many(db, platform_id=platform.id, project_ids=project_ids)
+    return [ProjectPermissions(project_id=project_id,
+                               read=Permission.READ in permission,
+                               edit=Permission.EDIT in permission,
+                               share=Permission.SHARE in permission)
+            for project_id, permission in permissions.items()]
@@ -1,36 +1,66 @@
-from typing import List
+from typing import List, Any
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from platform_registry.core.bulk import BulkBatch
+from platform_registry.core.etag import table_state, tables_state
+from platform_registry.core.pagination import PageParams, paginate
+from platform_registry.core.response_cache import response_cache, REGULATORY_FRAMEWORKS
+from platform_registry.core.tracing import traced
 from platform_registry.models import RegulatoryFramework
-from platform_registry.schemas import RegulatoryFrameworkCreate, RegulatoryFrameworkPatch
+from platform_registry.schemas import RegulatoryFrameworkCreate, RegulatoryFrameworkPatch, BulkItemResult
 
 
-def get_regulatory_frameworks(db: Session, ids: List[str] = None):
+@traced
+async def get_regulatory_frameworks(db: AsyncSession, ids: List[str] = None, page: PageParams = None):
     frameworks_filter = []
     if ids:
         frameworks_filter.append(RegulatoryFramework.id.in_(ids))
-    return db.query(RegulatoryFramework).filter(*frameworks_filter).all()
+    return await paginate(db, select(RegulatoryFramework).filter(*frameworks_filter), page)
 
 
-def get_regulatory_framework(db: Session, framework_id: str):
-    return db.query(RegulatoryFramework).filter(RegulatoryFramework.id == framework_id).first()
+@traced
+async def get_regulatory_frameworks_state(db: AsyncSession) -> list[tuple]:
+    return await tables_state(db, table_state(RegulatoryFramework))
 
 
-def create_regulatory_framework(db: Session, regulatory_framework: RegulatoryFrameworkCreate):
+@traced
+async def get_regulatory_framework(db: AsyncSession, framework_id: str):
+    return await db.scalar(select(RegulatoryFramework).filter(RegulatoryFramework.id == framework_id))
+
+
+@traced
+async def create_regulatory_framework(db: AsyncSession, regulatory_framework: RegulatoryFrameworkCreate):
     db_regulatory_framework = RegulatoryFramework(**regulatory_framework.model_dump())
     db.add(db_regulatory_framework)
-    db.commit()
-    db.refresh(db_regulatory_framework)
+    await db.commit()
+    await response_cache.invalidate(REGULATORY_FRAMEWORKS)
+    await db.refresh(db_regulatory_framework)
     return db_regulatory_framework
 
 
-def update_regulatory_framework(db: Session,
-                                framework: RegulatoryFramework,
-                                framework_in: RegulatoryFrameworkPatch):
+@traced
+async def create_regulatory_frameworks(db: AsyncSession, items: List[Any]) -> List[BulkItemResult]:
+    """ frameworks names have no unique constraint: those already in use are reported as duplicates """
+    batch = BulkBatch(RegulatoryFrameworkCreate, items)
+    names = {f.name for f in batch.valid.values()}
+    existing_names = (await db.scalars(select(RegulatoryFramework.name).filter(RegulatoryFramework.name.in_(names)))).all()
+    batch.reject_duplicates(key=lambda f: f.name, existing=existing_names)
+    await batch.insert(db, RegulatoryFramework)
+    await db.commit()
+    await response_cache.invalidate(REGULATORY_FRAMEWORKS)
+    return batch.results
+
+
+@traced
+async def update_regulatory_framework(db: AsyncSession,
+                                      framework: RegulatoryFramework,
+                                      framework_in: RegulatoryFrameworkPatch):
     framework_data = framework_in.model_dump()
     for key, value in framework_data.items():
         setattr(framework, key, value)
-    db.commit()
-    db.refresh(framework)
+    await db.commit()
+    await response_cache.invalidate(REGULATORY_FRAMEWORKS)
+    await db.refresh(framework)
     return framework
@@ -1,5 +1,9 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from platform_registry.core.etag import table_state, tables_state
+from platform_registry.core.response_cache import response_cache, ROLES
+from platform_registry.core.tracing import traced
 from platform_registry.schemas import RoleCreate
 from platform_registry.models import Role
 
@@ -19,20 +23,24 @@ DEFAULT_PLATFORM_ROLE_PROPS: dict[str, bool] = dict(manage_users=False,
                                                     manage_projects=True)
 
 
-def get_role_by_id(db: Session, role_id: str):
-    return db.query(Role).filter(Role.id == role_id).first()
+@traced
+async def get_role_by_id(db: AsyncSession, role_id: str):
+    return await db.scalar(select(Role).filter(Role.id == role_id))
 
 
-def get_role_by_name(db: Session, name: str):
-    return db.query(Role).filter(Role.name == name).first()
+@traced
+async def get_role_by_name(db: AsyncSession, name: str):
+    return await db.scalar(select(Role).filter(Role.name == name))
 
 
-def get_admin_role(db: Session):
-    return db.query(Role).filter(Role.is_registry_admin).first()
+@traced
+async def get_admin_role(db: AsyncSession):
+    return await db.scalar(select(Role).filter(Role.is_registry_admin))
 
 
-def get_platform_role(db: Session):
-    return db.query(Role).filter(Role.is_platform).first()
+@traced
+async def get_platform_role(db: AsyncSession):
+    return await db.scalar(select(Role).filter(Role.is_platform))
 
 
 def complete_role_initial_data(role: RoleCreate) -> dict:
@@ -40,14 +48,22 @@ def complete_role_initial_data(role: RoleCreate) -> dict:
     return {**role.model_dump(), **properties}
 
 
-def create_role(db: Session, role: RoleCreate):
+@traced
+async def create_role(db: AsyncSession, role: RoleCreate):
     completed_role = complete_role_initial_data(role=role)
     db_role = Role(**completed_role)
     db.add(db_role)
-    db.commit()
-    db.refresh(db_role)
+    await db.commit()
+    await response_cache.invalidate(ROLES)
+    await db.refresh(db_role)
     return db_role
 
 
-def get_roles(db: Session):
-    return db.query(Role).all()
+@traced
+async def get_roles(db: AsyncSession):
+    return (await db.scalars(select(Role))).all()
+
+
+@traced
+async def get_roles_state(db: AsyncSession) -> list[tuple]:
+    return await tables_state(db, table_state(Role))
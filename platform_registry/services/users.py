@@ -1,79 +1,112 @@
 import os
 from datetime import datetime
-from typing import Union, List
+from typing import Union, List, Any
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
+from platform_registry.core.bulk import BulkBatch
+from platform_registry.core.pagination import PageParams, paginate
+from platform_registry.core.principals import Principal
 from platform_registry.core.security import get_password_hash
-from platform_registry.models import User
-from platform_registry.schemas import RegularUserCreate, AdminUserCreateCreate, PlatformUserCreateCreate, Role, RegularUserPatch
+from platform_registry.core.tracing import traced
+from platform_registry.models import User, Role as RoleModel
+from platform_registry.schemas import RegularUserCreate, AdminUserCreateCreate, PlatformUserCreateCreate, Role, RegularUserPatch, \
+    BulkItemResult
 
 ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD")
 
 
-def get_user_by_username(db: Session, username: str, user: User = None):
-    user_found = db.query(User).filter(User.username == username).first()
+@traced
+async def get_user_by_username(db: AsyncSession, username: str, user: Principal = None):
+    user_found = await db.scalar(select(User).options(joinedload(User.role), joinedload(User.platform))
+                                             .filter(User.username == username))
     if user and user.role.is_platform and user_found and user_found.role is not None:
         return None
     return user_found
 
 
-def get_all_users(db: Session):
-    return db.query(User).all()
+@traced
+async def get_all_users(db: AsyncSession, page: PageParams = None):
+    return await paginate(db, select(User).options(joinedload(User.role)), page)
 
 
-def get_regular_users(db: Session, ids: List[str] = None):
+@traced
+async def get_regular_users(db: AsyncSession, ids: List[str] = None, page: PageParams = None):
     users_filter = []
     if ids:
         users_filter.append(User.id.in_(ids))
-    return db.query(User).filter(User.role_id == None).filter(*users_filter).all()
+    return await paginate(db, select(User).filter(User.role_id == None).filter(*users_filter), page)
 
 
-def get_platform_accounts_users(db: Session):
-    return db.query(User).filter(User.role.is_platform).all()
+@traced
+async def get_platform_accounts_users(db: AsyncSession):
+    return (await db.scalars(select(User).join(User.role).filter(RoleModel.is_platform))).all()
 
 
-def get_registry_admins_users(db: Session):
-    return db.query(User).filter(User.role.is_registry_admin).all()
+@traced
+async def get_platform_account_user(db: AsyncSession, platform_id: str):
+    return await db.scalar(select(User).options(joinedload(User.role), joinedload(User.platform))
+                                       .join(User.role)
+                                       .filter(User.platform_id == platform_id, RoleModel.is_platform))
 
 
-def create_user(db: Session, user: Union[RegularUserCreate,
-                                         AdminUserCreateCreate,
-                                         PlatformUserCreateCreate]):
+@traced
+async def get_registry_admins_users(db: AsyncSession):
+    return (await db.scalars(select(User).join(User.role).filter(RoleModel.is_registry_admin))).all()
+
+
+@traced
+async def create_user(db: AsyncSession, user: Union[RegularUserCreate,
+                                                    AdminUserCreateCreate,
+                                                    PlatformUserCreateCreate]):
     db_user = User(**user.model_dump())
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-def create_admin_user(db: Session, role: Role) -> User:
-    admin_user = db.query(User).filter(User.username == ADMIN_USERNAME).first()
+@traced
+async def create_users(db: AsyncSession, items: List[Any]) -> List[BulkItemResult]:
+    """ regular users only: usernames or emails already registered are duplicates """
+    batch = BulkBatch(RegularUserCreate, items)
+    await batch.insert(db, User)
+    await db.commit()
+    return batch.results
+
+
+@traced
+async def create_admin_user(db: AsyncSession, role: Role) -> User:
+    admin_user = await db.scalar(select(User).filter(User.username == ADMIN_USERNAME))
     if admin_user:
         return admin_user
     user_in = AdminUserCreateCreate(username=ADMIN_USERNAME,
                                     firstname='Admin',
                                     lastname='ADMIN',
                                     email='admin.admin@registry.fr',
-                                    hashed_password=get_password_hash(ADMIN_PASSWORD),
+                                    hashed_password=await get_password_hash(ADMIN_PASSWORD),
                                     role_id=role.id)
-    return create_user(db=db, user=user_in)
+    return await create_user(db=db, user=user_in)
 
 
-def update_user(db: Session, user: User, user_in: RegularUserPatch):
+@traced
+async def update_user(db: AsyncSession, user: User, user_in: RegularUserPatch):
     user_data = user_in.model_dump(exclude_unset=True)
     for k, v in user_data.items():
         setattr(user, k, v)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
-def update_user_last_login(db: Session, user):
+@traced
+async def update_user_last_login(db: AsyncSession, user):
     user.last_login = datetime.now()
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user, attribute_names=["last_login"])
     return user
 
 
@@ -0,0 +1,117 @@
+"""
+Preparation of the database before serving, done by each container on start:
+
+    python -m platform_registry prepare
+
+Migrations and initial data are applied only when the Alembic revision or the seed version of the database are
+not the current ones: an up-to-date database costs a single query. On PostgreSQL, a replica preparing the database
+holds an advisory lock, the other ones start serving without waiting for it.
+"""
+import logging
+import os
+import zlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, NamedTuple, Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import Connection, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from platform_registry.initial_data import SEED_VERSION, load_initial_data
+
+logger = logging.getLogger(__name__)
+
+# key of the advisory lock, common to all replicas
+MIGRATION_LOCK_KEY = zlib.crc32(b"platform_registry.startup")
+
+CURRENT = "current"
+PREPARED = "prepared"
+BUSY = "busy"
+
+
+class DatabaseState(NamedTuple):
+    revision: Optional[str]
+    seed_version: Optional[int]
+
+
+def alembic_config() -> Config:
+    """ without `alembic.ini`: its logging configuration would replace the one of the caller """
+    config = Config()
+    config.set_main_option("script_location", os.path.join(os.path.dirname(__file__), "alembic"))
+    return config
+
+
+def head_revision() -> str:
+    """ read from the migration scripts, without connecting """
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+async def database_state(connection: AsyncConnection) -> DatabaseState:
+    """ a single round trip. Missing tables, e.g: of an empty database, read as an unknown state """
+    try:
+        row = (await connection.execute(text("SELECT (SELECT version_num FROM alembic_version),"
+                                             " (SELECT max(version) FROM seed_version)"))).one()
+    except DBAPIError:
+        row = (None, None)
+    await connection.rollback()
+    return DatabaseState(*row)
+
+
+@asynccontextmanager
+async def migration_lock(connection: AsyncConnection) -> AsyncIterator[bool]:
+    """ session level lock on PostgreSQL, i.e: kept across transactions: whether it was acquired.
+        Other databases are not shared between replicas and always acquire it.
+    """
+    if connection.dialect.name != "postgresql":
+        yield True
+        return
+    acquired = await connection.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    await connection.commit()
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            await connection.rollback()
+            await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            await connection.commit()
+
+
+def upgrade(connection: Connection) -> None:
+    """ `alembic upgrade head` on the connection holding the lock. Migrations manage their own transactions,
+        e.g: to create indexes concurrently
+    """
+    config = alembic_config()
+    config.attributes["connection"] = connection
+    command.upgrade(config, "head")
+
+
+async def seed(connection: AsyncConnection) -> None:
+    async with AsyncSession(bind=connection, autoflush=False, expire_on_commit=False) as db:
+        await load_initial_data(db=db)
+
+
+async def prepare(engine: AsyncEngine) -> str:
+    """ `CURRENT` when there was nothing to do, `BUSY` when another replica is preparing the database,
+        `PREPARED` otherwise
+    """
+    head = head_revision()
+    async with engine.connect() as connection:
+        if await database_state(connection) == (head, SEED_VERSION):
+            return CURRENT
+        async with migration_lock(connection) as acquired:
+            if not acquired:
+                logger.info("Database being prepared by another replica, serving meanwhile")
+                return BUSY
+            # prepared by another replica since the first check, maybe
+            revision, seed_version = await database_state(connection)
+            if revision != head:
+                logger.info(f"Migrating database from {revision and f'revision {revision}' or 'scratch'} to {head}")
+                await connection.run_sync(upgrade)
+            if seed_version != SEED_VERSION:
+                logger.info(f"Loading initial data version {SEED_VERSION} over "
+                            f"{seed_version is None and 'an unseeded database' or f'version {seed_version}'}")
+                await seed(connection)
+    return PREPARED
@@ -0,0 +1,227 @@
+import base64
+import itertools
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Literal
+from uuid import NAMESPACE_URL, UUID, uuid5
+
+from sqlalchemy import Table, insert, select, func
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from platform_registry import models
+from platform_registry.schemas import RoleCreate
+from platform_registry.services.access_keys import get_key_digest, get_key_id
+from platform_registry.services.roles import complete_role_initial_data
+
+INSERT_BATCH_SIZE = 5000
+
+
+def _today() -> datetime:
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+@dataclass(frozen=True)
+class RegistryScale:
+    """ shape of a synthetic registry. Counts per project are means of exponential distributions:
+        most projects have a few of them, some have many, as in production registries.
+    """
+    platforms: int = 200
+    projects: int = 5000
+    # `zipf`: the n-th platform owns about 1/n^zipf_exponent as many projects as the first one
+    projects_distribution: Literal["uniform", "zipf"] = "zipf"
+    zipf_exponent: float = 1.0
+    # platforms each project is shared with
+    shares: float = 3
+    users: int = 5000
+    users_per_project: float = 5
+    entity_types: int = 5
+    entities: int = 500
+    entities_per_project: float = 3
+    frameworks: int = 10
+    frameworks_per_project: float = 2
+    # expired keys of every platform, on top of its current one
+    expired_keys_per_platform: int = 3
+    # share of soft-deleted projects, users, entities and expired keys, i.e: archived
+    deleted_ratio: float = 0.02
+    # share of users past their expiration date, and of projects past their end date
+    expired_ratio: float = 0.05
+    seed: int = 0
+    # records are created during the 3 years before this date: same seed, same reference, same registry
+    reference: datetime = field(default_factory=_today)
+
+
+class SyntheticRegistry:
+    """ rows of a synthetic registry, as dicts of column values, generated from the seed of `scale` only """
+
+    def __init__(self, scale: RegistryScale, admin_role_id: str, platform_role_id: str):
+        self.scale = scale
+        self.rng = random.Random(scale.seed)
+        self.admin_role_id = admin_role_id
+        self.platform_role_id = platform_role_id
+        self.platform_ids = [self.uuid() for _ in range(scale.platforms)]
+        self.user_ids = [self.uuid() for _ in range(scale.users)]
+        self.entity_type_ids = [self.uuid() for _ in range(scale.entity_types)]
+        self.entity_ids = [self.uuid() for _ in range(scale.entities)]
+        self.framework_ids = [self.uuid() for _ in range(scale.frameworks)]
+        self.project_ids = [self.uuid() for _ in range(scale.projects)]
+        weights = [1.0] * scale.platforms
+        if scale.projects_distribution == "zipf":
+            weights = [1 / (rank + 1) ** scale.zipf_exponent for rank in range(scale.platforms)]
+        self.project_owners = self.rng.choices(self.platform_ids, cum_weights=list(itertools.accumulate(weights)),
+                                               k=scale.projects)
+
+    def uuid(self) -> str:
+        return str(UUID(int=self.rng.getrandbits(128), version=4))
+
+    def created_at(self) -> datetime:
+        return self.scale.reference - timedelta(seconds=self.rng.randrange(3 * 365 * 24 * 3600))
+
+    def deleted_at(self, created_at: datetime) -> datetime | None:
+        if self.rng.random() >= self.scale.deleted_ratio:
+            return None
+        return created_at + (self.scale.reference - created_at) * self.rng.random()
+
+    def count(self, mean: float, population: int) -> int:
+        return mean > 0 and min(population, int(self.rng.expovariate(1 / mean) + 0.5)) or 0
+
+    def common(self, record_id: str) -> dict:
+        created_at = self.created_at()
+        return {"id": record_id, "created_at": created_at, "modified_at": created_at,
+                "deleted_at": self.deleted_at(created_at)}
+
+    def roles(self) -> Iterator[dict]:
+        for role_id, is_platform in ((self.admin_role_id, False), (self.platform_role_id, True)):
+            role = RoleCreate(name=is_platform and "Platform" or "Registry Admin",
+                              is_registry_admin=not is_platform, is_platform=is_platform)
+            yield {"id": role_id, **complete_role_initial_data(role)}
+
+    def platforms(self) -> Iterator[dict]:
+        for i, platform_id in enumerate(self.platform_ids):
+            yield {**self.common(platform_id), "name": f"platform_{i}", "deleted_at": None}
+
+    def access_keys(self) -> Iterator[dict]:
+        """ the current key of every platform, and its expired keys, one per year before the current one """
+        for i, platform_id in enumerate(self.platform_ids):
+            for k in range(self.scale.expired_keys_per_platform + 1):
+                start = self.scale.reference - timedelta(days=365 * k + self.rng.randrange(30))
+                key = base64.urlsafe_b64encode(self.rng.randbytes(33)).decode()
+                yield {"id": self.uuid(), "created_at": start, "modified_at": start,
+                       "deleted_at": k and self.deleted_at(start) or None,
+                       "label": f"Key_{start:%Y%m}_{i}_{k}", "key": key, "key_id": get_key_id(key),
+                       "key_digest": get_key_digest(key), "platform_id": platform_id,
+                       "start_datetime": start, "end_datetime": start + timedelta(days=365)}
+
+    def users(self) -> Iterator[dict]:
+        """ regular users, then the accounts of the platforms """
+        for i, user_id in enumerate(self.user_ids):
+            row = self.common(user_id)
+            expired = self.rng.random() < self.scale.expired_ratio
+            yield {**row, "username": f"user_{i}", "firstname": f"First{i}", "lastname": f"LAST{i}",
+                   "email": f"user_{i}@example.org", "hashed_password": None, "role_id": None, "platform_id": None,
+                   "expiration_date": row["created_at"] + timedelta(days=expired and 30 or 5 * 365)}
+        for i, platform_id in enumerate(self.platform_ids):
+            yield {**self.common(self.uuid()), "deleted_at": None, "username": f"platform_{i}",
+                   "firstname": None, "lastname": None, "email": None, "hashed_password": None,
+                   "role_id": self.platform_role_id, "platform_id": platform_id,
+                   "expiration_date": self.scale.reference + timedelta(days=5 * 365)}
+
+    def entity_types(self) -> Iterator[dict]:
+        for i, entity_type_id in enumerate(self.entity_type_ids):
+            yield {**self.common(entity_type_id), "name": f"entity_type_{i}", "deleted_at": None}
+
+    def entities(self) -> Iterator[dict]:
+        for i, entity_id in enumerate(self.entity_ids):
+            yield {**self.common(entity_id), "name": f"entity_{i}",
+                   "entity_type_id": self.entity_type_ids and self.rng.choice(self.entity_type_ids) or None}
+
+    def frameworks(self) -> Iterator[dict]:
+        for i, framework_id in enumerate(self.framework_ids):
+            yield {**self.common(framework_id), "name": f"framework_{i}", "deleted_at": None,
+                   "description_url": f"https://frameworks.example.org/{i}"}
+
+    def projects(self) -> Iterator[dict]:
+        for i, (project_id, owner) in enumerate(zip(self.project_ids, self.project_owners)):
+            row = self.common(project_id)
+            start = row["created_at"].date()
+            expired = self.rng.random() < self.scale.expired_ratio
+            end = expired and start + timedelta(days=30) or start + timedelta(days=365 * self.rng.randint(3, 6))
+            yield {**row, "code": f"P{i:07d}", "name": f"project_{i}", "description": f"Synthetic project {i}",
+                   "start_date": start, "end_date": end, "owner_platform_id": owner}
+
+    def shares(self) -> Iterator[dict]:
+        for project_id, owner in zip(self.project_ids, self.project_owners):
+            n = self.count(self.scale.shares, len(self.platform_ids) - 1)
+            recipients = [p for p in self.rng.sample(self.platform_ids, min(n + 1, len(self.platform_ids))) if p != owner]
+            for recipient in recipients[:n]:
+                yield {**self.common(self.uuid()), "deleted_at": None, "project_id": project_id,
+                       "platform_id": recipient, "readonly": self.rng.random() < 0.8}
+
+    def project_rels(self, column: str, ids: list[str], mean: float) -> Iterator[dict]:
+        for project_id in self.project_ids:
+            for related_id in self.rng.sample(ids, self.count(mean, len(ids))):
+                yield {**self.common(self.uuid()), "deleted_at": None, "project_id": project_id, column: related_id}
+
+    def tables(self) -> Iterator[tuple[type[models.Base], Iterable[dict]]]:
+        """ rows of every table, parents first """
+        yield models.Platform, self.platforms()
+        yield models.AccessKey, self.access_keys()
+        yield models.User, self.users()
+        yield models.EntityType, self.entity_types()
+        yield models.Entity, self.entities()
+        yield models.RegulatoryFramework, self.frameworks()
+        yield models.Project, self.projects()
+        yield models.PlatformsSharedProjectsRel, self.shares()
+        yield models.ProjectUsersRel, self.project_rels("user_id", self.user_ids, self.scale.users_per_project)
+        yield models.ProjectEntitiesRel, self.project_rels("entity_id", self.entity_ids, self.scale.entities_per_project)
+        yield models.ProjectRegulatoryFrameworkRel, self.project_rels("regulatory_framework_id", self.framework_ids,
+                                                                      self.scale.frameworks_per_project)
+
+
+async def _copy_rows(connection: AsyncConnection, table: Table, rows: Iterator[dict]) -> int:
+    """ PostgreSQL `COPY ... FROM STDIN` through psycopg, within the transaction of `connection` """
+    first = next(rows, None)
+    if first is None:
+        return 0
+    columns = list(first)
+    count = 0
+    raw_connection = await connection.get_raw_connection()
+    async with raw_connection.driver_connection.cursor() as cursor:
+        async with cursor.copy(f'COPY "{table.name}" ({", ".join(columns)}) FROM STDIN') as copy:
+            for row in itertools.chain([first], rows):
+                await copy.write_row([row[c] for c in columns])
+                count += 1
+    return count
+
+
+async def bulk_insert(connection: AsyncConnection, table: Table, rows: Iterable[dict]) -> int:
+    """ inserts `rows`, dicts having the same keys, with COPY on PostgreSQL, by batches of multi-row INSERTs otherwise """
+    rows = iter(rows)
+    if connection.dialect.name == "postgresql" and connection.dialect.driver == "psycopg":
+        return await _copy_rows(connection, table, rows)
+    count = 0
+    while batch := list(itertools.islice(rows, INSERT_BATCH_SIZE)):
+        await connection.execute(insert(table), batch)
+        count += len(batch)
+    return count
+
+
+async def generate(connection: AsyncConnection, scale: RegistryScale) -> dict[str, int]:
+    """ loads a synthetic registry into an empty database, returns the number of rows inserted in every table.
+        Roles are reused if they exist, e.g: created by `initial_data.py`.
+        Platform accounts are `platform_<n>`, the first platforms owning the most projects.
+    """
+    if await connection.scalar(select(func.count()).select_from(models.Project)):
+        raise ValueError("The registry already has projects: synthetic data is only loaded into an empty registry")
+    admin_role_id = await connection.scalar(select(models.Role.id).filter(models.Role.is_registry_admin))
+    platform_role_id = await connection.scalar(select(models.Role.id).filter(models.Role.is_platform))
+    registry = SyntheticRegistry(scale, admin_role_id=admin_role_id or str(uuid5(NAMESPACE_URL, "role/registry-admin")),
+                                 platform_role_id=platform_role_id or str(uuid5(NAMESPACE_URL, "role/platform")))
+    counts = {}
+    missing_roles = [role for role in registry.roles() if role["id"] not in (admin_role_id, platform_role_id)]
+    if missing_roles:
+        counts[models.Role.__tablename__] = await bulk_insert(connection, models.Role.__table__, missing_roles)
+    for model, rows in registry.tables():
+        counts[model.__tablename__] = await bulk_insert(connection, model.__table__, rows)
+    return counts
+
@@ -8,7 +8,7 @@ from starlette.testclient import TestClient
 
 from platform_registry.services import access_keys
 from platform_registry.models import User, AccessKey, Platform
-from platform_registry.tests.utils import create_access_key, setup_new_platform
+from platform_registry.tests.utils import create_access_key, setup_new_platform, run_service, random_lower_string
 
 
 @pytest.fixture(scope='function')
@@ -17,7 +17,7 @@ def sample_keys(db: Session) -> List[AccessKey]:
     keys = []
     for i in range(n):
         platform = setup_new_platform(db=db, name=f"Platform_with_key_{i}")
-        key = access_keys.get_platform_current_valid_key(db=db, platform_id=platform.id)
+        key = run_service(db, access_keys.get_platform_current_valid_key, platform_id=platform.id)
         keys.append(key)
     yield keys
     for k in keys:
@@ -28,7 +28,7 @@ def sample_keys(db: Session) -> List[AccessKey]:
 
 @pytest.fixture(scope='function')
 def sample_key(db: Session, platform_user: User) -> AccessKey:
-    key = access_keys.get_platform_current_valid_key(db=db, platform_id=platform_user.platform_id)
+    key = run_service(db, access_keys.get_platform_current_valid_key, platform_id=platform_user.platform_id)
     yield key
 
 
@@ -85,7 +85,7 @@ class TestAccessKeys:
                                                      sample_platform: Platform,
                                                      db: Session):
         # delete existing key for platform
-        key = access_keys.get_platform_current_valid_key(db=db, platform_id=sample_platform.id)
+        key = run_service(db, access_keys.get_platform_current_valid_key, platform_id=sample_platform.id)
         db.delete(key)
         db.commit()
 
@@ -100,7 +100,7 @@ class TestAccessKeys:
         assert "key" in content
         assert "start_datetime" in content
         assert "end_datetime" in content
-        key = access_keys.get_access_key_by_id(db=db, key_id=content["id"])
+        key = run_service(db, access_keys.get_access_key_by_id, key_id=content["id"])
         assert key is not None
 
     def test_failure_create_access_keys_as_platform_user(self,
@@ -158,3 +158,81 @@ class TestAccessKeys:
         assert datetime.strptime(content["end_datetime"], "%m/%d/%Y, %H:%M:%S") <= datetime.now()
         db.refresh(sample_key)
         assert sample_key.deleted_at is not None
+
+    def test_archived_access_keys_are_hidden(self,
+                                             client: TestClient,
+                                             admin_user_auth_headers: dict,
+                                             db: Session):
+        platform = setup_new_platform(db=db, name=random_lower_string(l=15))
+        archived = run_service(db, access_keys.get_platform_current_valid_key, platform_id=platform.id)
+        client.patch(url=f"/platforms/access-keys/{archived.id}/archive/", json={}, headers=admin_user_auth_headers)
+        listed_ids = [k["id"] for k in client.get(url="/platforms/access-keys/", headers=admin_user_auth_headers).json()]
+        assert archived.id not in listed_ids
+        response = client.get(url=f"/platforms/access-keys/{archived.id}", headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        # audit views opt out of the soft-delete filter
+        response = client.get(url="/platforms/access-keys/", params={"archived": True}, headers=admin_user_auth_headers)
+        assert archived.id in [k["id"] for k in response.json()]
+        response = client.get(url=f"/platforms/access-keys/{archived.id}", params={"archived": True},
+                              headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        db.delete(archived)
+        db.delete(platform)
+        db.commit()
+
+
+class TestAccessKeyAuthentication:
+
+    def test_platform_login_with_access_key(self,
+                                            client: TestClient,
+                                            db: Session,
+                                            sample_platform: Platform):
+        key = run_service(db, access_keys.get_platform_current_valid_key, platform_id=sample_platform.id)
+        assert key.key_id == key.key[:access_keys.KEY_ID_LENGTH]
+        assert key.key_digest == access_keys.get_key_digest(key.key)
+        response = client.post(url="/auth/login",
+                               data={"username": sample_platform.user_account[0].username, "password": key.key},
+                               headers={'Content-Type': "application/x-www-form-urlencoded"})
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_platform_login_with_archived_access_key(self,
+                                                     client: TestClient,
+                                                     db: Session,
+                                                     sample_platform: Platform):
+        key = run_service(db, access_keys.get_platform_current_valid_key, platform_id=sample_platform.id)
+        key.end_datetime = datetime.now()
+        db.commit()
+        response = client.post(url="/auth/login",
+                               data={"username": sample_platform.user_account[0].username, "password": key.key},
+                               headers={'Content-Type': "application/x-www-form-urlencoded"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        key.end_datetime = datetime.now() + timedelta(days=1)
+        db.commit()
+
+    def test_success_api_key_header(self,
+                                    client: TestClient,
+                                    db: Session,
+                                    sample_platform: Platform):
+        key = run_service(db, access_keys.get_platform_current_valid_key, platform_id=sample_platform.id)
+        for _ in range(2):
+            response = client.get(url="/platforms/access-keys/my-keys", headers={"X-API-Key": key.key})
+            assert response.status_code == status.HTTP_200_OK
+            assert [k["id"] for k in response.json()] == [key.id]
+
+    def test_failure_api_key_header(self,
+                                    client: TestClient):
+        response = client.get(url="/platforms/access-keys/my-keys", headers={"X-API-Key": "not-a-key"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_legacy_access_key_gets_digest_on_first_use(self,
+                                                        client: TestClient,
+                                                        db: Session,
+                                                        sample_platform: Platform):
+        key = run_service(db, access_keys.get_platform_current_valid_key, platform_id=sample_platform.id)
+        key.key_id = None
+        key.key_digest = None
+        db.commit()
+        response = client.get(url="/platforms/access-keys/my-keys", headers={"X-API-Key": key.key})
+        assert response.status_code == status.HTTP_200_OK
+        db.refresh(key)
+        assert key.key_digest == access_keys.get_key_digest(key.key)
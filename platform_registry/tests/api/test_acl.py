@@ -0,0 +1,118 @@
+import pytest
+from fastapi.testclient import TestClient
+from fastapi import status
+from sqlalchemy.orm import Session
+
+from platform_registry.core.acl import Permission, ProjectsACL
+from platform_registry.models import User, Project, Platform, PlatformsSharedProjectsRel
+from platform_registry.services import access_keys
+from platform_registry.tests.utils import create_project, setup_new_platform, random_lower_string, run_service
+
+
+def login_headers(client: TestClient, db: Session, platform: Platform) -> dict:
+    key = run_service(db, access_keys.get_platform_current_valid_key, platform_id=platform.id)
+    response = client.post(url="/auth/login",
+                           data={"username": platform.user_account[0].username, "password": key.key},
+                           headers={"Content-Type": "application/x-www-form-urlencoded"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(scope='function')
+def recipient_platform(db: Session) -> Platform:
+    p = setup_new_platform(db=db, name=random_lower_string(l=15))
+    yield p
+    db.query(PlatformsSharedProjectsRel).filter(PlatformsSharedProjectsRel.platform_id == p.id).delete()
+    key = run_service(db, access_keys.get_platform_current_valid_key, platform_id=p.id)
+    db.delete(key)
+    db.delete(p)
+    db.commit()
+
+
+@pytest.fixture(scope='function')
+def owned_project(db: Session, platform_user: User) -> Project:
+    project = create_project(db=db, platform_id=platform_user.platform_id)
+    yield project
+    db.delete(project)
+    db.commit()
+
+
+def share(client: TestClient, headers: dict, project: Project, platform: Platform, readonly: bool):
+    response = client.post(url=f"/projects/{project.id}/share",
+                           json={"recipient_platform_ids": [{"platform_id": platform.id, "readonly": readonly}]},
+                           headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+
+def permissions(client: TestClient, headers: dict, *projects: Project) -> dict:
+    response = client.post(url="/projects/permissions",
+                           json={"project_ids": [p.id for p in projects]},
+                           headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    return {p["project_id"]: p for p in response.json()}
+
+
+class TestProjectsACL:
+
+    def test_owner_has_all_permissions(self,
+                                       client: TestClient,
+                                       platform_user_auth_headers: dict,
+                                       owned_project: Project):
+        granted = permissions(client, platform_user_auth_headers, owned_project)[owned_project.id]
+        assert granted["read"] and granted["edit"] and granted["share"]
+
+    def test_share_is_visible_at_once(self,
+                                      client: TestClient,
+                                      db: Session,
+                                      platform_user_auth_headers: dict,
+                                      owned_project: Project,
+                                      recipient_platform: Platform):
+        recipient_headers = login_headers(client, db, recipient_platform)
+        assert not permissions(client, recipient_headers, owned_project)[owned_project.id]["read"]
+        response = client.get(url=f"/projects/{owned_project.id}", headers=recipient_headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        share(client, platform_user_auth_headers, owned_project, recipient_platform, readonly=True)
+        granted = permissions(client, recipient_headers, owned_project)[owned_project.id]
+        assert granted["read"] and not granted["edit"] and not granted["share"]
+        response = client.get(url=f"/projects/{owned_project.id}", headers=recipient_headers)
+        assert response.status_code == status.HTTP_200_OK
+        response = client.patch(url=f"/projects/{owned_project.id}", json={}, headers=recipient_headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_writable_share_allows_edition(self,
+                                           client: TestClient,
+                                           db: Session,
+                                           platform_user_auth_headers: dict,
+                                           owned_project: Project,
+                                           recipient_platform: Platform):
+        share(client, platform_user_auth_headers, owned_project, recipient_platform, readonly=False)
+        recipient_headers = login_headers(client, db, recipient_platform)
+        response = client.patch(url=f"/projects/{owned_project.id}",
+                                json={"name": f"{owned_project.name}__updated"},
+                                headers=recipient_headers)
+        assert response.status_code == status.HTTP_200_OK
+        response = client.post(url=f"/projects/{owned_project.id}/share",
+                               json={"recipient_platform_ids": []},
+                               headers=recipient_headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_unshare_is_seen_by_other_processes(self,
+                                                client: TestClient,
+                                                db: Session,
+                                                platform_user_auth_headers: dict,
+                                                owned_project: Project,
+                                                recipient_platform: Platform):
+        share(client, platform_user_auth_headers, owned_project, recipient_platform, readonly=False)
+        # the cache of another worker process, filled before the unshare
+        other_process_acl = ProjectsACL(ttl=60, max_size=10)
+        for _ in range(2):
+            assert run_service(db, other_process_acl.check, platform_id=recipient_platform.id,
+                               project_id=owned_project.id, permission=Permission.EDIT)
+        assert other_process_acl.stats()["hits"] == 1
+
+        response = client.post(url="/projects/unshare",
+                               json={"project_ids": [owned_project.id], "platform_ids": [recipient_platform.id]},
+                               headers=platform_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert not run_service(db, other_process_acl.check, platform_id=recipient_platform.id,
+                               project_id=owned_project.id, permission=Permission.READ)
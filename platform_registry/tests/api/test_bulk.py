@@ -0,0 +1,112 @@
+import json
+from datetime import datetime
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+from fastapi import status
+from sqlalchemy.orm import Session
+
+from platform_registry.models import Entity, User, RegulatoryFramework
+from platform_registry.tests.utils import create_random_entity_type, random_lower_string, random_email
+
+
+def statuses(response) -> list[str]:
+    assert response.status_code == status.HTTP_200_OK
+    return [r["status"] for r in sorted(response.json(), key=lambda r: r["index"])]
+
+
+class TestBulkCreate:
+
+    def test_bulk_create_entities(self,
+                                  client: TestClient,
+                                  admin_user_auth_headers: dict,
+                                  db: Session):
+        entity_type = create_random_entity_type(name=random_lower_string(l=10), db=db)
+        names = [random_lower_string(l=10) for _ in range(3)]
+        items = [{"name": names[0], "entity_type_id": entity_type.id},
+                 {"name": names[1], "entity_type_id": entity_type.id},
+                 {"name": names[0], "entity_type_id": entity_type.id},
+                 {"name": names[2]},
+                 {"name": names[2], "entity_type_id": str(uuid4())}]
+        response = client.post(url="/entities/bulk", json=items, headers=admin_user_auth_headers)
+        assert statuses(response) == ["created", "created", "duplicate", "invalid", "invalid"]
+        created = db.query(Entity).filter(Entity.name.in_(names)).all()
+        assert sorted(e.name for e in created) == sorted(names[:2])
+        assert {e.id for e in created} == {r["id"] for r in response.json() if r["status"] == "created"}
+
+        response = client.post(url="/entities/bulk", json=items[:1], headers=admin_user_auth_headers)
+        assert statuses(response) == ["duplicate"]
+
+        for e in created:
+            db.delete(e)
+        db.delete(entity_type)
+        db.commit()
+
+    def test_bulk_create_archived_entity(self,
+                                         client: TestClient,
+                                         admin_user_auth_headers: dict,
+                                         db: Session):
+        entity_type = create_random_entity_type(name=random_lower_string(l=10), db=db)
+        archived = Entity(name=random_lower_string(l=10), entity_type_id=entity_type.id, deleted_at=datetime.now())
+        db.add(archived)
+        db.commit()
+        items = [{"name": archived.name, "entity_type_id": entity_type.id}]
+        response = client.post(url="/entities/bulk", json=items, headers=admin_user_auth_headers)
+        assert statuses(response) == ["archived"]
+        db.delete(archived)
+        db.delete(entity_type)
+        db.commit()
+
+    def test_bulk_create_users_from_ndjson(self,
+                                           client: TestClient,
+                                           platform_user_auth_headers: dict,
+                                           db: Session):
+        usernames = [random_lower_string(l=8) for _ in range(2)]
+        lines = [json.dumps({"username": usernames[0], "firstname": "a", "lastname": "b", "email": random_email()}),
+                 "{not json",
+                 json.dumps({"username": usernames[1], "firstname": "a", "lastname": "b", "email": random_email()}),
+                 json.dumps({"username": usernames[1], "firstname": "c", "lastname": "d", "email": random_email()}),
+                 json.dumps({"username": random_lower_string(l=8), "firstname": "a", "lastname": "b", "email": "not-an-email"})]
+        response = client.post(url="/users/regular/bulk", content="\n".join(lines),
+                               headers={**platform_user_auth_headers, "Content-Type": "application/x-ndjson"})
+        results = sorted(response.json(), key=lambda r: r["index"])
+        assert statuses(response) == ["created", "invalid", "created", "duplicate", "invalid"]
+        assert any("email" in error for error in results[4]["errors"])
+        created = db.query(User).filter(User.username.in_(usernames)).all()
+        assert len(created) == 2
+
+        for u in created:
+            db.delete(u)
+        db.commit()
+
+    def test_bulk_create_regulatory_frameworks(self,
+                                               client: TestClient,
+                                               admin_user_auth_headers: dict,
+                                               db: Session):
+        name = random_lower_string(l=10)
+        items = [{"name": name, "description_url": "www.framework.org"},
+                 {"name": name, "description_url": "www.other-framework.org"},
+                 {"name": random_lower_string(l=10)}]
+        response = client.post(url="/projects/frameworks/bulk", json=items, headers=admin_user_auth_headers)
+        assert statuses(response) == ["created", "duplicate", "invalid"]
+        response = client.post(url="/projects/frameworks/bulk", json=items[:1], headers=admin_user_auth_headers)
+        assert statuses(response) == ["duplicate"]
+        db.query(RegulatoryFramework).filter(RegulatoryFramework.name == name).delete()
+        db.commit()
+
+    def test_bulk_body_must_be_an_array(self,
+                                        client: TestClient,
+                                        admin_user_auth_headers: dict):
+        response = client.post(url="/entities/bulk", json={"name": "entity"}, headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_bulk_bodies_are_documented(self, client: TestClient):
+        openapi = client.get(url="/openapi.json").json()
+        for path, item_schema in (("/users/regular/bulk", "RegularUserCreate"),
+                                  ("/entities/bulk", "EntityCreate"),
+                                  ("/projects/frameworks/bulk", "RegulatoryFrameworkCreate")):
+            content = openapi["paths"][path]["post"]["requestBody"]["content"]
+            assert set(content) == {"application/json", "application/x-ndjson"}
+            for media_type in content.values():
+                assert media_type["schema"]["items"]["$ref"] == f"#/components/schemas/{item_schema}"
+            assert item_schema in openapi["components"]["schemas"]
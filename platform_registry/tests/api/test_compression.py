@@ -0,0 +1,108 @@
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI, status
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from platform_registry.core import compression
+from platform_registry.core.compression import CompressionMiddleware, negotiate
+from platform_registry.tests.utils import count_queries
+
+LARGE_BODY = json.dumps([{"name": f"project_{i}"} for i in range(200)]).encode()
+
+
+@pytest.fixture(scope="module")
+def compressed_app() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/large")
+    async def large():
+        return Response(content=LARGE_BODY, media_type="application/json", headers={"ETag": '"abc"'})
+
+    @app.get("/small")
+    async def small():
+        return Response(content=b"[]", media_type="application/json")
+
+    @app.get("/image")
+    async def image():
+        return Response(content=LARGE_BODY, media_type="image/png")
+
+    @app.get("/stream")
+    async def stream():
+        async def lines():
+            for i in range(100):
+                yield json.dumps({"line": i}).encode() + b"\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return TestClient(app)
+
+
+def test_negotiate(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert negotiate("gzip, deflate, br") == "gzip"
+    assert negotiate("br") is None
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("*") == "gzip"
+    assert negotiate(None) is None
+
+
+def test_compression_middleware(compressed_app: TestClient):
+    headers = {"Accept-Encoding": "gzip"}
+    response = compressed_app.get("/large", headers=headers)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert int(response.headers["Content-Length"]) < len(LARGE_BODY)
+    assert response.headers["Vary"] == "Accept-Encoding"
+    # the compressed body is not byte for byte the uncompressed one
+    assert response.headers["ETag"] == 'W/"abc"'
+    assert response.content == LARGE_BODY
+
+    response = compressed_app.get("/small", headers=headers)
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert "Content-Encoding" not in compressed_app.get("/image", headers=headers).headers
+    assert "Content-Encoding" not in compressed_app.get("/large", headers={"Accept-Encoding": "identity"}).headers
+
+    response = compressed_app.get("/stream", headers=headers)
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert [json.loads(line)["line"] for line in response.text.splitlines()] == list(range(100))
+
+
+def test_brotli_compression(compressed_app: TestClient):
+    brotli = pytest.importorskip("brotli")
+    with compressed_app.stream("GET", "/large", headers={"Accept-Encoding": "gzip, br"}) as response:
+        assert response.headers["Content-Encoding"] == "br"
+        assert brotli.decompress(b"".join(response.iter_raw())) == LARGE_BODY
+
+
+class TestCompressedCache:
+
+    def test_cached_responses_are_stored_compressed(self,
+                                                    client: TestClient,
+                                                    admin_user_auth_headers: dict,
+                                                    monkeypatch):
+        monkeypatch.setattr(compression, "brotli", None)
+        monkeypatch.setattr(compression.settings, "COMPRESSION_MIN_SIZE", 0)
+        headers = {**admin_user_auth_headers, "Accept-Encoding": "gzip"}
+        expected = client.get(url="/entities/types/", headers=admin_user_auth_headers).json()
+        client.get(url="/entities/types/", headers=headers)
+        with count_queries() as statements:
+            with client.stream("GET", "/entities/types/", headers=headers) as response:
+                body = b"".join(response.iter_raw())
+        # the state of the table only, entity types are not loaded
+        assert len(statements) == 1
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(body)) == expected
+
+    def test_not_modified_with_weak_etag(self,
+                                         client: TestClient,
+                                         admin_user_auth_headers: dict,
+                                         monkeypatch):
+        monkeypatch.setattr(compression.settings, "COMPRESSION_MIN_SIZE", 0)
+        headers = {**admin_user_auth_headers, "Accept-Encoding": "gzip"}
+        etag = client.get(url="/projects/frameworks/", headers=headers).headers["ETag"]
+        assert etag.startswith("W/")
+        response = client.get(url="/projects/frameworks/", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
@@ -0,0 +1,79 @@
+from fastapi.testclient import TestClient
+from fastapi import status
+from sqlalchemy.orm import Session
+
+from platform_registry.core.etag import etag_matches
+from platform_registry.models import RegulatoryFramework, PlatformsSharedProjectsRel, Platform, Project, User
+from platform_registry.tests.utils import count_queries, create_project, random_lower_string
+
+
+def test_etag_matches():
+    etag = '"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('"xyz", W/"abc"', etag)
+    assert etag_matches('*', etag)
+    assert not etag_matches('"xyz"', etag)
+    assert not etag_matches(None, etag)
+
+
+class TestConditionalRequests:
+
+    def test_not_modified_frameworks(self,
+                                     client: TestClient,
+                                     admin_user_auth_headers: dict,
+                                     db: Session):
+        response = client.get(url="/projects/frameworks/", headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        etag = response.headers["ETag"]
+        assert response.headers["Cache-Control"] == "private, max-age=300, must-revalidate"
+
+        response = client.get(url="/projects/frameworks/", headers={**admin_user_auth_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+        # another page is another representation
+        response = client.get(url="/projects/frameworks/?limit=1", headers={**admin_user_auth_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+
+        framework = RegulatoryFramework(name=random_lower_string(l=10), description_url="www.framework.org")
+        db.add(framework)
+        db.commit()
+        response = client.get(url="/projects/frameworks/", headers={**admin_user_auth_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+        db.delete(framework)
+        db.commit()
+
+    def test_not_modified_projects_loads_nothing(self,
+                                                 client: TestClient,
+                                                 platform_user_auth_headers: dict,
+                                                 platform_user: User,
+                                                 db: Session):
+        platform = Platform(name=random_lower_string(l=10))
+        db.add(platform)
+        db.commit()
+        project = create_project(db=db, platform_id=platform.id)
+        response = client.get(url="/projects/", headers=platform_user_auth_headers)
+        etag = response.headers["ETag"]
+        assert response.headers["Cache-Control"] == "private, no-cache"
+
+        with count_queries() as statements:
+            response = client.get(url="/projects/", headers={**platform_user_auth_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        # the tables state only: neither projects nor their relationships are loaded
+        assert len(statements) == 1
+
+        # a project shared with the platform becomes visible
+        share = PlatformsSharedProjectsRel(project_id=project.id, platform_id=platform_user.platform_id)
+        db.add(share)
+        db.commit()
+        response = client.get(url="/projects/", headers={**platform_user_auth_headers, "If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert project.id in [p["id"] for p in response.json()]
+
+        db.delete(share)
+        db.delete(db.get(Project, project.id))
+        db.delete(platform)
+        db.commit()
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from fastapi import status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from platform_registry.core import pool
+from platform_registry.core.pool import MonitoredQueuePool, PoolMonitor
+from platform_registry.tests.database import SQLALCHEMY_DATABASE_FILE
+
+
+class TestDatabasePool:
+
+    def test_pool_stats(self,
+                        client: TestClient,
+                        admin_user_auth_headers: dict):
+        response = client.get(url="/monitoring/db-pool", headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["checkout_wait_seconds"]["count"] >= 0
+
+    def test_pool_events_are_counted(self, monkeypatch: pytest.MonkeyPatch):
+        monitor = PoolMonitor()
+        monkeypatch.setattr(pool, "pool_monitor", monitor)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{SQLALCHEMY_DATABASE_FILE}",
+                                     poolclass=MonitoredQueuePool, pool_size=2, max_overflow=0)
+        monitor.attach(engine)
+
+        async def query_twice():
+            for _ in range(2):
+                async with engine.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+            stats = monitor.stats()
+            await engine.dispose()
+            return stats
+
+        stats = asyncio.run(query_twice())
+        assert stats["connections"] == 1
+        assert stats["checkouts"] == 2
+        assert stats["checked_out"] == 0
+        assert stats["checked_in"] == 1
+        assert stats["pool_size"] == 2
+        assert stats["checkout_wait_seconds"]["count"] == 2
+        assert stats["checkout_duration_seconds"]["count"] == 2
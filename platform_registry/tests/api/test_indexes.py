@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from sqlalchemy import select, inspect
+from sqlalchemy.orm import Session
+
+from platform_registry.core.soft_delete import live_records
+from platform_registry.models import AccessKey, User, Project
+from platform_registry.services.projects import visible_to_platform
+from platform_registry.tests.database import engine
+
+
+def query_plan(db: Session, query) -> str:
+    """ plan of `query` as run by the API, i.e: restricted to records not soft-deleted """
+    compiled = live_records(query).compile(engine, compile_kwargs={"literal_binds": True})
+    return "\n".join(row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}"))
+
+
+def test_no_duplicate_primary_key_indexes():
+    inspector = inspect(engine)
+    for table in inspector.get_table_names():
+        assert [i["name"] for i in inspector.get_indexes(table) if i["column_names"] == ["id"]] == []
+
+
+def test_hot_queries_use_indexes(db: Session):
+    now = datetime.now()
+    assert "USING INDEX ix_access_key_live_platform_id_validity" in query_plan(
+        db, select(AccessKey).filter(AccessKey.platform_id == "p", AccessKey.start_datetime <= now, AccessKey.end_datetime > now))
+    plan = query_plan(db, select(User).filter(User.role_id == None).order_by(User.created_at, User.id).limit(51))  # noqa: E711
+    assert "USING INDEX ix_user_live_regular_created_at_id" in plan
+    assert "TEMP B-TREE" not in plan
+    assert "USING INDEX ix_platforms_shared_projects_rel_live_platform_id_project_id" in query_plan(
+        db, select(Project.id).filter(visible_to_platform("p")))
@@ -0,0 +1,82 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from platform_registry.core import prometheus
+from platform_registry.core.config import settings
+from platform_registry.main import app
+from platform_registry.models import User
+from platform_registry.tests.utils import random_lower_string
+
+
+def sample(text: str, line_start: str) -> float:
+    values = [float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if line.startswith(line_start)]
+    assert values, f"no sample {line_start}"
+    return values[0]
+
+
+@pytest.fixture
+def metrics_client(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> TestClient:
+    """ the app as started with `METRICS_ENABLED=true`, which installs the middleware on import """
+    monkeypatch.setattr(settings, "METRICS_ENABLED", True)
+    return TestClient(prometheus.MetricsMiddleware(app))
+
+
+class TestMetrics:
+
+    def test_metrics_disabled_by_default(self, client: TestClient):
+        assert client.get(url="/metrics").status_code == status.HTTP_404_NOT_FOUND
+
+    def test_metrics_exposition(self,
+                                metrics_client: TestClient,
+                                admin_user_auth_headers: dict,
+                                platform_user_auth_headers: dict,
+                                platform_user: User,
+                                db: Session):
+        metrics_client.get(url=f"/projects/{random_lower_string()}", headers=admin_user_auth_headers)
+        metrics_client.get(url="/projects/", headers=platform_user_auth_headers)
+        response = metrics_client.get(url="/metrics")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        text = response.text
+        # labeled by route template, not by path
+        assert sample(text, 'registry_http_request_duration_seconds_count{method="GET",route="/projects/{project_id}",'
+                            'status="404"}') >= 1
+        assert sample(text, 'registry_http_request_duration_seconds_bucket{method="GET",route="/projects/",'
+                            'status="200",le="+Inf"}') >= 1
+        assert sample(text, f'registry_platform_requests_total{{platform="{platform_user.platform.name}"}}') >= 1
+        assert sample(text, 'registry_login_duration_seconds_count{outcome="success"}') >= 1
+        assert sample(text, "registry_db_query_duration_seconds_count") > 0
+        assert 0 <= sample(text, 'registry_cache_hit_ratio{cache="principals"}') <= 1
+        assert "# TYPE registry_db_pool_connections gauge" in text
+
+    def test_multiprocess_aggregation(self,
+                                      metrics_client: TestClient,
+                                      monkeypatch: pytest.MonkeyPatch,
+                                      tmp_path: Path):
+        monkeypatch.setattr(settings, "METRICS_MULTIPROCESS_DIR", str(tmp_path))
+        # an exited worker process: its counters still count, its gauges do not
+        exited = [prometheus.MetricFamily("registry_password_hashing_rejected_total", prometheus.COUNTER, "").add(5),
+                  prometheus.MetricFamily("registry_password_hashing_pending", prometheus.GAUGE, "").add(7)]
+        (tmp_path / f"{2 ** 22 + 1}.json").write_text(json.dumps({"alive": True,
+                                                                 "families": [f.to_dict() for f in exited]}))
+        text = metrics_client.get(url="/metrics").text
+        assert sample(text, "registry_password_hashing_rejected_total") >= 5
+        assert sample(text, "registry_password_hashing_pending") < 7
+        assert (tmp_path / f"{os.getpid()}.json").exists()
+
+    def test_merge_histograms(self):
+        families = []
+        for value in (0.002, 3):
+            histogram = prometheus.Histogram()
+            histogram.observe(value)
+            families.append(([prometheus.MetricFamily("h", prometheus.HISTOGRAM, "").add(histogram.snapshot())], True))
+        text = prometheus.render(prometheus.merge(families))
+        assert 'h_bucket{le="0.005"} 1' in text
+        assert 'h_bucket{le="+Inf"} 2' in text
+        assert "h_count 2" in text
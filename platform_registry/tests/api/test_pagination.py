@@ -0,0 +1,114 @@
+import base64
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+from fastapi import status
+from sqlalchemy.orm import Session
+
+from platform_registry.core.config import settings
+from platform_registry.models import User
+from platform_registry.tests.utils import create_regular_user, random_email, random_lower_string
+
+
+@pytest.fixture(scope='class')
+def many_users(db: Session) -> List[User]:
+    users = [create_regular_user(db=db) for _ in range(7)]
+    yield users
+    for u in users:
+        db.delete(u)
+    db.commit()
+
+
+class TestPagination:
+
+    def test_pages_cover_all_records_once(self,
+                                          client: TestClient,
+                                          admin_user_auth_headers: dict,
+                                          many_users: List[User]):
+        response = client.get(url="/users/regular/", headers=admin_user_auth_headers)
+        all_ids = [u["id"] for u in response.json()]
+        assert "X-Next-Cursor" not in response.headers
+
+        paged_ids, params = [], {"limit": 2}
+        while True:
+            response = client.get(url="/users/regular/", params=params, headers=admin_user_auth_headers)
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.json()) <= 2
+            paged_ids.extend(u["id"] for u in response.json())
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["cursor"] = response.headers["X-Next-Cursor"]
+        assert len(paged_ids) == len(set(paged_ids))
+        assert sorted(paged_ids) == sorted(all_ids)
+
+    def test_unpaginated_call_returns_every_record(self,
+                                                   client: TestClient,
+                                                   admin_user_auth_headers: dict,
+                                                   many_users: List[User],
+                                                   monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(settings, "PAGINATION_DEFAULT_LIMIT", 2)
+        response = client.get(url="/users/regular/", headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert {u.id for u in many_users} <= {u["id"] for u in response.json()}
+        assert "X-Next-Cursor" not in response.headers
+
+        # a cursor alone opts in to pages of the default limit
+        first = client.get(url="/users/regular/", params={"limit": 1}, headers=admin_user_auth_headers)
+        response = client.get(url="/users/regular/", params={"cursor": first.headers["X-Next-Cursor"]},
+                              headers=admin_user_auth_headers)
+        assert len(response.json()) == 2
+        assert "X-Next-Cursor" in response.headers
+
+    def test_estimated_total(self,
+                             client: TestClient,
+                             admin_user_auth_headers: dict,
+                             many_users: List[User]):
+        response = client.get(url="/users/regular/", params={"limit": 1, "estimate_total": True},
+                              headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) == 1
+        assert int(response.headers["X-Estimated-Total"]) >= len(many_users)
+
+    def test_invalid_cursor(self,
+                            client: TestClient,
+                            admin_user_auth_headers: dict):
+        response = client.get(url="/projects/", params={"cursor": "not-a-cursor"}, headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.parametrize("position", [{"id": 5}, {"id": "x"}, {"id": str(uuid.uuid4()), "created_at": "yesterday"}, [1]])
+    def test_crafted_cursor(self,
+                            client: TestClient,
+                            admin_user_auth_headers: dict,
+                            position):
+        cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+        response = client.get(url="/users/regular/", params={"cursor": cursor}, headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_cursor_of_deleted_record(self,
+                                      client: TestClient,
+                                      admin_user_auth_headers: dict,
+                                      db: Session):
+        # created before any other user, so that they make up the first pages
+        oldest = datetime(2000, 1, 1, 12, 0, 0, 1)
+        users = [User(username=random_lower_string(l=5), firstname=random_lower_string(l=10),
+                      lastname=random_lower_string(l=10), email=random_email(), created_at=oldest + timedelta(seconds=i))
+                 for i in range(3)]
+        db.add_all(users)
+        db.commit()
+        try:
+            response = client.get(url="/users/regular/", params={"limit": 2}, headers=admin_user_auth_headers)
+            assert [u["id"] for u in response.json()] == [users[0].id, users[1].id]
+            db.delete(users.pop(1))
+            db.commit()
+            response = client.get(url="/users/regular/", params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]},
+                                  headers=admin_user_auth_headers)
+            assert response.status_code == status.HTTP_200_OK
+            assert response.json()[0]["id"] == users[1].id
+        finally:
+            for user in users:
+                db.delete(user)
+            db.commit()
@@ -0,0 +1,33 @@
+import pytest
+from fastapi.testclient import TestClient
+from fastapi import status
+
+from platform_registry.core.security import password_hashing_pool
+from platform_registry.services.users import ADMIN_PASSWORD
+
+
+class TestPasswordHashing:
+
+    def test_login_is_timed(self,
+                            client: TestClient,
+                            admin_user_auth_headers: dict):
+        response = client.get(url="/monitoring/password-hashing", headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        stats = response.json()
+        assert stats["hash_seconds"]["count"] >= 1
+        assert stats["queue_wait_seconds"]["count"] == stats["hash_seconds"]["count"]
+        assert stats["pending"] == 0
+
+    def test_saturated_pool_fails_fast(self,
+                                       client: TestClient,
+                                       admin_user_auth_headers: dict,
+                                       monkeypatch: pytest.MonkeyPatch):
+        rejected = password_hashing_pool.rejected
+        monkeypatch.setattr(password_hashing_pool, "max_workers", 0)
+        monkeypatch.setattr(password_hashing_pool, "max_queue", 0)
+        response = client.post(url="/auth/login",
+                               data={"username": "admin", "password": ADMIN_PASSWORD},
+                               headers={"Content-Type": "application/x-www-form-urlencoded"})
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "1"
+        assert password_hashing_pool.rejected == rejected + 1
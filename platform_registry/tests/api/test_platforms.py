@@ -8,7 +8,7 @@ from sqlalchemy.orm import Session
 from platform_registry.models import User
 from platform_registry.schemas import Platform
 from platform_registry.services import access_keys
-from platform_registry.tests.utils import setup_new_platform
+from platform_registry.tests.utils import setup_new_platform, run_service
 
 
 @pytest.fixture(scope='class')
@@ -19,7 +19,7 @@ def sample_platforms(db: Session) -> List[Platform]:
         platforms.append(setup_new_platform(db=db, name=f"Platform_{i}"))
     yield platforms
     for p in platforms:
-        key = access_keys.get_platform_current_valid_key(db=db, platform_id=p.id)
+        key = run_service(db, access_keys.get_platform_current_valid_key, platform_id=p.id)
         db.delete(key)
         db.delete(p)
     db.commit()
@@ -0,0 +1,103 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from fastapi import status
+from sqlalchemy.orm import Session
+
+from platform_registry.core.cache import TTLCache
+from platform_registry.core.config import settings
+from platform_registry.core.principals import principal_cache
+from platform_registry.models import Platform, User
+from platform_registry.tests.utils import create_admin_user, random_lower_string
+from platform_registry.services.users import ADMIN_PASSWORD
+
+
+def cache_stats(client: TestClient, headers: dict) -> dict:
+    response = client.get(url="/monitoring/principal-cache", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+class TestPrincipalCache:
+
+    def test_warm_token_hits_cache(self,
+                                   client: TestClient,
+                                   admin_user_auth_headers: dict):
+        before = cache_stats(client, admin_user_auth_headers)
+        after = cache_stats(client, admin_user_auth_headers)
+        assert after["hits"] == before["hits"] + 1
+        assert after["misses"] == before["misses"]
+
+    def test_platform_user_cannot_read_cache_stats(self,
+                                                   client: TestClient,
+                                                   platform_user_auth_headers: dict):
+        response = client.get(url="/monitoring/principal-cache", headers=platform_user_auth_headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_platform_change_invalidates_principal(self,
+                                                   client: TestClient,
+                                                   admin_user_auth_headers: dict,
+                                                   platform_user_auth_headers: dict,
+                                                   platform_user: User):
+        client.get(url="/platforms/", headers=platform_user_auth_headers)
+        response = client.patch(url=f"/platforms/{platform_user.platform_id}",
+                                json={"name": "Renamed platform"},
+                                headers=platform_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        before = cache_stats(client, admin_user_auth_headers)
+        response = client.get(url="/platforms/", headers=platform_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        after = cache_stats(client, admin_user_auth_headers)
+        assert after["misses"] == before["misses"] + 1
+
+    def test_principal_claims_skip_database_on_cold_cache(self,
+                                                          client: TestClient,
+                                                          db: Session,
+                                                          admin_user_auth_headers: dict,
+                                                          monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(settings, "JWT_PRINCIPAL_CLAIMS", True)
+        admin, _ = create_admin_user(db=db)
+        response = client.post(url="/auth/login",
+                               data={"username": admin.username, "password": ADMIN_PASSWORD},
+                               headers={'Content-Type': "application/x-www-form-urlencoded"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        # a fresh worker process: nothing cached, nothing revoked
+        monkeypatch.setattr(principal_cache, "_cache", TTLCache(ttl=60, max_size=10))
+        claims_hits = principal_cache.stats()["claims_hits"]
+        assert cache_stats(client, headers)["claims_hits"] == claims_hits + 1
+
+    def test_principal_read_before_commit_is_invalidated(self,
+                                                         client: TestClient,
+                                                         db: Session,
+                                                         platform_user_auth_headers: dict,
+                                                         platform_user: User,
+                                                         monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(settings, "JWT_PRINCIPAL_CLAIMS", True)
+        platform = db.get(Platform, platform_user.platform_id)
+        former_name = platform.name
+        platform.name = random_lower_string()
+        db.flush()
+        try:
+            # a request served between the flush and the commit reads the former platform
+            principal_cache._cache.invalidate(platform_user.username)
+            assert client.get(url="/platforms/", headers=platform_user_auth_headers).status_code == status.HTTP_200_OK
+            assert principal_cache._cache.get(platform_user.username).platform.name == former_name
+            claims = {"iat": time.time(), "principal": principal_cache._cache.get(platform_user.username).model_dump(mode="json")}
+        finally:
+            db.commit()
+        assert principal_cache._cache.get(platform_user.username) is None
+        # nor are the former claims of a token issued in between accepted
+        assert principal_cache.get(platform_user.username, claims) is None
+
+    def test_rolled_back_change_keeps_principal(self,
+                                                client: TestClient,
+                                                db: Session,
+                                                platform_user_auth_headers: dict,
+                                                platform_user: User):
+        assert client.get(url="/platforms/", headers=platform_user_auth_headers).status_code == status.HTTP_200_OK
+        platform = db.get(Platform, platform_user.platform_id)
+        platform.name = random_lower_string()
+        db.flush()
+        db.rollback()
+        assert principal_cache._cache.get(platform_user.username) is not None
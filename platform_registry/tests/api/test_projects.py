@@ -1,4 +1,8 @@
+import csv
+import io
+import json
 from typing import List
+from uuid import uuid4
 
 import pytest
 from fastapi.testclient import TestClient
@@ -8,16 +12,17 @@ from sqlalchemy.orm import Session
 from platform_registry.services import regulatory_frameworks, access_keys
 from platform_registry.models import User, Project, PlatformsSharedProjectsRel, Platform
 from platform_registry.schemas import RegulatoryFramework, RegulatoryFrameworkCreate, RegularUser, Entity
-from platform_registry.tests.utils import create_project, setup_new_platform, random_lower_string, create_random_entity, create_regular_user
+from platform_registry.tests.utils import create_project, setup_new_platform, random_lower_string, create_random_entity, create_regular_user, \
+    run_service, count_queries
 
 
 @pytest.fixture(scope='class')
 def sample_reg_frameworks(db: Session) -> List[RegulatoryFramework]:
     frameworks = []
     for i in range(5):
-        framework = regulatory_frameworks.create_regulatory_framework(db,
-                                                                      RegulatoryFrameworkCreate(name=f"RegFramework {i}",
-                                                                                                description_url=f"www.regframework{i}.com"))
+        framework = run_service(db, regulatory_frameworks.create_regulatory_framework,
+                                RegulatoryFrameworkCreate(name=f"RegFramework {i}",
+                                                          description_url=f"www.regframework{i}.com"))
         frameworks.append(framework)
 
     yield frameworks
@@ -80,7 +85,7 @@ def shared_project(db: Session, platform_user: User) -> Project:
     yield project
     db.delete(project_share)
     db.delete(project)
-    key = access_keys.get_platform_current_valid_key(db=db, platform_id=new_platform.id)
+    key = run_service(db, access_keys.get_platform_current_valid_key, platform_id=new_platform.id)
     db.delete(key)
     db.delete(new_platform)
     db.commit()
@@ -276,3 +281,127 @@ class TestProjects:
         assert target_project.allowed_platforms != initial_allowed_platforms
         assert recipient_platform in target_project.allowed_platforms
 
+
+class TestProjectsQueries:
+
+    def test_list_projects_query_count_is_fixed(self,
+                                                client: TestClient,
+                                                admin_user_auth_headers: dict,
+                                                platform_user: User,
+                                                sample_projects: List[Project],
+                                                sample_platform: Platform,
+                                                sample_reg_frameworks: List[RegulatoryFramework],
+                                                sample_users: List[RegularUser],
+                                                sample_entities: List[Entity],
+                                                db: Session):
+        # warm up the principal cache, so that authentication issues no query
+        client.get(url="/projects/", headers=admin_user_auth_headers)
+        with count_queries() as statements:
+            response = client.get(url="/projects/", headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        queries_count = len(statements)
+        # tables state for the ETag, projects and their owners, then one query per collection
+        assert queries_count <= 6
+
+        new_projects = [create_project(db=db,
+                                       platform_id=platform_user.platform_id,
+                                       framework_ids=[f.id for f in sample_reg_frameworks],
+                                       user_ids=[u.id for u in sample_users],
+                                       entity_ids=[e.id for e in sample_entities])
+                        for _ in range(10)]
+        shares = [PlatformsSharedProjectsRel(platform_id=sample_platform.id, project_id=p.id) for p in new_projects]
+        db.add_all(shares)
+        db.commit()
+        with count_queries() as statements:
+            response = client.get(url="/projects/", headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) >= len(sample_projects) + len(new_projects)
+        assert len(statements) == queries_count
+
+        for share in shares:
+            db.delete(share)
+        for project in new_projects:
+            db.delete(project)
+        db.commit()
+
+
+class TestBulkSharing:
+
+    def test_share_and_unshare_many_projects(self,
+                                             client: TestClient,
+                                             platform_user_auth_headers: dict,
+                                             platform_user: User,
+                                             sample_platform: Platform,
+                                             shared_project: Project,
+                                             db: Session):
+        owned_projects = [create_project(db=db, platform_id=platform_user.platform_id) for _ in range(2)]
+        unknown_platform_id = str(uuid4())
+        project_ids = [p.id for p in owned_projects] + [shared_project.id]
+        response = client.post(url="/projects/share",
+                               json={"project_ids": project_ids,
+                                     "recipient_platform_ids": [{"platform_id": sample_platform.id},
+                                                                {"platform_id": unknown_platform_id},
+                                                                {"platform_id": platform_user.platform_id}]},
+                               headers=platform_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        statuses = {(r["project_id"], r["platform_id"]): (r["status"], r["readonly"]) for r in response.json()}
+        assert len(statuses) == 9
+        for project in owned_projects:
+            assert statuses[(project.id, sample_platform.id)] == ("shared", True)
+            assert statuses[(project.id, unknown_platform_id)] == ("unknown_platform", None)
+            assert statuses[(project.id, platform_user.platform_id)] == ("owner", None)
+        assert statuses[(shared_project.id, sample_platform.id)] == ("not_allowed", None)
+
+        response = client.post(url="/projects/share",
+                               json={"project_ids": project_ids[:2],
+                                     "recipient_platform_ids": [{"platform_id": sample_platform.id, "readonly": False}]},
+                               headers=platform_user_auth_headers)
+        assert all(r["status"] == "shared" and r["readonly"] is False for r in response.json())
+        db.expire_all()
+        shares = db.query(PlatformsSharedProjectsRel).filter(PlatformsSharedProjectsRel.platform_id == sample_platform.id).all()
+        assert len(shares) == 2
+        assert all(not s.readonly for s in shares)
+
+        response = client.post(url="/projects/unshare",
+                               json={"project_ids": project_ids,
+                                     "platform_ids": [sample_platform.id]},
+                               headers=platform_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        statuses = {r["project_id"]: r["status"] for r in response.json()}
+        assert statuses == {owned_projects[0].id: "unshared",
+                            owned_projects[1].id: "unshared",
+                            shared_project.id: "not_allowed"}
+        assert db.query(PlatformsSharedProjectsRel).filter(PlatformsSharedProjectsRel.platform_id == sample_platform.id).count() == 0
+
+        for project in owned_projects:
+            db.delete(project)
+        db.commit()
+
+
+class TestProjectsExport:
+
+    def test_export_ndjson_has_list_visibility(self,
+                                                client: TestClient,
+                                                platform_user_auth_headers: dict,
+                                                sample_projects: List[Project],
+                                                shared_project: Project):
+        listed = client.get(url="/projects/", params={"limit": 1000}, headers=platform_user_auth_headers).json()
+        response = client.get(url="/projects/export", headers=platform_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        exported = [json.loads(line) for line in response.text.splitlines()]
+        assert sorted(p["id"] for p in exported) == sorted(p["id"] for p in listed)
+        assert shared_project.id in {p["id"] for p in exported}
+        assert exported[0].keys() == listed[0].keys()
+
+    def test_export_csv(self,
+                        client: TestClient,
+                        admin_user_auth_headers: dict,
+                        sample_projects: List[Project]):
+        response = client.get(url="/projects/export", params={"format": "csv"}, headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/csv")
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        exported = {row["id"]: row for row in rows}
+        assert all(p.id in exported for p in sample_projects)
+        assert exported[sample_projects[0].id]["code"] == sample_projects[0].code
@@ -0,0 +1,81 @@
+import pytest
+from fastapi import Depends, FastAPI
+from sqlalchemy import select
+from starlette.testclient import TestClient
+
+from platform_registry.core import query_stats
+from platform_registry.core.query_stats import QueryStatsMiddleware, QueryBudgetExceeded, LazyLoadForbidden
+from platform_registry.models import AccessKey, Role
+from platform_registry.tests.database import TestingAsyncSessionLocal
+
+# budgets of the routes, authentication of a principal not cached yet included
+BUDGETS = [("admin", "/projects/", 8),
+           ("platform", "/projects/", 8),
+           ("admin", "/platforms/", 8),
+           ("platform", "/platforms/recipients", 7),
+           ("admin", "/entities/", 5),
+           ("admin", "/users/regular/", 3),
+           ("admin", "/projects/frameworks/", 4),
+           ("admin", "/platforms/access-keys/", 3)]
+
+
+def strict_app() -> FastAPI:
+    """ routes issuing SQL statements beyond their budget, or lazy loading a relationship """
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware)
+
+    @app.get("/roles", dependencies=[Depends(query_stats.query_budget(1))])
+    async def two_queries():
+        async with TestingAsyncSessionLocal() as db:
+            await db.scalar(select(Role.id))
+            await db.scalar(select(Role.name))
+
+    @app.get("/key-platform")
+    async def lazy_load():
+        async with TestingAsyncSessionLocal() as db:
+            key = await db.scalar(select(AccessKey).limit(1))
+            return await db.run_sync(lambda _: key.platform.name)
+
+    return app
+
+
+class TestQueryStats:
+
+    def test_query_count_headers(self,
+                                 client: TestClient,
+                                 admin_user_auth_headers: dict):
+        response = client.get(url="/projects/", headers=admin_user_auth_headers)
+        assert int(response.headers["X-Query-Count"]) > 0
+        assert response.headers["Server-Timing"].startswith("db;dur=")
+        assert "total;dur=" in response.headers["Server-Timing"]
+
+    @pytest.mark.parametrize("role,path,budget", BUDGETS)
+    def test_endpoints_query_budget(self,
+                                    role: str,
+                                    path: str,
+                                    budget: int,
+                                    client: TestClient,
+                                    admin_user_auth_headers: dict,
+                                    platform_user_auth_headers: dict,
+                                    query_budget):
+        headers = role == "admin" and admin_user_auth_headers or platform_user_auth_headers
+        response = client.get(url=path, headers=headers)
+        assert response.status_code == 200
+        query_budget(response, budget)
+
+    def test_strict_mode_refuses_queries_beyond_budget(self, query_budget):
+        with TestClient(strict_app()) as client:
+            with pytest.raises(QueryBudgetExceeded):
+                client.get("/roles")
+
+    def test_strict_mode_refuses_lazy_loads(self, query_budget, platform_user_auth_headers: dict):
+        with TestClient(strict_app()) as client:
+            with pytest.raises(LazyLoadForbidden):
+                client.get("/key-platform")
+
+    def test_budget_only_logged_out_of_strict_mode(self, caplog):
+        with TestClient(strict_app()) as client:
+            response = client.get("/roles")
+        assert response.status_code == 200
+        assert response.headers["X-Query-Count"] == "2"
+        assert "Query budget of 1 statements exceeded" in caplog.text
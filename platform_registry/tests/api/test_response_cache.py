@@ -0,0 +1,140 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from fastapi import status
+from sqlalchemy.orm import Session
+
+from platform_registry.core.response_cache import CacheBackend, MemoryCacheBackend, RedisCacheBackend, ResponseCache, response_cache, ENTITY_TYPES
+from platform_registry.models import EntityType, Role
+from platform_registry.tests.utils import count_queries, random_lower_string
+
+
+async def serve_redis_protocol(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, store: dict) -> None:
+    """ stand-in for a Redis server, limited to the commands of `RedisCacheBackend` """
+    while line := await reader.readline():
+        args = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        command, *args = args
+        if command == b"GET":
+            value = store.get(args[0])
+            writer.write(value is None and b"$-1\r\n" or b"$%d\r\n%s\r\n" % (len(value), value))
+        elif command == b"SET":
+            store[args[0]] = args[1]
+            writer.write(b"+OK\r\n")
+        elif command == b"MGET":
+            writer.write(b"*%d\r\n" % len(args))
+            for key in args:
+                value = store.get(key)
+                writer.write(value is None and b"$-1\r\n" or b"$%d\r\n%s\r\n" % (len(value), value))
+        elif command == b"INCR":
+            store[args[0]] = b"%d" % (int(store.get(args[0], 0)) + 1)
+            writer.write(b":%s\r\n" % store[args[0]])
+        else:
+            writer.write(b"-ERR unknown command\r\n")
+        await writer.drain()
+    writer.close()
+
+
+def test_memory_backend_limits():
+    async def run():
+        backend = MemoryCacheBackend(max_entries=3, max_bytes=10)
+        for key in "abc":
+            await backend.set(key, b"1234", ttl=60)
+        # least recently used entries are evicted first, down to the bytes limit
+        assert await backend.get("a") is None
+        assert await backend.get("c") == b"1234"
+        await backend.set("d", b"12345678901", ttl=60)
+        assert await backend.get("d") is None
+        assert backend.stats()["bytes"] == 8
+
+    asyncio.run(run())
+
+
+def test_incomplete_backend_is_rejected():
+    class GetOnlyBackend(CacheBackend):
+        async def get(self, key: str):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyBackend()
+
+
+def test_redis_backend():
+    async def run():
+        store = {}
+        server = await asyncio.start_server(lambda r, w: serve_redis_protocol(r, w, store), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        cache = ResponseCache(RedisCacheBackend(url=f"redis://127.0.0.1:{port}/0", timeout=1), ttl=60)
+        key = await cache.versioned_key("roles", tags=["roles"])
+        assert await cache.get(key) is None
+        await cache.set(key, b"[]")
+        assert await cache.get(key) == b"[]"
+        await cache.invalidate("roles")
+        new_key = await cache.versioned_key("roles", tags=["roles"])
+        assert new_key != key and await cache.get(new_key) is None
+        assert (cache.hits, cache.misses, cache.errors) == (1, 2, 0)
+        server.close()
+        await server.wait_closed()
+
+        # an unavailable server disables the cache instead of failing requests
+        cache = ResponseCache(RedisCacheBackend(url=f"redis://127.0.0.1:{port}/0", timeout=1), ttl=60)
+        assert await cache.versioned_key("roles", tags=["roles"]) is None
+        await cache.invalidate("roles")
+        assert cache.errors == 2
+
+    asyncio.run(run())
+
+
+class TestResponseCache:
+
+    def test_cached_entity_types(self,
+                                 client: TestClient,
+                                 admin_user_auth_headers: dict,
+                                 db: Session):
+        client.get(url="/entities/types/", headers=admin_user_auth_headers)
+        with count_queries() as statements:
+            response = client.get(url="/entities/types/", headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        # the state of the table only, entity types are not loaded
+        assert len(statements) == 1
+        cached = response.json()
+
+        name = random_lower_string(l=10)
+        response = client.post(url="/entities/types/", json={"name": name}, headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_201_CREATED
+        response = client.get(url="/entities/types/", headers=admin_user_auth_headers)
+        assert len(response.json()) == len(cached) + 1
+        assert name in [t["name"] for t in response.json()]
+
+        db.delete(db.query(EntityType).filter(EntityType.name == name).one())
+        db.commit()
+        asyncio.run(response_cache.invalidate(ENTITY_TYPES))
+
+    def test_changes_of_other_processes_miss_the_cache(self,
+                                                       client: TestClient,
+                                                       admin_user_auth_headers: dict,
+                                                       db: Session):
+        for url in ("/entities/types/", "/roles/"):
+            client.get(url=url, headers=admin_user_auth_headers)
+        # written by another worker process: the response cache of this one is not invalidated
+        entity_type = EntityType(name=random_lower_string(l=10))
+        db.add(entity_type)
+        db.commit()
+        try:
+            response = client.get(url="/entities/types/", headers=admin_user_auth_headers)
+            assert entity_type.name in [t["name"] for t in response.json()]
+            role = db.query(Role).first()
+            role.manage_roles = not role.manage_roles
+            # not left to `onupdate`: SQLite dates are stored without microseconds
+            role.modified_at = datetime.now() + timedelta(days=1)
+            db.commit()
+            response = client.get(url="/roles/", headers=admin_user_auth_headers)
+            assert {r["id"]: r["manage_roles"] for r in response.json()}[role.id] == role.manage_roles
+        finally:
+            role.manage_roles = not role.manage_roles
+            db.delete(entity_type)
+            db.commit()
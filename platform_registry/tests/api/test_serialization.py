@@ -0,0 +1,83 @@
+import json
+
+from fastapi import APIRouter, FastAPI, Response, status
+from fastapi.testclient import TestClient
+from pydantic import BaseModel, field_serializer
+from sqlalchemy.orm import Session
+
+from platform_registry import schemas
+from platform_registry.core import serialization
+from platform_registry.core.serialization import FastJSONRoute, dump_json, record_serializer, type_adapter
+from platform_registry.models import Project, Platform, PlatformsSharedProjectsRel, User
+from platform_registry.services.platforms import PLATFORM_LOADING_OPTIONS
+from platform_registry.services.projects import PROJECT_LOADING_OPTIONS
+from platform_registry.tests.utils import create_project, create_regular_user, create_random_entity, random_lower_string
+
+
+def validated_json(schema, records) -> bytes:
+    adapter = type_adapter(schema)
+    return adapter.dump_json(adapter.validate_python(records, from_attributes=True))
+
+
+class TestSerialization:
+
+    def test_dump_json_matches_validated_serialization(self,
+                                                       platform_user: User,
+                                                       sample_platform: Platform,
+                                                       db: Session):
+        user = create_regular_user(db=db)
+        entity = create_random_entity(db=db, name=random_lower_string(l=10))
+        project = create_project(db=db, platform_id=platform_user.platform_id, user_ids=[user.id], entity_ids=[entity.id])
+        share = PlatformsSharedProjectsRel(project_id=project.id, platform_id=sample_platform.id)
+        db.add(share)
+        db.commit()
+        db.expire_all()
+
+        projects = db.query(Project).options(*PROJECT_LOADING_OPTIONS).all()
+        assert json.loads(dump_json(list[schemas.ProjectWithDetails], projects)) == \
+               json.loads(validated_json(list[schemas.ProjectWithDetails], projects))
+        platforms = db.query(Platform).options(*PLATFORM_LOADING_OPTIONS).all()
+        assert json.loads(dump_json(list[schemas.Platform], platforms)) == \
+               json.loads(validated_json(list[schemas.Platform], platforms))
+        # anything but ORM records is validated
+        project_out = schemas.ProjectWithDetails.model_validate(projects[0], from_attributes=True)
+        assert json.loads(dump_json(schemas.ProjectWithDetails, project_out)) == \
+               json.loads(validated_json(schemas.ProjectWithDetails, projects[0]))
+
+        db.delete(share)
+        db.delete(db.get(Project, project.id))
+        db.commit()
+
+    def test_serializers_reading_self_are_validated(self, platform_user: User):
+        class Named(BaseModel):
+            username: str
+
+            @field_serializer("username")
+            def serialize_username(self, username: str) -> str:
+                return f"{type(self).__name__}:{username}"
+
+        assert record_serializer(schemas.ProjectWithDetails) is not None
+        assert record_serializer(Named) is None
+        assert json.loads(dump_json(Named, platform_user)) == {"username": f"Named:{platform_user.username}"}
+
+    def test_fast_json_route(self, monkeypatch):
+        monkeypatch.setattr(serialization.settings, "FAST_JSON_RESPONSES", True)
+        router = APIRouter(route_class=FastJSONRoute)
+
+        @router.post(path="/platforms", response_model=schemas.PlatformBase, status_code=status.HTTP_201_CREATED)
+        async def create_platform(response: Response):
+            response.headers["X-Custom"] = "1"
+            return Platform(name="platform")
+
+        @router.get(path="/platforms", response_model=list[schemas.PlatformBase])
+        async def get_platforms():
+            return [Platform(name="platform")]
+
+        app = FastAPI()
+        app.include_router(router)
+        client = TestClient(app)
+        response = client.post(url="/platforms")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.headers["X-Custom"] == "1"
+        assert response.json() == {"name": "platform"}
+        assert client.get(url="/platforms").json() == [{"name": "platform"}]
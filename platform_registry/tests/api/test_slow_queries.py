@@ -0,0 +1,83 @@
+import asyncio
+import json
+import logging
+from pathlib import Path
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from platform_registry.core.config import settings
+from platform_registry.core.slow_queries import SlowQueryLog, fingerprint, normalize, parameter_shapes, slow_query_log
+from platform_registry.tests.database import async_engine
+from platform_registry.tests.utils import random_lower_string
+
+
+@pytest.fixture
+def every_query_is_slow(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", 1e-6)
+    monkeypatch.setattr(settings, "SLOW_QUERY_LOG_FILE", str(tmp_path / "slow_queries.log"))
+    yield tmp_path / "slow_queries.log"
+
+
+class TestSlowQueries:
+
+    def test_fingerprints(self):
+        first = normalize("SELECT * FROM project\n WHERE name = 'a' AND id IN (?, ?, ?) LIMIT 10")
+        second = normalize("SELECT * FROM project WHERE name = 'b''c' AND id IN (?) LIMIT 20")
+        assert first == "SELECT * FROM project WHERE name = ? AND id IN (?) LIMIT ?"
+        assert fingerprint(first) == fingerprint(second)
+        assert parameter_shapes(("a", 1, None), executemany=False) == ["str", "int", "NoneType"]
+        assert parameter_shapes([{"id": "a"}, {"id": "b"}], executemany=True) == {"rows": 2, "types": {"id": "str"}}
+
+    def test_slow_queries_of_a_request(self,
+                                       client: TestClient,
+                                       admin_user_auth_headers: dict,
+                                       every_query_is_slow: Path):
+        slow_query_log.attach(async_engine)
+        try:
+            client.get(url=f"/projects/{random_lower_string()}", headers=admin_user_auth_headers)
+        finally:
+            slow_query_log.detach()
+        response = client.get(url="/monitoring/slow-queries", params={"limit": 100}, headers=admin_user_auth_headers)
+        assert response.status_code == status.HTTP_200_OK
+        entry = next(e for e in response.json() if e["service"] == "projects.get_project_by_id")
+        assert entry["route"] == "/projects/{project_id}"
+        assert entry["calls"] >= 1 and entry["max_seconds"] >= entry["mean_seconds"] > 0
+        assert entry["parameters"] and "str" in json.dumps(entry["parameters"])
+        logged = [json.loads(line) for line in every_query_is_slow.read_text().splitlines()]
+        assert any(line["fingerprint"] == entry["fingerprint"] for line in logged)
+        assert len(client.get(url="/monitoring/slow-queries", params={"limit": 1},
+                              headers=admin_user_auth_headers).json()) == 1
+
+    def test_logged_by_the_application_without_file(self, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture):
+        monkeypatch.setattr(settings, "SLOW_QUERY_LOG_FILE", None)
+        with caplog.at_level(logging.WARNING, logger="platform_registry.core.slow_queries"):
+            entry = SlowQueryLog().record("SELECT name FROM project WHERE name = 'a'", (), executemany=False, duration=1)
+        assert json.loads(caplog.records[-1].getMessage())["fingerprint"] == entry["fingerprint"]
+
+    def test_platform_user_cannot_read_slow_queries(self, client: TestClient, platform_user_auth_headers: dict):
+        response = client.get(url="/monitoring/slow-queries", headers=platform_user_auth_headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_explain(self, monkeypatch: pytest.MonkeyPatch, every_query_is_slow: Path):
+        monkeypatch.setattr(settings, "SLOW_QUERY_EXPLAIN", True)
+        log = SlowQueryLog()
+        log.attach(async_engine)
+
+        async def query():
+            async with async_engine.connect() as connection:
+                await connection.execute(text("SELECT name FROM project WHERE name = :name"), {"name": "x"})
+                await connection.execute(text("SELECT name FROM project WHERE name = :name"), {"name": "y"})
+            await log._explain_task
+
+        try:
+            asyncio.run(query())
+        finally:
+            log.detach()
+        # explained once, the EXPLAIN statement itself not being recorded
+        assert log.explains == 1
+        [stats] = log.top(10)
+        assert stats["calls"] == 2 and "project" in stats["plan"]
+        assert any("plan" in json.loads(line) for line in every_query_is_slow.read_text().splitlines())
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import Connection, event, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from platform_registry import initial_data, startup
+from platform_registry.models import Base, Role, SeedVersion, User
+from platform_registry.services.users import ADMIN_USERNAME
+
+
+def migrate(connection: Connection) -> None:
+    """ migrations are written for PostgreSQL: the tables are created from the models instead """
+    Base.metadata.create_all(connection)
+    connection.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)"))
+    connection.execute(text("INSERT INTO alembic_version VALUES (:head)"), {"head": startup.head_revision()})
+    connection.commit()
+
+
+class TestStartup:
+
+    def test_head_revision(self):
+        assert startup.head_revision() == "9b1e4d7a3c25"
+
+    def test_prepare_without_the_application_engine(self):
+        imports = "import sys; import platform_registry.startup; assert 'platform_registry.core.database' not in sys.modules"
+        subprocess.run([sys.executable, "-c", imports], check=True, timeout=60)
+
+    def test_prepare_once(self, monkeypatch: pytest.MonkeyPatch, tmp_path: Path, caplog: pytest.LogCaptureFixture):
+        migrations = []
+        monkeypatch.setattr(startup, "upgrade", lambda connection: migrations.append(migrate(connection)))
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'registry.db'}")
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+        async def prepare_twice():
+            outcomes = [await startup.prepare(engine)]
+            statements.clear()
+            outcomes.append(await startup.prepare(engine))
+            checks = list(statements)
+            async with engine.connect() as connection:
+                roles = (await connection.scalars(select(Role.name))).all()
+                admin = await connection.scalar(select(User.username).filter(User.username == ADMIN_USERNAME))
+                seed_version = await connection.scalar(select(SeedVersion.version))
+            await engine.dispose()
+            return outcomes, checks, roles, admin, seed_version
+
+        with caplog.at_level(logging.INFO, logger=startup.__name__):
+            outcomes, checks, roles, admin, seed_version = asyncio.run(prepare_twice())
+        assert f"Loading initial data version {initial_data.SEED_VERSION} over an unseeded database" in caplog.messages
+        assert outcomes == [startup.PREPARED, startup.CURRENT]
+        assert len(migrations) == 1
+        # an up-to-date database costs a single query
+        assert len(checks) == 1
+        assert sorted(roles) == ["Platform", "Registry Admin"]
+        assert admin == ADMIN_USERNAME
+        assert seed_version == initial_data.SEED_VERSION
+
+    def test_new_seed_version_is_loaded_without_migrating(self, monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'registry.db'}")
+
+        async def prepare_new_seed_version():
+            async with engine.begin() as connection:
+                await connection.run_sync(migrate)
+            monkeypatch.setattr(startup, "upgrade", lambda connection: pytest.fail("database migrated"))
+            first = await startup.prepare(engine)
+            monkeypatch.setattr(startup, "SEED_VERSION", startup.SEED_VERSION + 1)
+            monkeypatch.setattr(initial_data, "SEED_VERSION", startup.SEED_VERSION)
+            outcomes = [first, await startup.prepare(engine), await startup.prepare(engine)]
+            async with engine.connect() as connection:
+                seed_versions = (await connection.scalars(select(SeedVersion.version))).all()
+            await engine.dispose()
+            return outcomes, seed_versions
+
+        outcomes, seed_versions = asyncio.run(prepare_new_seed_version())
+        assert outcomes == [startup.PREPARED, startup.PREPARED, startup.CURRENT]
+        assert seed_versions == [initial_data.SEED_VERSION]
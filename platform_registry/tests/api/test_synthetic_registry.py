@@ -0,0 +1,55 @@
+import asyncio
+import os
+import tempfile
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from platform_registry.models import Base, Project, PlatformsSharedProjectsRel
+from platform_registry.synthetic import RegistryScale, SyntheticRegistry, generate
+
+SCALE = RegistryScale(platforms=20, projects=300, users=100, entities=30, reference=datetime(2024, 1, 1))
+
+
+def all_rows(scale: RegistryScale) -> dict:
+    registry = SyntheticRegistry(scale, admin_role_id="admin", platform_role_id="platform")
+    return {model.__tablename__: list(rows) for model, rows in registry.tables()}
+
+
+def test_same_seed_same_registry():
+    assert all_rows(SCALE) == all_rows(SCALE)
+    assert all_rows(SCALE)["project"] != all_rows(RegistryScale(**{**SCALE.__dict__, "seed": 1}))["project"]
+
+
+def test_shares_and_ownership():
+    rows = all_rows(SCALE)
+    owners = {p["id"]: p["owner_platform_id"] for p in rows["project"]}
+    shares = [(s["project_id"], s["platform_id"]) for s in rows["platforms_shared_projects_rel"]]
+    assert len(shares) == len(set(shares))
+    assert all(owners[project_id] != platform_id for project_id, platform_id in shares)
+    # zipf: the first platform owns the most projects
+    owned = [list(owners.values()).count(p["id"]) for p in rows["platform"]]
+    assert owned[0] == max(owned)
+    assert {u["username"] for u in rows["user"]} >= {f"platform_{i}" for i in range(SCALE.platforms)}
+
+
+def test_generate_into_empty_registry():
+    async def run(url: str) -> tuple:
+        engine = create_async_engine(url)
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+            counts = await generate(connection, SCALE)
+            stored = (await connection.scalar(select(func.count()).select_from(Project)),
+                      await connection.scalar(select(func.count()).select_from(PlatformsSharedProjectsRel)))
+            with pytest.raises(ValueError):
+                await generate(connection, SCALE)
+        await engine.dispose()
+        return counts, stored
+
+    with tempfile.TemporaryDirectory() as directory:
+        counts, stored = asyncio.run(run(f"sqlite+aiosqlite:///{os.path.join(directory, 'synthetic.db')}"))
+    assert counts["role"] == 2
+    assert stored == (counts["project"], counts["platforms_shared_projects_rel"]) == (
+        SCALE.projects, len(all_rows(SCALE)["platforms_shared_projects_rel"]))
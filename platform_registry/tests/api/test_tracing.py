@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from platform_registry.core import tracing
+from platform_registry.core.tracing import Span, SpanExporter, Tracer
+from platform_registry.main import app
+from platform_registry.services import projects
+
+# a fresh test database, in a process of its own: instrumentation is applied once, at startup
+TRACED_REQUESTS = """
+from fastapi import routing
+from fastapi.testclient import TestClient
+from platform_registry.core import serialization
+from platform_registry.tests import conftest
+from platform_registry.tests.database import TestingSessionLocal
+from platform_registry.tests.utils import get_authorization_headers, get_or_create_platform_role, random_lower_string
+
+with TestClient(conftest.app) as client:
+    db = TestingSessionLocal()
+    headers = get_authorization_headers(client=client, db=db, for_admin=True)
+    get_or_create_platform_role(db=db)
+    assert client.get(url="/projects/", headers=headers).status_code == 200
+    assert client.get(url="/entities/", headers=headers).status_code == 200
+    assert client.post(url="/platforms/", json={"name": random_lower_string()}, headers=headers).status_code == 201
+# routes are wrapped one by one, modules are left alone
+assert not hasattr(routing.serialize_response, "__wrapped__") and not hasattr(serialization.dump_json, "__wrapped__")
+"""
+
+
+def test_disabled_tracing_instruments_nothing():
+    assert tracing.tracer is None
+    assert not hasattr(projects.get_projects, "__wrapped__")
+    assert all(m.cls is not tracing.TracingMiddleware for m in app.user_middleware)
+
+
+def test_spans_of_a_request(tmp_path: Path):
+    traces_file = tmp_path / "traces.jsonl"
+    subprocess.run([sys.executable, "-c", TRACED_REQUESTS], check=True, timeout=120,
+                   env={**os.environ, "TRACING_ENABLED": "true", "TRACING_FILE": str(traces_file)})
+    spans = [span for line in traces_file.read_text().splitlines()
+             for span in json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]]
+    root = next(s for s in spans if s["name"] == "GET /projects/")
+    request_spans = [s for s in spans if s["traceId"] == root["traceId"]]
+    names = {s["name"] for s in request_spans}
+    assert {"dependency current_user", "endpoint get_projects", "projects.get_projects", "sql", "serialize"} <= names
+    by_id = {s["spanId"]: s for s in request_spans}
+    assert all(s["parentSpanId"] in by_id for s in request_spans if s is not root)
+    endpoint = next(s for s in request_spans if s["name"] == "endpoint get_projects")
+    assert next(s for s in request_spans if s["name"] == "projects.get_projects")["parentSpanId"] == endpoint["spanId"]
+    # bodies of the cached reference data routes are serialized by `deps.cached_response`
+    cached_root = next(s for s in spans if s["name"] == "GET /entities/")
+    assert any(s["name"] == "serialize" for s in spans if s["traceId"] == cached_root["traceId"])
+    # `create_access_key` is imported by name into `services/platforms`
+    setup = next(s for s in spans if s["name"] == "platforms.setup_platform")
+    assert next(s for s in spans if s["name"] == "access_keys.create_access_key")["parentSpanId"] == setup["spanId"]
+
+
+def test_sampling_and_trace_context(tmp_path: Path):
+    tracer = Tracer(SpanExporter(file=str(tmp_path / "traces.jsonl")), sample_ratio=0)
+    assert tracer.start_trace("GET /") is None
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+    root = tracer.start_trace("GET /", traceparent=f"00-{trace_id}-{parent_id}-01")
+    assert (root.trace_id, root.parent_id) == (trace_id, parent_id)
+    assert tracer.start_trace("GET /", traceparent=f"00-{trace_id}-{parent_id}-00") is None
+    with tracer.activate(root):
+        with tracer.span("child") as child:
+            assert isinstance(child, Span) and child.parent_id == root.span_id
+    assert tracer.start_span("outside") is None
+    tracer.exporter.shutdown()
+    exported = json.loads((tmp_path / "traces.jsonl").read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in exported] == ["GET /", "child"]
@@ -2,37 +2,28 @@ from collections.abc import Generator
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, StaticPool
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.orm import Session
 
 from platform_registry import models
 from platform_registry.core import database
+from platform_registry.core.config import settings
+from platform_registry.core.query_stats import QUERY_COUNT_HEADER
 from platform_registry.main import app
 from platform_registry.models import User, Platform
 from platform_registry.schemas import Role
 from platform_registry.services import access_keys
+from platform_registry.tests.database import engine, TestingSessionLocal, TestingAsyncSessionLocal
 from platform_registry.tests.utils import get_authorization_headers, get_or_create_platform_role, get_main_platform_user, setup_new_platform, \
-    random_lower_string
-
-SQLALCHEMY_DATABASE_URL = "sqlite://"
-engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-    )
-
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    random_lower_string, run_service
 
 models.Base.metadata.create_all(bind=engine)
 
-def db_override():
-    db_session = TestingSessionLocal()
-    try:
+async def db_override():
+    async with TestingAsyncSessionLocal() as db_session:
         yield db_session
-    finally:
-        db_session.close()
 
 app.dependency_overrides[database.get_db] = db_override
+app.dependency_overrides[database.get_session_factory] = lambda: TestingAsyncSessionLocal
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -74,7 +65,21 @@ def platform_user(db: Session) -> User:
 def sample_platform(db: Session) -> Platform:
     p = setup_new_platform(db=db, name=random_lower_string(l=15))
     yield p
-    key = access_keys.get_platform_current_valid_key(db=db, platform_id=p.id)
+    key = run_service(db, access_keys.get_platform_current_valid_key, platform_id=p.id)
     db.delete(key)
     db.delete(p)
     db.commit()
+
+
+@pytest.fixture(scope="function")
+def query_budget(monkeypatch):
+    """ strict mode for the test: requests exceeding the query budget of their route, or lazy loading, fail.
+        Returns a check of the statements count of a response, e.g: `query_budget(response, 6)`
+    """
+    monkeypatch.setattr(settings, "QUERY_STRICT_MODE", True)
+
+    def check(response, budget: int) -> int:
+        count = int(response.headers[QUERY_COUNT_HEADER])
+        assert count <= budget, f"{count} SQL statements for {response.request.url.path}, {budget} expected at most"
+        return count
+    return check
@@ -0,0 +1,21 @@
+import os
+import tempfile
+
+from sqlalchemy import create_engine, NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+# the API runs on an AsyncSession while fixtures and assertions keep using a regular Session:
+# both engines point to the same SQLite file so that they share the data
+SQLALCHEMY_DATABASE_FILE = os.path.join(tempfile.mkdtemp(), "platform_registry.db")
+
+engine = create_engine(f"sqlite:///{SQLALCHEMY_DATABASE_FILE}",
+                       connect_args={"check_same_thread": False})
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{SQLALCHEMY_DATABASE_FILE}",
+                                   poolclass=NullPool)
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine,
+                                              class_=AsyncSession,
+                                              autoflush=False,
+                                              expire_on_commit=False)
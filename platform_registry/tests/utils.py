@@ -1,15 +1,50 @@
+import asyncio
 import random
 import string
+from contextlib import contextmanager
 from datetime import date, timedelta
 from typing import Tuple, List
 
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
+from platform_registry.models import Base
 from platform_registry.schemas import Entity
 from platform_registry.services import users, roles, entities, platforms, access_keys, projects
 from platform_registry import schemas
 from platform_registry.services.users import ADMIN_PASSWORD
+from platform_registry.tests.database import TestingAsyncSessionLocal, async_engine
+
+
+def run_service(db: Session, service, *args, **kwargs):
+    """ runs an async service on its own AsyncSession, and returns resulting records attached to the test Session """
+    async def run():
+        async with TestingAsyncSessionLocal() as async_db:
+            return await service(async_db, *args, **kwargs)
+
+    def attach(record):
+        return isinstance(record, Base) and db.get(type(record), record.id) or record
+
+    result = asyncio.run(run())
+    if isinstance(result, (list, tuple)):
+        return [attach(r) for r in result]
+    return attach(result)
+
+
+@contextmanager
+def count_queries():
+    """ collects the SQL statements issued by the API while in the block """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
 
 
 def random_lower_string(l: int = 32) -> str:
@@ -22,68 +57,68 @@ def random_email() -> str:
 
 
 def get_or_create_admin_role(db: Session) -> schemas.Role:
-    admin_role = roles.get_admin_role(db=db)
+    admin_role = run_service(db, roles.get_admin_role)
     if admin_role:
         return admin_role
     role_in = schemas.RoleCreate(name="Registry Admin",
                                  is_registry_admin=True,
                                  is_platform=False)
-    return roles.create_role(db, role_in)
+    return run_service(db, roles.create_role, role_in)
 
 
 def get_or_create_platform_role(db: Session) -> schemas.Role:
-    platform_role = roles.get_platform_role(db=db)
+    platform_role = run_service(db, roles.get_platform_role)
     if platform_role:
         return platform_role
     role_in = schemas.RoleCreate(name="Platform Role",
                                  is_registry_admin=False,
                                  is_platform=True)
-    return roles.create_role(db, role_in)
+    return run_service(db, roles.create_role, role_in)
 
 
 def setup_new_platform(db: Session, name: str) -> schemas.Platform:
-    return platforms.setup_platform(db=db, platform=schemas.PlatformCreate(name=name))
+    return run_service(db, platforms.setup_platform, platform=schemas.PlatformCreate(name=name))
 
 
 def create_admin_user(db: Session) -> Tuple[schemas.RegularUser, str]:
     admin_role = get_or_create_admin_role(db)
-    user = users.create_admin_user(db=db, role=admin_role)
+    user = run_service(db, users.create_admin_user, role=admin_role)
     return user, ADMIN_PASSWORD
 
 
 def create_regular_user(db: Session) -> schemas.RegularUser:
-    return users.create_user(db=db,
-                             user=schemas.RegularUserCreate(username=random_lower_string(l=5),
-                                                            firstname=random_lower_string(l=10),
-                                                            lastname=random_lower_string(l=10),
-                                                            email=random_email()))
+    return run_service(db, users.create_user,
+                       user=schemas.RegularUserCreate(username=random_lower_string(l=5),
+                                                      firstname=random_lower_string(l=10),
+                                                      lastname=random_lower_string(l=10),
+                                                      email=random_email()))
 
 
 def create_platform_user(db: Session) ->  Tuple[schemas.PlatformUser, str]:
     _ = get_or_create_platform_role(db=db)
     platform = setup_new_platform(db=db, name="Platform")
-    password = access_keys.get_platform_current_valid_key(db=db, platform_id=platform.id).key
+    password = run_service(db, access_keys.get_platform_current_valid_key, platform_id=platform.id).key
     return platform.user_account[0], password
 
 
 def get_main_platform_user(db: Session) -> schemas.SystemUser:
-    return users.get_user_by_username(db=db, username="platform")
+    return run_service(db, users.get_user_by_username, username="platform")
 
 
 def retrieve_all_entity_types(db: Session) -> List[schemas.EntityType]:
-    return entities.get_entity_types(db=db)
+    return run_service(db, entities.get_entity_types)
 
 
 def create_random_entity_type(name: str, db: Session) -> schemas.EntityType:
     type_in = schemas.EntityTypeCreate(name=name)
-    return entities.create_entity_type(db=db, entity_type=type_in)
+    return run_service(db, entities.create_entity_type, entity_type=type_in)
 
 
 def create_random_entity(name: str, db: Session) -> Entity:
     entity_type_name = f"type_{name}"
     entity_type = create_random_entity_type(name=entity_type_name, db=db)
     entity_in = schemas.EntityCreate(name=name, entity_type_id=entity_type.id)
-    return entities.create_entity(db=db, entity=entity_in)
+    return run_service(db, entities.create_entity, entity=entity_in)
 
 
 def get_authorization_headers(client: TestClient, db: Session, for_admin: bool = False) -> dict[str, str]:
@@ -105,7 +140,7 @@ def get_authorization_headers(client: TestClient, db: Session, for_admin: bool =
 
 def create_access_key(db: Session, platform_id: str):
     key = schemas.AccessKeyCreate(platform_id=platform_id)
-    return access_keys.create_access_key(db=db, access_key=key)
+    return run_service(db, access_keys.create_access_key, access_key=key)
 
 
 def create_project(db: Session,
@@ -121,4 +156,4 @@ def create_project(db: Session,
                                        framework_ids=framework_ids,
                                        user_ids=user_ids,
                                        entity_ids=entity_ids)
-    return projects.create_project(db, project_in, platform_id)
+    return run_service(db, projects.create_project, project_in, platform_id)
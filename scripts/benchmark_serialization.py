@@ -0,0 +1,114 @@
+"""
+Microbenchmark of the serialization of a list of projects, as returned by `GET /projects/`.
+
+Builds `--projects` in-memory `Project` records with their relationships, no database involved, then times
+their serialization as `list[schemas.ProjectWithDetails]` with:
+
+* `fastapi`: FastAPI's own path, i.e: response model validation, `dict`s from pydantic, then `json.dumps`
+* `orjson`: the same, with `ORJSONResponse` instead of `JSONResponse`
+* `type_adapter`: validation by the precompiled `TypeAdapter` of the response model, then serialization by pydantic-core
+* `dump_json`: `core.serialization.dump_json`, used by `FastJSONRoute` when `FAST_JSON_RESPONSES` is set:
+  fields of the records are read straight into orjson, without validation
+
+Peak memory allocated during one serialization is measured separately with `tracemalloc`.
+
+    python scripts/benchmark_serialization.py --projects 5000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+from uuid import uuid4
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+from sqlalchemy.orm.attributes import set_committed_value  # noqa: E402
+
+from platform_registry import schemas  # noqa: E402
+from platform_registry.core.serialization import dump_json, type_adapter  # noqa: E402
+from platform_registry.models import Project, Platform, RegulatoryFramework, Entity, User  # noqa: E402
+
+SCHEMA = list[schemas.ProjectWithDetails]
+
+
+def build_projects(n_projects: int) -> list[Project]:
+    now = datetime.now()
+    platforms = [Platform(id=str(uuid4()), name=f"platform_{i}") for i in range(20)]
+    frameworks = [RegulatoryFramework(id=str(uuid4()), name=f"framework_{i}", description_url="https://example.org")
+                  for i in range(5)]
+    entities = [Entity(id=str(uuid4()), name=f"entity_{i}") for i in range(20)]
+    users = [User(id=str(uuid4()), username=f"user_{i}", firstname="first", lastname="last",
+                  email=f"user_{i}@example.org", expiration_date=now)
+             for i in range(50)]
+    projects = []
+    for i in range(n_projects):
+        project = Project(id=str(uuid4()), code=f"P{i}", name=f"project_{i}", description="some project description",
+                          start_date=date.today(), end_date=date.today(), owner_platform_id=platforms[i % 20].id)
+        # relationships are set as if loaded, without any backref bookkeeping
+        set_committed_value(project, "owner_platform", platforms[i % 20])
+        set_committed_value(project, "allowed_platforms", [platforms[(i + k) % 20] for k in range(1, 4)])
+        set_committed_value(project, "regulatory_frameworks", frameworks[:2])
+        set_committed_value(project, "involved_entities", [entities[(i + k) % 20] for k in range(3)])
+        set_committed_value(project, "involved_users", [users[(i + k) % 50] for k in range(5)])
+        projects.append(project)
+    return projects
+
+
+def fastapi_serializer(response_class):
+    field = create_response_field(name="Response_get_projects", type_=SCHEMA, mode="serialization")
+
+    def serialize(projects: list[Project]) -> bytes:
+        content = asyncio.run(serialize_response(field=field, response_content=projects))
+        return response_class(content).body
+    return serialize
+
+
+def type_adapter_serializer(projects: list[Project]) -> bytes:
+    adapter = type_adapter(SCHEMA)
+    return adapter.dump_json(adapter.validate_python(projects, from_attributes=True))
+
+
+def dump_json_serializer(projects: list[Project]) -> bytes:
+    return dump_json(SCHEMA, projects)
+
+
+def measure(name: str, serialize, projects: list[Project], repeat: int) -> dict:
+    body = serialize(projects)
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        serialize(projects)
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    serialize(projects)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"serializer": name,
+            "body_bytes": len(body),
+            "median_ms": round(statistics.median(durations) * 1000, 1),
+            "min_ms": round(min(durations) * 1000, 1),
+            "peak_allocated_mib": round(peak / 2 ** 20, 1)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    projects = build_projects(args.projects)
+    for name, serialize in (("fastapi", fastapi_serializer(JSONResponse)),
+                            ("orjson", fastapi_serializer(ORJSONResponse)),
+                            ("type_adapter", type_adapter_serializer),
+                            ("dump_json", dump_json_serializer)):
+        print(measure(name, serialize, projects, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Cold-start time of the API containers: from the start of the entrypoint to the first HTTP response, with
+
+* `legacy`: `alembic upgrade head` then `python platform_registry/initial_data.py` on every start
+* `prepare`: `python -m platform_registry prepare`, migrating and seeding only when outdated
+
+each on an `empty` database, e.g: the first deployment, and on a `current` one, e.g: restarts and rollouts.
+`--replicas` containers start at once, as in a rollout: the time reported is the one of the slowest.
+
+    python scripts/benchmark_startup.py --replicas 4 --runs 3
+
+Uses the database of the settings (`DB_*` variables), which must be a PostgreSQL database, the migrations
+being written for it. Its `public` schema is dropped for the `empty` measures: never point it to a database in use.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+from platform_registry.core.config import settings  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STEPS = {"legacy": "alembic upgrade head && python platform_registry/initial_data.py",
+         "prepare": "python -m platform_registry prepare"}
+
+
+async def empty_database() -> None:
+    engine = create_async_engine(str(settings.database_url))
+    async with engine.begin() as connection:
+        await connection.execute(text("DROP SCHEMA public CASCADE"))
+        await connection.execute(text("CREATE SCHEMA public"))
+    await engine.dispose()
+
+
+def start_container(steps: str, port: int) -> subprocess.Popen:
+    return subprocess.Popen(["bash", "-c", f"{steps} && exec uvicorn platform_registry.main:app --port {port}"],
+                            cwd=ROOT, env={**os.environ, "PYTHONPATH": ROOT}, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_serving(port: int, container: subprocess.Popen, timeout: float) -> bool:
+    """ any HTTP response, e.g: a 404, tells that the container serves. False when the container exited,
+        e.g: replicas migrating an empty database at once
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if container.poll() is not None:
+            return False
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return True
+        except httpx.TransportError:
+            time.sleep(0.02)
+    raise TimeoutError(f"container on port {port} not serving after {timeout}s")
+
+
+def cold_start(steps: str, replicas: int, base_port: int, timeout: float) -> tuple[float, int]:
+    """ time until all the containers serve, and the number of containers which failed to start """
+    start = time.perf_counter()
+    containers = [start_container(steps, base_port + i) for i in range(replicas)]
+    try:
+        failed = sum(not wait_until_serving(base_port + i, container, timeout) for i, container in enumerate(containers))
+        return time.perf_counter() - start, failed
+    finally:
+        for container in containers:
+            if container.poll() is None:
+                os.killpg(container.pid, signal.SIGTERM)
+                container.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", type=int, default=1, help="containers started at once")
+    parser.add_argument("--runs", type=int, default=3, help="measures per startup path and database state")
+    parser.add_argument("--port", type=int, default=8100, help="port of the first container")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    print(f"{'path':<10}{'database':<10}{'median (s)':>12}{'min (s)':>10}{'max (s)':>10}{'failed':>8}")
+    for name, steps in STEPS.items():
+        for state in ("empty", "current"):
+            durations, failures = [], 0
+            for _ in range(args.runs):
+                if state == "empty":
+                    asyncio.run(empty_database())
+                else:
+                    # brought up to date by a first start
+                    cold_start(steps, 1, args.port, args.timeout)
+                duration, failed = cold_start(steps, args.replicas, args.port, args.timeout)
+                durations.append(duration)
+                failures += failed
+            print(f"{name:<10}{state:<10}{statistics.median(durations):>12.2f}{min(durations):>10.2f}"
+                  f"{max(durations):>10.2f}{failures:>8}")
+
+
+if __name__ == "__main__":
+    main()
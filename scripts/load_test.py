@@ -0,0 +1,98 @@
+"""
+Concurrent load test against a running instance of the API.
+
+Logs in once, then keeps `--concurrency` requests in flight on the given endpoint for `--duration` seconds
+and reports throughput and latency percentiles. Results can be saved as JSON and compared with a previous run:
+
+    python scripts/load_test.py --url http://localhost:8000 --endpoint /projects/ --output after.json --baseline before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> dict[str, str]:
+    response = await client.post("/auth/login",
+                                 data={"username": username, "password": password},
+                                 headers={"Content-Type": "application/x-www-form-urlencoded"})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def worker(client: httpx.AsyncClient, endpoint: str, headers: dict, deadline: float,
+                 latencies: list[float], errors: list[int]) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get(endpoint, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            errors.append(response.status_code)
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        headers = await login(client, args.username, args.password)
+        latencies, errors = [], []
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*[worker(client, args.endpoint, headers, deadline, latencies, errors)
+                               for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - started
+    return {"endpoint": args.endpoint,
+            "concurrency": args.concurrency,
+            "duration_s": round(elapsed, 3),
+            "requests": len(latencies),
+            "errors": len(errors),
+            "requests_per_second": round(len(latencies) / elapsed, 2),
+            "latency_ms": {"mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+                           "p50": round(percentile(latencies, 50) * 1000, 2),
+                           "p95": round(percentile(latencies, 95) * 1000, 2),
+                           "p99": round(percentile(latencies, 99) * 1000, 2)},
+            }
+
+
+def compare(result: dict, baseline: dict) -> None:
+    before, after = baseline["requests_per_second"], result["requests_per_second"]
+    ratio = before and after / before or 0
+    print(f"requests/s: {before} -> {after} (x{ratio:.2f})")
+    for p in ("p50", "p95", "p99"):
+        print(f"latency {p}: {baseline['latency_ms'][p]}ms -> {result['latency_ms'][p]}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/projects/")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default=os.environ.get("ADMIN_PASSWORD"))
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--output", help="JSON file to save results to")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare with")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()